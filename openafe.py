@@ -1,8 +1,24 @@
+import threading
+import time
+
 import serial
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+from openafe_autorange import RangeMonitor
+from openafe_framing import FrameReader, calculateChecksum
+from openafe_metrics import AcquisitionMetrics
+from openafe_ringbuffer import PointRingBuffer
+from openafe_waveform import cyclicVoltammetryWaveform, differentialPulseVoltammetryWaveform, squareWaveVoltammetryWaveform, \
+	waveformOfCommand
+
+
 class OpenAFE:
 
-	def __init__(self, comPort, onPointCallback=None, onEndCallback=None):
+	def __init__(self, comPort, onPointCallback=None, onEndCallback=None, onBatchCallback=None, transport=None):
 		"""
 		NOTE: This method can raise an Exception.
 
@@ -17,12 +33,38 @@ class OpenAFE:
 		:param onEndCallback: The `onEndCallback` parameter is a callback function that will be called when
 		the communication with the OpenAFE device ends. It is an optional parameter, so if you don't provide
 		a callback function, it will default to `None`
+		:param onBatchCallback: The `onBatchCallback` parameter is a function that will be called with
+		batches of points, as two NumPy float arrays (voltages, currents), see `receiveVoltammetryPoints`.
+		It is optional and can be used together with `onPointCallback`
+		:param transport: An already open serial-like object (with `read`, `in_waiting` and `write`) used
+		instead of opening `comPort`, e.g.: a `SimulatedOpenAFE` for running without the device
 		"""
 		try:
 			self.onPointCallback = onPointCallback
 			self.onEndCallback = onEndCallback
+			self.onBatchCallback = onBatchCallback
+			self.pointBuffer = None
+			self.recorder = None
+			self.pipeline = None
+			self.readerThread = None
+			self.readerException = None
+			self._stopReader = False
+			self.waveform = None
+			self.metrics = None
+			self.currentRange = None
+			self.rangeMonitor = None
+
+			self.comPort = comPort
+			self.recoveryEnabled = False
+			self.maxCorruptedFrames = None
+			self.reconnectTimeout = 0
+			self.endTimeout = 2
+			self.onGapCallback = None
+			self._resetRunCounters()
+			self.reconnections = 0
 			
-			self.ser = serial.Serial(comPort, 115200)
+			self.ser = transport if transport is not None else serial.Serial(comPort, 115200)
+			self.frameReader = FrameReader(self.ser)
 
 			messageReceived = self.waitForMessage()
 
@@ -35,32 +77,36 @@ class OpenAFE:
 			raise Exception("Could not initiate communication with the OpenAFE device. Reason: ", e)
 
 
-	def waitForMessage(self):
+	def waitForMessage(self, returnInvalid=False):
 		"""
 		NOTE: This method can raise an Exception.
 
-		The `waitForMessage` function reads a message from a serial port, checks its checksum, and returns
-		the message if the checksum is valid, otherwise it returns -1.
+		The `waitForMessage` function reads the next frame from the serial port (see `FrameReader`), checks
+		its checksum, and returns
+		the message if the checksum is valid, otherwise it returns -1 (or raises, if `returnInvalid` is False).
+		With the recovery enabled (see `enableRecovery`), a lost serial port is reopened instead of raising.
+
+		:param returnInvalid: When True, a corrupted message returns -1 instead of raising an Exception
 		:return: The function `waitForMessage` returns either the message received from OpenAFE if the
 		checksum is valid, or -1 if the checksum is not valid.
 		"""
-		try:
-			rawMessage=str(self.ser.readline())
-		except serial.serialutil.SerialException:
-			raise Exception("Failed to read from the OpenAFE device. CHECK IF IT IS CONNECTED!")
-
-		messageReceived = rawMessage[2:][:-3]
-
-		checksum = messageReceived[-2:]
-
-		# check the message's checksum ...
-		calculatedChecksum = self._calculateChecksumOfString(messageReceived[1:][:-3])
-		checksumInMessage = self._getChecksumIntegerFromString(checksum)
+		while True:
+			try:
+				if self.metrics is None:
+					message, isValid = self.frameReader.readFrame()
+				else:
+					message, isValid = self._readFrameInstrumented()
+				break
+			except serial.serialutil.SerialException:
+				if not self.recoveryEnabled or self.comPort is None:
+					raise Exception("Failed to read from the OpenAFE device. CHECK IF IT IS CONNECTED!")
+				self._reconnect()
 
-		if (calculatedChecksum - checksumInMessage) == 0:
+		if isValid:
 			# checksum is valid
-			message = messageReceived[1:][:-3] 
 			return message
+		elif returnInvalid:
+			return -1
 		else :
 			# checksum is not valid
 			raise Exception("Message from the MCU got corrupted.")
@@ -105,39 +151,13 @@ class OpenAFE:
 		NOTE: PRIVATE METHOD, DO NOT CALL IT!
 
 		The function `_calculateChecksumOfString` calculates the checksum of a given string by performing a
-		bitwise XOR operation on the ASCII values of its characters.
+		bitwise XOR operation on the ASCII values of its characters (see `calculateChecksum`).
 		
 		:param string: The parameter "string" is a string of characters for which we want to calculate the
 		checksum, e.g.: "CVW,500,-500,250,2,1".
 		:return: the checksum of the given string, e.g.: 119 (0x77).
 		"""
-		checksum = 0
-		for char in string:
-			checksum = (checksum ^ ord(char))
-		return checksum
-
-
-	def _getChecksumIntegerFromString(self, checksumString):
-		"""
-		NOTE: PRIVATE METHOD, DO NOT CALL IT!
-
-		The function `_getChecksumIntegerFromString` converts a string representation of a checksum into an
-		integer value.
-		
-		:param checksumString: The `checksumString` parameter is a string that represents a checksum, e.g.: "32".
-		:return: an integer checksum value e.g.: 50 (0x32).
-		"""
-		integerChecksum = 0
-		index = 1
-
-		for char in checksumString:
-			if ord(char) < 0x41:
-				integerChecksum |= (ord(char) - 0x30) << (index * 4)
-			else:
-				integerChecksum |= (ord(char) - 0x37) << (index * 4)
-			index -= 1
-
-		return integerChecksum
+		return calculateChecksum(string.encode("ascii"))
 
 
 	def sendCommandToMCU(self, command):
@@ -152,9 +172,7 @@ class OpenAFE:
 		"CVW,500,-500,250,2,1" is a command that instructs the MCU to
 		"""
 		try:
-			checksum = self._calculateChecksumOfString(command)
-			checksumString = format(checksum, '02X')
-			fullCommand = "$" + command + "*" + checksumString
+			fullCommand = self._makeCommandFrame(command)
 			# print("full command: ", fullCommand)
 			self.ser.write(fullCommand.encode("utf-8"))
 
@@ -166,7 +184,103 @@ class OpenAFE:
 		except serial.serialutil.SerialException:
 			raise Exception("Failed send command to the OpenAFE device. CHECK IF IT IS CONNECTED!")
 		except Exception as e:
-			raise("Failed send command to the OpenAFE device. Reason: ", e)
+			raise Exception("Failed send command to the OpenAFE device. Reason: ", e)
+
+
+	def sendCommandsToMCU(self, commands):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The `sendCommandsToMCU` function sends several commands to the MCU, in order, waiting for the answer
+		to each one before sending the next. The commands are not pipelined: a command written while the
+		previous one is handled could be lost, and a voltammetry must never start after a declined command.
+		Every command is validated before the first one is sent, and the first declined command stops the
+		sequence. The `Waveform` of the voltammetry command, if any, is kept in `self.waveform`, like
+		`make*Voltammetry` does.
+
+		:param commands: A list of command strings, e.g.: ["CMD,CUR,200", "CVW,500,-500,500,250,2,1"]
+		"""
+		try:
+			waveforms = [waveformOfCommand(command) for command in commands]  # validated before any round trip
+
+			for command, waveform in zip(commands, waveforms):
+				self.ser.write(self._makeCommandFrame(command).encode("utf-8"))
+				commandResponse = self.waitForMessage()
+				if self.isErrorMessage(commandResponse):
+					raise Exception("MCU declined the command " + command + " with " + commandResponse)
+				if command.startswith("CMD,CUR,"):
+					self.currentRange = float(command[8:])
+				elif waveform is not None:
+					self.waveform = waveform
+
+		except serial.serialutil.SerialException:
+			raise Exception("Failed send command to the OpenAFE device. CHECK IF IT IS CONNECTED!")
+		except Exception as e:
+			raise Exception("Failed send command to the OpenAFE device. Reason: ", e)
+
+
+	def _makeCommandFrame(self, command):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Returns the command framed as sent to the MCU, e.g.: "$CMD,CUR,200*XX".
+		"""
+		return "$" + command + "*" + format(self._calculateChecksumOfString(command), '02X')
+
+
+	@staticmethod
+	def currentRangeCommand(currentRange):
+		"""
+		The function `currentRangeCommand` returns the command string sent by `setCurrentRange`.
+
+		:param currentRange: The current range, in microamps (uA)
+		:return: the command string, e.g.: "CMD,CUR,200".
+		"""
+		return "CMD,CUR," + str(currentRange)
+
+
+	@staticmethod
+	def cyclicVoltammetryCommand(settlingTime, startingPotential, endingPotential, scanRate, stepSize, numberOfCycles):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `cyclicVoltammetryCommand` validates the parameters and returns the command string sent
+		by `makeCyclicVoltammetry`, see it for the parameters.
+
+		:return: the command string, e.g.: "CVW,1000,-500,500,250,2,1".
+		"""
+		return cyclicVoltammetryWaveform(settlingTime, startingPotential, endingPotential, scanRate, stepSize,
+			numberOfCycles).command
+
+
+	@staticmethod
+	def differentialPulseVoltammetryCommand(settlingTime, startingPotential, endingPotential, pulsePotential,
+				      stepPotential, pulseWidth, baseWidth, samplePeriodPulse, samplePeriodBase):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `differentialPulseVoltammetryCommand` validates the parameters and returns the command
+		string sent by `makeDifferentialPulseVoltammetry`, see it for the parameters.
+
+		:return: the command string, e.g.: "DPV,1000,-500,500,100,5,2,20,1,2".
+		"""
+		return differentialPulseVoltammetryWaveform(settlingTime, startingPotential, endingPotential, pulsePotential,
+			stepPotential, pulseWidth, baseWidth, samplePeriodPulse, samplePeriodBase).command
+
+
+	@staticmethod
+	def squareWaveVoltammetryCommand(settlingTime, startingPotential, endingPotential, scanRate, pulsePotential,
+							   pulseFrequency, samplePeriodPulse):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `squareWaveVoltammetryCommand` validates the parameters and returns the command string
+		sent by `makeSquareWaveVoltammetry`, see it for the parameters.
+
+		:return: the command string, e.g.: "SWV,1000,-500,500,200,100,10,1".
+		"""
+		return squareWaveVoltammetryWaveform(settlingTime, startingPotential, endingPotential, scanRate,
+			pulsePotential, pulseFrequency, samplePeriodPulse).command
 
 
 	def setCurrentRange(self, currentRange):
@@ -182,7 +296,8 @@ class OpenAFE:
 		an error and the current range was not set, it returns False.
 		"""
 		try:
-			self.sendCommandToMCU("CMD,CUR," + str(currentRange))
+			self.sendCommandToMCU(self.currentRangeCommand(currentRange))
+			self.currentRange = currentRange
 		except Exception as e:
 			raise Exception("Could not chanhge the current range setting in the OpenAFE device. Reason: ", e)
 
@@ -194,6 +309,9 @@ class OpenAFE:
 
 		The function "makeCyclicVoltammetry" sends a command string to a microcontroller unit (MCU) to
 		perform cyclic voltammetry with specified parameters.
+
+		The parameters are validated before anything is sent (see `openafe_waveform`), and the `Waveform`
+		expected from the device (number of points, duration, potentials) is kept in `self.waveform`.
 		
 		:param settlingTime: The settlingTime parameter refers to the time in seconds that the system should
 		wait before starting the cyclic voltammetry measurement. This allows the system to stabilize and
@@ -210,10 +328,11 @@ class OpenAFE:
 		:param numberOfCycles: The numberOfCycles parameter specifies the number of cycles to perform in the
 		cyclic voltammetry experiment
 		"""
-		CVCommandString = "CVW," + str(settlingTime) + "," + str(startingPotential) + "," + str(endingPotential) + \
-		"," + str(scanRate) + "," + str(stepSize) + "," + str(numberOfCycles)
 		try:
-			self.sendCommandToMCU(CVCommandString) # send the CV command
+			waveform = cyclicVoltammetryWaveform(settlingTime, startingPotential, endingPotential, scanRate, stepSize,
+				numberOfCycles) # validate the parameters before any round trip
+			self.sendCommandToMCU(waveform.command) # send the CV command
+			self.waveform = waveform
 		except Exception as e:
 			raise Exception("Could not send the Cyclic Voltammetry to the OpenAFE device. Reason: ", e)
 
@@ -223,6 +342,9 @@ class OpenAFE:
 		"""
 		The function `makeDifferentialPulseVoltammetry` sends a command string to an OpenAFE device to
 		perform a Differential Pulse Voltammetry measurement.
+
+		The parameters are validated before anything is sent (see `openafe_waveform`), and the `Waveform`
+		expected from the device (number of points, duration, potentials) is kept in `self.waveform`.
 		
 		:param settlingTime: The settling time is the duration in seconds for the system to stabilize before
 		starting the measurement. It allows any transient effects to settle down and ensures accurate
@@ -247,11 +369,11 @@ class OpenAFE:
 		:param samplePeriodBase: The samplePeriodBase parameter refers to the time interval between each
 		data point during the base phase of the differential pulse voltammetry experiment
 		"""
-		DPVCommandString = "DPV," + str(settlingTime) + "," + str(startingPotential) + "," + \
-			str(endingPotential) + "," + str(pulsePotential) + "," + str(stepPotential) + "," + \
-			str(pulseWidth) + "," + str(baseWidth) + "," + str(samplePeriodPulse) + "," + str(samplePeriodBase)
 		try:
-			self.sendCommandToMCU(DPVCommandString)
+			waveform = differentialPulseVoltammetryWaveform(settlingTime, startingPotential, endingPotential,
+				pulsePotential, stepPotential, pulseWidth, baseWidth, samplePeriodPulse, samplePeriodBase)
+			self.sendCommandToMCU(waveform.command)
+			self.waveform = waveform
 		except Exception as e:
 			raise Exception("Could not send the Differential Pulse Voltammetry to the OpenAFE device. Reason: ", e)
 
@@ -261,6 +383,9 @@ class OpenAFE:
 		"""
 		The function `makeSquareWaveVoltammetry` sends a command string to an OpenAFE device to perform
 		Square Wave Voltammetry with specified parameters.
+
+		The parameters are validated before anything is sent (see `openafe_waveform`), and the `Waveform`
+		expected from the device (number of points, duration, potentials) is kept in `self.waveform`.
 		
 		:param settlingTime: The settling time is the duration in seconds for the system to stabilize before
 		starting the measurement, in milliseconds
@@ -278,38 +403,465 @@ class OpenAFE:
 		:param samplePeriodPulse: When to sample the pulse, amount of ms before the pulse end, in milliseconds.
 		"""
 
-		SWVCommandString = "SWV," + str(settlingTime) + "," + str(startingPotential) + "," + \
-			str(endingPotential) + "," + str(scanRate) + "," + str(pulsePotential) + "," + \
-			str(pulseFrequency) + "," + str(samplePeriodPulse)
 		try:
-			self.sendCommandToMCU(SWVCommandString)
+			waveform = squareWaveVoltammetryWaveform(settlingTime, startingPotential, endingPotential, scanRate,
+				pulsePotential, pulseFrequency, samplePeriodPulse)
+			self.sendCommandToMCU(waveform.command)
+			self.waveform = waveform
 		except Exception as e:
 			raise Exception("Could not send the Square Wave Voltammetry to the OpenAFE device. Reason: ", e)
 
 
-	def receiveVoltammetryPoints(self):
+	def receiveVoltammetryPoints(self, useReaderThread=False, batchSize=None, maxLatency_milliseconds=50, recorder=None,
+							  pipeline=None):
 		"""
+		NOTE: This method can raise an Exception.
+
 		The function `receiveVoltammetryPoints` receives messages from OpenAFE, processes the received
 		points, and calls the appropriate callbacks.
+
+		:param useReaderThread: When True, the serial port is drained by a background reader thread (see
+		`startReaderThread`) and the callbacks are called from this thread, so a slow callback never stops
+		the reads from the device
+		:param batchSize: The maximum number of points delivered to `onBatchCallback` at once. If it is None
+		and `onBatchCallback` is set, batches of 256 points are used
+		:param maxLatency_milliseconds: The maximum time a received point waits before its batch is
+		delivered to `onBatchCallback`, even if the batch is not full. Batches imply `useReaderThread`, so
+		the wait is bounded even when the next point is late
+		:param recorder: An optional `PointRecorder` to which every point is appended, it is flushed (but not
+		closed) when the voltammetry ends
+		:param pipeline: An optional `AnalysisPipeline` to which every batch of points is submitted, so CPU
+		bound analysis runs in worker processes; its results are delivered from this thread. It implies
+		`useReaderThread` and batches of `batchSize` (256 if None) points, and every result is delivered
+		before `onEndCallback` is called
 		"""
+		self.recorder = recorder
+		self.pipeline = pipeline
+		if pipeline is not None:
+			useReaderThread = True
+			batchSize = batchSize or 256
+		self._resetRunCounters()
+		if self.metrics is not None and self.waveform is not None:
+			self.metrics.expectedPointInterval = 1 / self.waveform.pointRate
+
+		if self.onBatchCallback is not None and batchSize is None:
+			batchSize = 256
+
+		if batchSize is not None and np is None:
+			raise Exception("NumPy is required to receive the voltammetry points in batches, install it with: pip install numpy")
+
+		# the batches are always gathered from the reader thread: reading the port here, a slow device would
+		# hold a partial batch until its next point, well past `maxLatency_milliseconds`
+		if useReaderThread or batchSize is not None:
+			self._receiveVoltammetryPointsFromReaderThread(batchSize, maxLatency_milliseconds / 1000)
+			return
+
 		while True:
-			messageReceived = self.waitForMessage()
-			point = messageReceived[4:]
+			point = self._readPoint()
 
-			if messageReceived == "MSG,END":
+			if point is None:
 				self._onVoltammetryEnd()
 				break
-			
+
+			if self.recorder is not None:
+				self.recorder.record(point[0], point[1])
+			self._onVoltammetryPoint(point[0], point[1])
+
+
+	def startReaderThread(self, bufferCapacity=65536):
+		"""
+		The function `startReaderThread` starts a background thread that reads the voltammetry points from
+		the device into `self.pointBuffer`, a `PointRingBuffer` of (voltage, current, timestamp). Consumers
+		pull batches from it with `self.pointBuffer.pull()`; the buffer is closed when the voltammetry ends.
+
+		:param bufferCapacity: The maximum number of points held by the buffer, once it is full the oldest
+		points are dropped and counted in `self.pointBuffer.droppedPoints`. When the voltammetry was started
+		with a `make*Voltammetry` method, the buffer is not made larger than its expected number of points
+		:return: the `PointRingBuffer` being filled.
+		"""
+		if self.readerThread is not None and self.readerThread.is_alive():
+			raise Exception("The reader thread of the previous voltammetry is still running, stop it with "
+				"`stopReaderThread` first.")
+
+		if self.waveform is not None:
+			bufferCapacity = max(min(bufferCapacity, self.waveform.numberOfPoints), 1)
+		self.pointBuffer = PointRingBuffer(bufferCapacity)
+		self.readerException = None
+		self._stopReader = False
+		self._resetRunCounters()
+		self.readerThread = threading.Thread(target=self._readerLoop, name="OpenAFE reader", daemon=True)
+		self.readerThread.start()
+		return self.pointBuffer
+
+
+	def stopReaderThread(self, timeout_seconds=1):
+		"""
+		The function `stopReaderThread` asks the reader thread to stop after the point it is reading and
+		waits for it, e.g.: when the consumer of the points failed and the run is abandoned. The thread only
+		sees the request once a frame arrives, so it may outlive the timeout if the device is silent.
+
+		:param timeout_seconds: How long to wait for the thread to stop
+		:return: True if no reader thread is running anymore.
+		"""
+		if self.readerThread is None:
+			return True
+		self._stopReader = True
+		self.readerThread.join(timeout_seconds)
+		return not self.readerThread.is_alive()
+
+
+	def discardVoltammetry(self, timeout_seconds=None):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `discardVoltammetry` throws away the rest of a run whose points are no longer wanted,
+		e.g.: after a callback failed in the middle of it. The frames left on the port are read and dropped
+		until its `MSG,END` (or an error) arrives, or until the device is silent for `timeout_seconds`, so the
+		answer to the next command is not mistaken for one of them and the device is no longer busy.
+
+		:param timeout_seconds: How long the device may be silent before the run is taken as over, None uses
+		`self.endTimeout` (see `enableRecovery`)
+		"""
+		timeout_seconds = self.endTimeout if timeout_seconds is None else timeout_seconds
+		if not self.stopReaderThread(timeout_seconds):
+			raise Exception("The reader thread of the voltammetry did not stop.")
+
+		while True:
+			message = self._waitForEndMessage(timeout_seconds)
+			if message is None or message == "MSG,END" or (message != -1 and message[:-4] == "ERR"):
+				break
+
+		self.ser.reset_input_buffer()
+		self.frameReader = FrameReader(self.ser)  # a partial frame is dropped too
+
+
+	def enableInstrumentation(self, callbackBudget_milliseconds=None):
+		"""
+		The function `enableInstrumentation` starts collecting the timings and counters of the acquisition
+		loop into `self.metrics`, an `AcquisitionMetrics`: per stage latency histograms (serial read,
+		checksum, parsing, callbacks), points per second, inter-arrival jitter, corrupted frame and callback
+		overrun counts. While it is disabled, the loop only pays for a `None` check per point.
+
+		:param callbackBudget_milliseconds: The time a point callback may take before it is counted as an
+		overrun. None uses the interval between points of the voltammetry
+		:return: the `AcquisitionMetrics` being filled, it can be read at any time.
+		"""
+		self.metrics = AcquisitionMetrics(callbackBudget_milliseconds)
+		return self.metrics
+
+
+	def disableInstrumentation(self):
+		"""
+		The function `disableInstrumentation` stops collecting metrics.
+
+		:return: the `AcquisitionMetrics` collected so far, or None if it was not enabled.
+		"""
+		metrics = self.metrics
+		self.metrics = None
+		return metrics
+
+
+	def enableRangeMonitor(self, monitor=None):
+		"""
+		The function `enableRangeMonitor` watches the currents of every run against the current range set
+		with `setCurrentRange` (or `sendCommandsToMCU`), into `self.rangeMonitor`, flagging saturated and
+		coarse runs, see `openafe_autorange`. While it is disabled, the loop only pays for a `None` check per
+		point.
+
+		:param monitor: The `RangeMonitor` to be used, None uses one with the default thresholds
+		:return: the `RangeMonitor`, reset at the start of each run.
+		"""
+		if monitor is None:
+			monitor = RangeMonitor()
+		monitor.reset(self.currentRange)
+		self.rangeMonitor = monitor
+		return monitor
+
+
+	def disableRangeMonitor(self):
+		"""
+		The function `disableRangeMonitor` stops watching the currents.
+
+		:return: the `RangeMonitor` of the last run, or None if it was not enabled.
+		"""
+		monitor = self.rangeMonitor
+		self.rangeMonitor = None
+		return monitor
+
+
+	def enableRecovery(self, maxCorruptedFrames=100, reconnectTimeout_seconds=30, onGapCallback=None,
+				   endTimeout_seconds=2):
+		"""
+		The function `enableRecovery` makes the voltammetries survive a noisy or flaky connection. A
+		corrupted point frame no longer ends the run: it is skipped (the next frame is found at its "$"),
+		counted in `self.corruptedFrames` and its position is added to `self.gaps`. If the serial port is
+		lost (e.g.: the USB cable was unplugged and plugged back), it is reopened, without resetting the
+		Arduino, and the run goes on. The counters are reset at the start of each run. Once every point
+		expected from the `Waveform` of the run arrived, a corrupted frame or no frame at all within
+		`endTimeout_seconds` ends the run, so a damaged `MSG,END` does not leave the read waiting forever.
+
+		:param maxCorruptedFrames: The error budget of a run: once more frames than this are corrupted, the
+		run is aborted with an Exception. None never aborts
+		:param reconnectTimeout_seconds: How long a lost serial port is retried before giving up
+		:param onGapCallback: An optional function called with the number of points received before each
+		skipped frame, e.g.: to break the plotted line there. With `useReaderThread` it is called from the
+		reader thread
+		:param endTimeout_seconds: How long the end of the run is waited for, once every expected point
+		arrived
+		"""
+		self.recoveryEnabled = True
+		self.maxCorruptedFrames = maxCorruptedFrames
+		self.reconnectTimeout = reconnectTimeout_seconds
+		self.onGapCallback = onGapCallback
+		self.endTimeout = endTimeout_seconds
+
+
+	def disableRecovery(self):
+		"""
+		The function `disableRecovery` restores the default behaviour: a corrupted frame or a lost serial
+		port aborts the run with an Exception.
+		"""
+		self.recoveryEnabled = False
+
+
+	def _resetRunCounters(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Resets the per run counters of the received points and the skipped frames.
+		"""
+		self.pointsReceived = 0
+		self.corruptedFrames = 0
+		self.gaps = []
+		if self.rangeMonitor is not None:
+			self.rangeMonitor.reset(self.currentRange)
+
+
+	def _onCorruptedFrame(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+		NOTE: This method can raise an Exception.
+
+		Records a skipped frame as a gap, and aborts the run once the error budget is exhausted.
+		"""
+		self.corruptedFrames += 1
+		self.gaps.append(self.pointsReceived)
+		if self.onGapCallback is not None:
+			self.onGapCallback(self.pointsReceived)
+		if self.maxCorruptedFrames is not None and self.corruptedFrames > self.maxCorruptedFrames:
+			raise Exception("More than " + str(self.maxCorruptedFrames) + " messages from the MCU got corrupted " +
+				"during the voltammetry.")
+
+
+	def _reconnect(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+		NOTE: This method can raise an Exception.
+
+		Reopens the lost serial port, retrying until `self.reconnectTimeout` seconds have passed. The DTR
+		line is kept low, so opening the port does not reset the Arduino and its run goes on.
+		"""
+		try:
+			self.ser.close()
+		except Exception:
+			pass
+
+		deadline = time.perf_counter() + self.reconnectTimeout
+		while True:
+			try:
+				ser = serial.Serial()
+				ser.port = self.comPort
+				ser.baudrate = 115200
+				ser.dtr = False
+				ser.open()
+				break
+			except serial.serialutil.SerialException:
+				if time.perf_counter() >= deadline:
+					raise Exception("Lost the connection with the OpenAFE device and could not reconnect in " +
+						str(self.reconnectTimeout) + " seconds. CHECK IF IT IS CONNECTED!")
+				time.sleep(0.5)
+
+		self.ser = ser
+		self.frameReader = FrameReader(ser)  # a partial frame left from the lost port is dropped
+		self.reconnections += 1
+
+
+	def _readFrameInstrumented(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		`FrameReader.readFrame`, timing the serial read and the checksum check and counting the frames.
+		"""
+		metrics = self.metrics
+		start = time.perf_counter()
+		line = self.frameReader.readLine()
+		read = time.perf_counter()
+		message, isValid = self.frameReader.checkFrame(line)
+		metrics.stages["read"].record(read - start)
+		metrics.stages["checksum"].record(time.perf_counter() - read)
+		metrics.frames += 1
+		if not isValid:
+			metrics.corruptedFrames += 1
+		return message, isValid
+
+
+	def _parsePointInstrumented(self, message):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Parses a point message, timing it and counting the point.
+		"""
+		start = time.perf_counter()
+		pointObjs = message[4:].split(',')
+		point = float(pointObjs[0]), float(pointObjs[1])
+		end = time.perf_counter()
+		self.metrics.stages["parse"].record(end - start)
+		self.metrics.recordPoint(end)
+		return point
+
+
+	def _readPoint(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+		NOTE: This method can raise an Exception.
+
+		The function `_readPoint` waits for the next voltammetry message and parses it.
+
+		:return: a tuple (voltage, current), or None if the voltammetry ended.
+		"""
+		while True:
+			# with the recovery, every frame of the run is accounted for once the expected points (received or
+			# skipped) are in: the next one is the end, which may itself be damaged or lost
+			awaitingEnd = self.recoveryEnabled and self.waveform is not None and \
+				self.pointsReceived + self.corruptedFrames >= self.waveform.numberOfPoints
+
+			if awaitingEnd:
+				messageReceived = self._waitForEndMessage()
+				if messageReceived is None:
+					return None
+			else:
+				messageReceived = self.waitForMessage(self.recoveryEnabled)
+
+			if messageReceived == -1:
+				self._onCorruptedFrame()
+				if awaitingEnd:
+					return None
+				continue
+
+			if messageReceived == "MSG,END":
+				return None
+
+			if messageReceived == "MSG,RDY":
+				raise Exception("The OpenAFE device restarted during the voltammetry.")
+
 			if messageReceived[:-4] == "ERR":
+				if self.metrics is not None:
+					self.metrics.errorFrames += 1
 				raise Exception("An error ocurred during the voltammetry.")
 
 			elif messageReceived != -1: # if message is valid
-				pointObjs = point.split(',')
+				self.pointsReceived += 1
+				if self.metrics is not None:
+					point = self._parsePointInstrumented(messageReceived)
+				else:
+					pointObjs = messageReceived[4:].split(',')
+					point = float(pointObjs[0]), float(pointObjs[1])
+				if self.rangeMonitor is not None:
+					self.rangeMonitor.addCurrent(point[1])
+				return point
+
+
+	def _waitForEndMessage(self, timeout_seconds=None):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+		NOTE: This method can raise an Exception.
+
+		Reads the frame expected to end the run, waiting at most `timeout_seconds` (None uses
+		`self.endTimeout`) seconds for it.
+
+		:return: the message, -1 if it is corrupted, or None if nothing arrived in time.
+		"""
+		timeout_seconds = self.endTimeout if timeout_seconds is None else timeout_seconds
+		previousTimeout = getattr(self.ser, "timeout", None)
+		self.ser.timeout = timeout_seconds
+		try:
+			line = self.frameReader.readLine(timeout_seconds)
+		except serial.serialutil.SerialException:
+			return None  # the run is over, a lost port is found by the next command
+		finally:
+			self.ser.timeout = previousTimeout
 
-				voltage = float(pointObjs[0])
-				current = float(pointObjs[1])
+		if line is None:
+			return None
+		message, isValid = self.frameReader.checkFrame(line)
+		return message if isValid else -1
 
-				self._onVoltammetryPoint(voltage, current)
+
+	def _readerLoop(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		The body of the reader thread: reads points into the point buffer until the voltammetry ends or an
+		error occurs, in which case the exception is kept in `self.readerException`.
+		"""
+		pointBuffer = self.pointBuffer
+		try:
+			while not self._stopReader:
+				point = self._readPoint()
+				if point is None:
+					break
+				pointBuffer.push(point[0], point[1], time.perf_counter())
+		except Exception as e:
+			self.readerException = e
+		finally:
+			pointBuffer.close()
+
+
+	def _receiveVoltammetryPointsFromReaderThread(self, batchSize, maxLatency):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+		NOTE: This method can raise an Exception.
+
+		Starts the reader thread and calls the callbacks with the points it buffers, until it finishes.
+		When `batchSize` is set, the points are pulled in batches of up to `batchSize` points, waiting at
+		most `maxLatency` seconds for a batch to fill.
+		"""
+		pointBuffer = self.startReaderThread()
+
+		try:
+			while not pointBuffer.isDrained():
+				if batchSize is None:
+					voltages, currents, timestamps = pointBuffer.pull()
+				else:
+					voltages, currents, timestamps = pointBuffer.pull(batchSize, maxLatency, minPoints=batchSize)
+
+				if self.recorder is not None:
+					self.recorder.recordBatch(voltages, currents, timestamps)
+
+				if self.pipeline is not None:
+					if len(voltages) > 0:
+						self.pipeline.submit(np.frombuffer(voltages), np.frombuffer(currents))
+					else:
+						self.pipeline.poll()
+
+				if self.onPointCallback is not None:
+					for voltage, current in zip(voltages, currents):
+						self._onVoltammetryPoint(voltage, current)
+
+				if batchSize is not None and len(voltages) > 0:
+					self._onVoltammetryBatch(np.frombuffer(voltages), np.frombuffer(currents))
+		except BaseException:
+			self.stopReaderThread()  # a failed consumer must not leave the thread reading the port
+			raise
+
+		self.readerThread.join()
+		if self.readerException is not None:
+			raise self.readerException
+
+		if self.pipeline is not None:
+			self.pipeline.finish()
+
+		self._onVoltammetryEnd()
 
 
 	def _onVoltammetryPoint(self, voltage, current):
@@ -324,15 +876,41 @@ class OpenAFE:
 		experiment
 		"""
 		if self.onPointCallback and callable(self.onPointCallback):
-			self.onPointCallback(voltage, current)
+			if self.metrics is None:
+				self.onPointCallback(voltage, current)
+			else:
+				start = time.perf_counter()
+				self.onPointCallback(voltage, current)
+				self.metrics.recordCallback("pointCallback", time.perf_counter() - start)
+
+
+	def _onVoltammetryBatch(self, voltages, currents):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		The `_onVoltammetryBatch` function calls the batch callback function, if it exists, with a batch
+		of points.
+
+		:param voltages: A NumPy float array with the voltage values of the batch
+		:param currents: A NumPy float array with the current values of the batch
+		"""
+		if self.onBatchCallback and callable(self.onBatchCallback):
+			if self.metrics is None:
+				self.onBatchCallback(voltages, currents)
+			else:
+				start = time.perf_counter()
+				self.onBatchCallback(voltages, currents)
+				self.metrics.recordCallback("batchCallback", time.perf_counter() - start)
 
 
 	def _onVoltammetryEnd(self):
 		"""
 		NOTE: PRIVATE METHOD, DO NOT CALL IT!
 
-		The function `_onVoltammetryEnd` checks if a callback function `onEndCallback` is defined and
-		callable, and if so, it calls the callback function.
+		The function `_onVoltammetryEnd` flushes the recorder, if any, and checks if a callback function
+		`onEndCallback` is defined and callable, and if so, it calls the callback function.
 		"""
+		if self.recorder is not None:
+			self.recorder.flush()
 		if self.onEndCallback and callable(self.onEndCallback):
 			self.onEndCallback()
\ No newline at end of file
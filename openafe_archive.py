@@ -0,0 +1,331 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+INDEX_FILE = "index.json"
+INDEX_VERSION = 1
+
+# columns of a stored run and their on-disk types, float32 keeps the resolution of the device's answers
+COLUMNS = (("time", "<f8"), ("voltage", "<f4"), ("current", "<f4"))
+
+
+def experimentKey(command, currentRange, deviceId):
+	"""
+	The function `experimentKey` returns the key of an experiment in the archive: a hash of what decides
+	its result, i.e.: the command string sent to the MCU (see `OpenAFE.make*Voltammetry` and
+	`openafe_waveform`), the current range and the device. Runs with the same key are repeats of the same
+	experiment.
+
+	:param command: The voltammetry command string, e.g.: "CVW,1000,-500,500,250,2,1"
+	:param currentRange: The current range, in microamps (uA), None when unknown
+	:param deviceId: The id of the device, e.g.: its serial port or its id in an `OpenAFEPool`
+	:return: the key, as a hexadecimal string.
+	"""
+	currentRange = "" if currentRange is None else format(float(currentRange), "g")  # 200 and 200.0 are the same
+	return hashlib.sha256(f"{command}\n{currentRange}\n{deviceId}".encode("utf-8")).hexdigest()
+
+
+class RunArchive:
+
+	def __init__(self, directory, hotSetBytes=64 * 1024 * 1024):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The `RunArchive` keeps every completed run in a directory, addressed by its `experimentKey`, so
+		reference and calibration runs can be found again and compared without re-acquiring them. The points
+		of each run are stored in columns (time, voltage, current) of a NumPy .npz file, and an index holds
+		the parameters and a summary of every run (number of points, current and voltage extremes...), so the
+		runs can be looked up and queried without reading their files. The runs loaded last are kept in
+		memory, in a hot set evicted least recently used first.
+
+		:param directory: The directory of the archive, created if needed
+		:param hotSetBytes: The memory the hot set may use for the loaded runs, in bytes
+		"""
+		if np is None:
+			raise Exception("NumPy is required by the archive, install it with: pip install numpy")
+
+		self.directory = directory
+		self.hotSetBytes = hotSetBytes
+		self.hotSet = OrderedDict()  # run id -> columns, least recently used first
+		self.hotSetUsage = 0
+		self.hits = 0
+		self.misses = 0
+
+		try:
+			os.makedirs(os.path.join(directory, "runs"), exist_ok=True)
+			indexPath = os.path.join(directory, INDEX_FILE)
+			if os.path.exists(indexPath):
+				with open(indexPath, "r") as file:
+					self.index = json.load(file)
+				if self.index.get("version") != INDEX_VERSION:
+					raise Exception("unsupported index version " + str(self.index.get("version")))
+			else:
+				self.index = {"version": INDEX_VERSION, "nextRunId": 1, "experiments": {}, "runs": {}}
+		except Exception as e:
+			raise Exception("Could not open the archive. Reason: ", e)
+
+
+	def store(self, command, currentRange, deviceId, voltages, currents, timestamps=None, metadata=None):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `store` adds a completed run to the archive.
+
+		:param command: The voltammetry command string of the run, e.g.: `device.waveform.command`
+		:param currentRange: The current range of the run, in microamps (uA)
+		:param deviceId: The id of the device that ran it
+		:param voltages: The voltage values of the points, in millivolts (mV)
+		:param currents: The current values of the points, in microamps (uA)
+		:param timestamps: The time of each point, in seconds (s), None stores zeros
+		:param metadata: An optional dictionary kept in the index with the run, e.g.: {"name": "calibration"}
+		:return: the id of the run.
+		"""
+		columns = {
+			"time": np.zeros(len(voltages)) if timestamps is None else timestamps,
+			"voltage": voltages,
+			"current": currents,
+		}
+		columns = {name: np.array(columns[name], dtype) for name, dtype in COLUMNS}  # copies, kept in the hot set
+		if not len(columns["time"]) == len(columns["voltage"]) == len(columns["current"]):
+			raise Exception("The columns of the run do not have the same length.")
+
+		key = experimentKey(command, currentRange, deviceId)
+		runId = self.index["nextRunId"]
+		path = os.path.join("runs", f"{runId:06d}.npz")
+		try:
+			with open(os.path.join(self.directory, path), "wb") as file:
+				np.savez(file, **columns)
+		except OSError as e:
+			raise Exception("Could not store the run. Reason: ", e)
+
+		experiment = self.index["experiments"].setdefault(key, {
+			"command": command,
+			"protocol": command.split(",", 1)[0],
+			"currentRange": currentRange,
+			"deviceId": deviceId,
+			"runs": [],
+		})
+		experiment["runs"].append(runId)
+		self.index["runs"][str(runId)] = dict(_summarize(columns), id=runId, key=key, path=path, time=time.time(),
+			metadata=metadata or {})
+		self.index["nextRunId"] = runId + 1
+		self._saveIndex()
+
+		self._cache(runId, columns)
+		return runId
+
+
+	def storeRecording(self, path, deviceId, metadata=None):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `storeRecording` adds a run recorded by `PointRecorder` to the archive, with the command
+		and current range kept in the header of the recording, e.g.: the files written by `BatchRunner`.
+
+		:param path: The path of the recording file
+		:param deviceId: The id of the device that ran it
+		:param metadata: An optional dictionary kept in the index with the run, the other parameters of the
+		header are added to it
+		:return: the id of the run.
+		"""
+		from openafe_recorder import RecordingReader
+
+		with RecordingReader(path) as reader:
+			parameters = dict(reader.parameters)
+			if "command" not in parameters:
+				raise Exception("The recording does not hold the command of its run.")
+			command = parameters.pop("command")
+			currentRange = parameters.pop("currentRange", None)
+			parameters.update(metadata or {})
+			return self.store(command, currentRange, deviceId, reader.voltages, reader.currents, reader.times,
+				parameters)
+
+
+	def find(self, command=None, currentRange=None, deviceId=None, protocol=None, since=None, where=None):
+		"""
+		The function `find` queries the index, without reading any run file. Every given criterion must
+		match.
+
+		:param command: The voltammetry command string
+		:param currentRange: The current range, in microamps (uA)
+		:param deviceId: The id of the device
+		:param protocol: The first field of the command: "CVW", "DPV" or "SWV"
+		:param since: The oldest run to be returned, as a `time.time()`
+		:param where: An optional function called with each run entry, returning True to keep it, e.g.:
+		lambda run: run["maxCurrent"] > 50
+		:return: the matching run entries of the index, oldest first. An entry is a dictionary with the keys:
+		id, key, path, time, metadata, points, duration_seconds, minVoltage, maxVoltage, minCurrent,
+		maxCurrent, and the command, currentRange, protocol and deviceId of its experiment.
+		"""
+		if command is not None and currentRange is not None and deviceId is not None:
+			keys = [experimentKey(command, currentRange, deviceId)]  # direct lookup
+		else:
+			keys = self.index["experiments"].keys()
+
+		found = []
+		for key in keys:
+			experiment = self.index["experiments"].get(key)
+			if experiment is None or (command is not None and experiment["command"] != command) or \
+					(protocol is not None and experiment["protocol"] != protocol) or \
+					(deviceId is not None and experiment["deviceId"] != deviceId) or \
+					(currentRange is not None and (experiment["currentRange"] is None or
+						float(experiment["currentRange"]) != float(currentRange))):
+				continue
+			for runId in experiment["runs"]:
+				run = dict(self.index["runs"][str(runId)], command=experiment["command"],
+					protocol=experiment["protocol"], currentRange=experiment["currentRange"],
+					deviceId=experiment["deviceId"])
+				if (since is None or run["time"] >= since) and (where is None or where(run)):
+					found.append(run)
+
+		found.sort(key=lambda run: run["id"])
+		return found
+
+
+	def load(self, runId):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `load` returns the points of a run, from the hot set or from its file.
+
+		:param runId: The id of the run, see `store` and `find`
+		:return: a dictionary of read only NumPy arrays with the keys: time, voltage and current.
+		"""
+		columns = self.hotSet.get(runId)
+		if columns is not None:
+			self.hits += 1
+			self.hotSet.move_to_end(runId)
+			return columns
+
+		self.misses += 1
+		run = self.index["runs"].get(str(runId))
+		if run is None:
+			raise Exception("The archive has no run " + str(runId) + ".")
+		try:
+			with np.load(os.path.join(self.directory, run["path"])) as file:
+				columns = {name: file[name] for name, dtype in COLUMNS}
+		except (OSError, ValueError, KeyError) as e:
+			raise Exception("Could not load the run " + str(runId) + ". Reason: ", e)
+
+		self._cache(runId, columns)
+		return columns
+
+
+	def latest(self, command, currentRange, deviceId):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `latest` returns the points of the last run of an experiment, e.g.: the baseline to be
+		overlaid on a new run of the same parameters.
+
+		:param command: The voltammetry command string
+		:param currentRange: The current range, in microamps (uA)
+		:param deviceId: The id of the device
+		:return: the columns of the run (see `load`), or None if the experiment was never run.
+		"""
+		experiment = self.index["experiments"].get(experimentKey(command, currentRange, deviceId))
+		if experiment is None or not experiment["runs"]:
+			return None
+		return self.load(experiment["runs"][-1])
+
+
+	def remove(self, runId):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `remove` deletes a run from the archive.
+
+		:param runId: The id of the run
+		"""
+		run = self.index["runs"].pop(str(runId), None)
+		if run is None:
+			raise Exception("The archive has no run " + str(runId) + ".")
+
+		experiment = self.index["experiments"][run["key"]]
+		experiment["runs"].remove(runId)
+		if not experiment["runs"]:
+			del self.index["experiments"][run["key"]]
+		self._saveIndex()
+
+		columns = self.hotSet.pop(runId, None)
+		if columns is not None:
+			self.hotSetUsage -= _columnsSize(columns)
+		try:
+			os.remove(os.path.join(self.directory, run["path"]))
+		except OSError:
+			pass  # the index no longer refers to it
+
+
+	def __len__(self):
+		return len(self.index["runs"])
+
+
+	def _cache(self, runId, columns):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Puts the columns of a run in the hot set, evicting the least recently used runs over the budget.
+		"""
+		size = _columnsSize(columns)
+		if size > self.hotSetBytes:
+			return  # larger than the whole hot set, always read from its file
+
+		for array in columns.values():
+			array.flags.writeable = False
+		self.hotSet[runId] = columns
+		self.hotSetUsage += size
+		while self.hotSetUsage > self.hotSetBytes:
+			evictedId, evicted = self.hotSet.popitem(last=False)
+			self.hotSetUsage -= _columnsSize(evicted)
+
+
+	def _saveIndex(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+		NOTE: This method can raise an Exception.
+
+		Writes the index, replacing the previous one at once so a crash never leaves it half written.
+		"""
+		path = os.path.join(self.directory, INDEX_FILE)
+		try:
+			with open(path + ".tmp", "w") as file:
+				json.dump(self.index, file)
+			os.replace(path + ".tmp", path)
+		except OSError as e:
+			raise Exception("Could not save the index of the archive. Reason: ", e)
+
+
+def _summarize(columns):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	Returns the summary of a run kept in the index.
+	"""
+	times, voltages, currents = columns["time"], columns["voltage"], columns["current"]
+	if len(voltages) == 0:
+		return {"points": 0, "duration_seconds": 0.0, "minVoltage": None, "maxVoltage": None, "minCurrent": None,
+			"maxCurrent": None}
+	return {
+		"points": len(voltages),
+		"duration_seconds": float(times[-1] - times[0]),
+		"minVoltage": float(voltages.min()),
+		"maxVoltage": float(voltages.max()),
+		"minCurrent": float(currents.min()),
+		"maxCurrent": float(currents.max()),
+	}
+
+
+def _columnsSize(columns):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	Returns the memory used by the columns of a run, in bytes.
+	"""
+	return sum(array.nbytes for array in columns.values())
@@ -0,0 +1,167 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from openafe import OpenAFE
+
+
+class AsyncOpenAFE:
+
+	def __init__(self, device):
+		"""
+		The `AsyncOpenAFE` wraps an `OpenAFE` device for asyncio code. Every blocking call runs on a thread
+		owned by the device, so several devices and runs can share one event loop without blocking it or
+		each other. Use `AsyncOpenAFE.open` to create it.
+
+		:param device: The `OpenAFE` device to be wrapped
+		"""
+		self.device = device
+		self.droppedPoints = 0
+		self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="OpenAFE")
+
+
+	@classmethod
+	async def open(cls, comPort, transport=None):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `open` establishes the connection with an OpenAFE device without blocking the event
+		loop.
+
+		:param comPort: The serial port to which the OpenAFE device is connected
+		:param transport: An already open serial-like object used instead of opening `comPort`, see `OpenAFE`
+		:return: the `AsyncOpenAFE` of the device.
+		"""
+		device = await asyncio.get_running_loop().run_in_executor(None, functools.partial(OpenAFE, comPort, transport=transport))
+		return cls(device)
+
+
+	async def setCurrentRange(self, currentRange):
+		"""
+		NOTE: This method can raise an Exception.
+
+		Awaitable version of `OpenAFE.setCurrentRange`.
+		"""
+		await self._run(self.device.setCurrentRange, currentRange)
+
+
+	async def makeCyclicVoltammetry(self, settlingTime, startingPotential, endingPotential, scanRate, stepSize,
+								numberOfCycles):
+		"""
+		NOTE: This method can raise an Exception.
+
+		Awaitable version of `OpenAFE.makeCyclicVoltammetry`, the points are read with `points`.
+		"""
+		await self._run(self.device.makeCyclicVoltammetry, settlingTime, startingPotential, endingPotential,
+			scanRate, stepSize, numberOfCycles)
+
+
+	async def makeDifferentialPulseVoltammetry(self, settlingTime, startingPotential, endingPotential,
+											pulsePotential, stepPotential, pulseWidth, baseWidth,
+											samplePeriodPulse, samplePeriodBase):
+		"""
+		NOTE: This method can raise an Exception.
+
+		Awaitable version of `OpenAFE.makeDifferentialPulseVoltammetry`, the points are read with `points`.
+		"""
+		await self._run(self.device.makeDifferentialPulseVoltammetry, settlingTime, startingPotential,
+			endingPotential, pulsePotential, stepPotential, pulseWidth, baseWidth, samplePeriodPulse,
+			samplePeriodBase)
+
+
+	async def makeSquareWaveVoltammetry(self, settlingTime, startingPotential, endingPotential, scanRate,
+									 pulsePotential, pulseFrequency, samplePeriodPulse):
+		"""
+		NOTE: This method can raise an Exception.
+
+		Awaitable version of `OpenAFE.makeSquareWaveVoltammetry`, the points are read with `points`.
+		"""
+		await self._run(self.device.makeSquareWaveVoltammetry, settlingTime, startingPotential, endingPotential,
+			scanRate, pulsePotential, pulseFrequency, samplePeriodPulse)
+
+
+	async def pointBatches(self, batchSize=256, maxLatency_milliseconds=50, bufferCapacity=65536):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `pointBatches` iterates over the points of the running voltammetry in batches, until it
+		ends: `async for voltages, currents in device.pointBatches(): ...`
+
+		The points are read by the device reader thread into a bounded ring buffer, so the device link is
+		never throttled by the consumer; if the consumer falls behind by more than `bufferCapacity` points,
+		the oldest ones are dropped and counted in `self.droppedPoints`. If the iteration is stopped early
+		(break or cancellation), the reader thread keeps draining the voltammetry in the background and the
+		next command waits for it to end.
+
+		:param batchSize: The maximum number of points in a batch
+		:param maxLatency_milliseconds: The maximum time to wait for a batch to fill
+		:param bufferCapacity: The maximum number of points held between the reader thread and the consumer
+		:return: an async iterator of (voltages, currents) tuples of float arrays.
+		"""
+		await self._waitForReaderThread()
+		pointBuffer = await self._run(self.device.startReaderThread, bufferCapacity)
+		loop = asyncio.get_running_loop()
+		maxLatency = maxLatency_milliseconds / 1000
+
+		try:
+			while not pointBuffer.isDrained():
+				voltages, currents, _ = pointBuffer.pull(batchSize, 0)
+				if len(voltages) == 0:
+					voltages, currents, _ = await loop.run_in_executor(self._executor,
+						functools.partial(pointBuffer.pull, batchSize, maxLatency, minPoints=batchSize))
+				if len(voltages) > 0:
+					yield voltages, currents
+		finally:
+			self.droppedPoints = pointBuffer.droppedPoints
+
+		await self._waitForReaderThread()
+		if self.device.readerException is not None:
+			raise self.device.readerException
+
+
+	async def points(self, bufferCapacity=65536):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `points` iterates over the points of the running voltammetry, until it ends:
+		`async for voltage, current in device.points(): ...`. See `pointBatches`.
+
+		:param bufferCapacity: The maximum number of points held between the reader thread and the consumer
+		:return: an async iterator of (voltage, current) tuples.
+		"""
+		async for voltages, currents in self.pointBatches(bufferCapacity=bufferCapacity):
+			for point in zip(voltages, currents):
+				yield point
+
+
+	async def close(self):
+		"""
+		The function `close` waits for a running voltammetry to be drained and releases the device thread
+		and serial port.
+		"""
+		await self._waitForReaderThread()
+		self._executor.shutdown(wait=False)
+		close = getattr(self.device.ser, "close", None)
+		if close is not None:
+			close()
+
+
+	async def _run(self, function, *args):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Runs a blocking device call on the device thread, after any voltammetry still being drained.
+		"""
+		await self._waitForReaderThread()
+		return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(function, *args))
+
+
+	async def _waitForReaderThread(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Waits, without blocking the event loop, for the reader thread of a previous voltammetry to end.
+		"""
+		readerThread = self.device.readerThread
+		if readerThread is not None and readerThread.is_alive():
+			await asyncio.get_running_loop().run_in_executor(None, readerThread.join)
@@ -0,0 +1,328 @@
+import json
+import os
+
+from openafe_waveform import commandNumber, cyclicVoltammetryWaveform, differentialPulseVoltammetryWaveform, \
+	squareWaveVoltammetryWaveform
+
+# Current ranges tried by the auto ranging, in microamps (uA). The MCU accepts any positive range and picks
+# the closest gain of the AFE, so this 1-2-5 ladder only bounds how many ranges are tried.
+CURRENT_RANGES_MICROAMPS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+RANGE_STATUSES = ("unknown", "ok", "saturated", "coarse")
+
+
+def chooseRange(peakCurrent, ranges=CURRENT_RANGES_MICROAMPS, headroomFraction=0.8):
+	"""
+	The function `chooseRange` returns the finest current range measuring a current without saturating.
+
+	:param peakCurrent: The largest absolute current expected, in microamps (uA)
+	:param ranges: The current ranges to choose from, in microamps (uA)
+	:param headroomFraction: The fraction of the range the peak may use, the rest is left for the
+	differences between runs
+	:return: the smallest range holding the peak within its headroom, or the largest range.
+	"""
+	for currentRange in sorted(ranges):
+		if abs(peakCurrent) <= headroomFraction * currentRange:
+			return currentRange
+	return max(ranges)
+
+
+class RangeMonitor:
+
+	def __init__(self, ranges=CURRENT_RANGES_MICROAMPS, saturationFraction=0.95, resolutionFraction=0.1,
+			  headroomFraction=0.8, maxSaturatedPoints=3, onSaturationCallback=None):
+		"""
+		The `RangeMonitor` watches the currents of a run against the active current range, see
+		`OpenAFE.enableRangeMonitor`. It flags the run as saturated when the currents reach the end of the
+		range (the device clips them there) and as coarse when they only use a small part of it (the
+		resolution of the AFE is wasted), and suggests the range the run should have used. Watching a point is
+		a comparison and, at most, two assignments.
+
+		:param ranges: The current ranges the suggestion is chosen from, in microamps (uA)
+		:param saturationFraction: The fraction of the range from which a current counts as saturated
+		:param resolutionFraction: The fraction of the range below which a run with a smaller peak is coarse
+		:param headroomFraction: The fraction of the suggested range the peak may use, see `chooseRange`
+		:param maxSaturatedPoints: The number of saturated points from which the run is flagged as saturated
+		:param onSaturationCallback: An optional function called with the monitor once per run, as soon as the
+		run is flagged as saturated, e.g.: to warn that it will have to be repeated. With `useReaderThread` it
+		is called from the reader thread
+		"""
+		self.ranges = ranges
+		self.saturationFraction = saturationFraction
+		self.resolutionFraction = resolutionFraction
+		self.headroomFraction = headroomFraction
+		self.maxSaturatedPoints = maxSaturatedPoints
+		self.onSaturationCallback = onSaturationCallback
+		self.reset(None)
+
+
+	def reset(self, currentRange):
+		"""
+		The function `reset` starts watching a new run.
+
+		:param currentRange: The current range of the run, in microamps (uA), None when unknown
+		"""
+		self.currentRange = currentRange
+		self.saturationLimit = float("inf") if currentRange is None else self.saturationFraction * float(currentRange)
+		self.points = 0
+		self.peakCurrent = 0.0
+		self.saturatedPoints = 0
+
+
+	def addCurrent(self, current):
+		"""
+		The function `addCurrent` watches the current of a point.
+
+		:param current: The current value of the point, in microamps (uA)
+		"""
+		self.points += 1
+		current = abs(current)
+		if current > self.peakCurrent:
+			self.peakCurrent = current
+		if current >= self.saturationLimit:
+			self.saturatedPoints += 1
+			if self.saturatedPoints == self.maxSaturatedPoints and self.onSaturationCallback is not None:
+				self.onSaturationCallback(self)
+
+
+	def addBatch(self, currents):
+		"""
+		The function `addBatch` watches the currents of several points.
+
+		:param currents: An iterable of current values, in microamps (uA)
+		"""
+		for current in currents:
+			self.addCurrent(current)
+
+
+	@property
+	def status(self):
+		"""
+		The status of the run so far: "saturated", "coarse", "ok", or "unknown" without points or range.
+		"""
+		if self.points == 0 or self.currentRange is None:
+			return "unknown"
+		if self.saturatedPoints >= self.maxSaturatedPoints:
+			return "saturated"
+		if self.peakCurrent < self.resolutionFraction * float(self.currentRange):
+			return "coarse"
+		return "ok"
+
+
+	@property
+	def suggestedRange(self):
+		"""
+		The range the run should have used, or None without points. The peak of a saturated run is clipped,
+		so the suggestion is at least the range above the active one.
+		"""
+		if self.points == 0:
+			return None
+		peakCurrent = self.peakCurrent
+		if self.status == "saturated":
+			peakCurrent = max(peakCurrent, float(self.currentRange))
+		return chooseRange(peakCurrent, self.ranges, self.headroomFraction)
+
+
+	def toDict(self):
+		"""
+		The function `toDict` returns the state of the monitor as a dictionary of plain values.
+		"""
+		return {
+			"currentRange": self.currentRange,
+			"points": self.points,
+			"peakCurrent": self.peakCurrent,
+			"saturatedPoints": self.saturatedPoints,
+			"status": self.status,
+			"suggestedRange": self.suggestedRange,
+		}
+
+
+class RangeMemory:
+
+	def __init__(self, path=None):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The `RangeMemory` remembers the current range chosen for each parameter set, i.e.: each voltammetry
+		command string, so the next run of the same parameters starts with it.
+
+		:param path: The JSON file the ranges are kept in, created on the first change. None keeps them in
+		memory only
+		"""
+		self.path = path
+		self.ranges = {}
+		if path is not None and os.path.exists(path):
+			try:
+				with open(path, "r") as file:
+					self.ranges = json.load(file)
+			except (OSError, ValueError) as e:
+				raise Exception("Could not read the current range memory. Reason: ", e)
+
+
+	def get(self, command, default=None):
+		"""
+		The function `get` returns the range remembered for a parameter set.
+
+		:param command: The voltammetry command string, e.g.: `waveform.command`
+		:param default: The value returned when no range is remembered
+		:return: the current range, in microamps (uA), or `default`.
+		"""
+		return self.ranges.get(command, default)
+
+
+	def remember(self, command, currentRange):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `remember` keeps the range of a parameter set, saving the file when it changes.
+
+		:param command: The voltammetry command string
+		:param currentRange: The current range, in microamps (uA)
+		"""
+		if self.ranges.get(command) == currentRange:
+			return
+		self.ranges[command] = currentRange
+		if self.path is None:
+			return
+		try:
+			with open(self.path + ".tmp", "w") as file:
+				json.dump(self.ranges, file, indent=2)
+			os.replace(self.path + ".tmp", self.path)
+		except OSError as e:
+			raise Exception("Could not save the current range memory. Reason: ", e)
+
+
+class AutoRanger:
+
+	def __init__(self, device, memory=None, probe=True, maxProbes=3, probeSpeedup=4, maxProbeFraction=0.5,
+			  monitor=None):
+		"""
+		The `AutoRanger` picks the current range of each run of an `OpenAFE`, instead of a fixed one:
+
+		- a parameter set run before starts with the range remembered for it (see `RangeMemory`)
+		- otherwise, when `probe` is True, a fast version of the run (see `probeWaveform`) is made first, and
+		repeated at the suggested range until its range is right, so a saturated or coarse full length run is
+		not wasted. A run whose probe would not be much shorter than itself, e.g.: a single cycle CV, is not
+		probed: it starts at the given range and is checked after it
+		- after each run, the range its currents suggest is remembered for the next one
+
+		It enables the range monitor of the device, see `OpenAFE.enableRangeMonitor`.
+
+		:param device: A connected `OpenAFE`
+		:param memory: The `RangeMemory` of the chosen ranges, None keeps them for the life of this object
+		:param probe: When True, unknown parameter sets are probed before their first run
+		:param maxProbes: The maximum number of probes of a parameter set
+		:param probeSpeedup: How much faster than the run its probe is, see `probeWaveform`
+		:param maxProbeFraction: The longest probe made, as a fraction of the duration of its run
+		:param monitor: The `RangeMonitor` used, None uses one with the default thresholds
+		"""
+		self.device = device
+		self.memory = memory if memory is not None else RangeMemory()
+		self.probe = probe
+		self.maxProbes = maxProbes
+		self.probeSpeedup = probeSpeedup
+		self.maxProbeFraction = maxProbeFraction
+		self.monitor = device.enableRangeMonitor(monitor)
+		self.probes = 0  # probes made, over the life of this object
+
+
+	def selectRange(self, waveform, currentRange=None):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `selectRange` returns the current range a run should use, probing it if needed. It does
+		not set the range on the device.
+
+		:param waveform: The `Waveform` of the run, e.g.: from `openafe_waveform` or `loadSequence`
+		:param currentRange: The range to start from when the parameter set is unknown, None uses the largest
+		:return: the current range, in microamps (uA).
+		"""
+		remembered = self.memory.get(waveform.command)
+		if remembered is not None:
+			return remembered
+
+		currentRange = currentRange if currentRange is not None else max(self.monitor.ranges)
+		if not self.probe:
+			return currentRange
+
+		probe = probeWaveform(waveform, self.probeSpeedup)
+		if probe.duration_seconds > self.maxProbeFraction * waveform.duration_seconds:
+			return currentRange  # probing would take about as long as the run, which is checked instead
+		for _ in range(self.maxProbes):
+			self._runProbe(probe, currentRange)
+			suggestedRange = self.monitor.suggestedRange
+			if suggestedRange is None or suggestedRange == currentRange:
+				break
+			if self.monitor.status == "saturated" and currentRange == max(self.monitor.ranges):
+				break  # nothing larger to try
+			currentRange = suggestedRange
+
+		self.memory.remember(waveform.command, currentRange)
+		return currentRange
+
+
+	def check(self, waveform):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `check` is called after a run: it remembers the range suggested by its currents for its
+		parameter set.
+
+		:param waveform: The `Waveform` of the run
+		:return: a tuple (status, suggestedRange), see `RangeMonitor`; a "saturated" or "coarse" run should
+		be repeated at the suggested range.
+		"""
+		status, suggestedRange = self.monitor.status, self.monitor.suggestedRange
+		if suggestedRange is not None:
+			self.memory.remember(waveform.command, suggestedRange)
+		return status, suggestedRange
+
+
+	def _runProbe(self, probe, currentRange):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+		NOTE: This method can raise an Exception.
+
+		Runs a probe at a current range, with the callbacks of the device suspended so its points only reach
+		the range monitor.
+		"""
+		device = self.device
+		callbacks = device.onPointCallback, device.onBatchCallback, device.onEndCallback
+		device.onPointCallback = device.onBatchCallback = device.onEndCallback = None
+		try:
+			device.sendCommandsToMCU([device.currentRangeCommand(currentRange), probe.command])
+			device.receiveVoltammetryPoints()
+		finally:
+			device.onPointCallback, device.onBatchCallback, device.onEndCallback = callbacks
+		self.probes += 1
+
+
+def probeWaveform(waveform, speedup=4, minPointsPerSweep=20):
+	"""
+	NOTE: This function can raise an Exception.
+
+	The function `probeWaveform` returns a fast version of a voltammetry, sweeping the same potential window
+	with currents of the same size, to find its current range: a cyclic voltammetry is made with a single
+	cycle and `speedup` times larger steps (same scan rate, so it lasts as long as one cycle of the run), a
+	differential pulse voltammetry with `speedup` times larger steps (same pulses) and a square wave
+	voltammetry with a `speedup` times faster scan (same pulse frequency). The steps are kept small enough
+	for `minPointsPerSweep` points per sweep.
+
+	:param waveform: The `Waveform` of the voltammetry
+	:param speedup: How much larger the steps are
+	:param minPointsPerSweep: The minimum number of points per sweep of the probe
+	:return: the `Waveform` of the probe.
+	"""
+	values = [commandNumber(field) for field in waveform.command.split(",")[1:]]  # the arguments of its builder, in order
+	window = abs(waveform.endingPotential - waveform.startingPotential)
+	maxStep = max(waveform.stepPotential, window / minPointsPerSweep)
+
+	if waveform.protocol == "CV":
+		values[4] = commandNumber(min(waveform.stepPotential * speedup, maxStep))
+		values[5] = 1
+		return cyclicVoltammetryWaveform(*values)
+	if waveform.protocol == "DPV":
+		values[4] = commandNumber(min(waveform.stepPotential * speedup, maxStep))
+		return differentialPulseVoltammetryWaveform(*values)
+	values[3] = commandNumber(min(waveform.stepPotential * speedup, maxStep) * values[5])  # scan rate = step * frequency
+	return squareWaveVoltammetryWaveform(*values)
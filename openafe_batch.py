@@ -0,0 +1,299 @@
+# Runs a sequence of voltammetries, described in a JSON file, on one OpenAFE device. Run it with:
+#
+#   python openafe_batch.py sequence.json --port COM14 --output results
+#
+# Example of a sequence file, the parameters have the names of the `OpenAFE.make*Voltammetry` arguments
+# and the "defaults" are used by every run that does not set them:
+#
+# {
+#   "comPort": "COM14",
+#   "defaults": {"currentRange": 200, "delay_seconds": 0},
+#   "runs": [
+#     {"name": "cv", "protocol": "CV", "repeats": 2,
+#      "parameters": {"settlingTime": 1000, "startingPotential": -500, "endingPotential": 500,
+#                     "scanRate": 200, "stepSize": 5, "numberOfCycles": 2}},
+#     {"name": "dpv", "protocol": "DPV", "currentRange": 50, "delay_seconds": 30,
+#      "parameters": {"settlingTime": 1000, "startingPotential": -500, "endingPotential": 500,
+#                     "pulsePotential": 100, "stepPotential": 5, "pulseWidth": 2, "baseWidth": 20,
+#                     "samplePeriodPulse": 1, "samplePeriodBase": 2}},
+#     {"name": "swv", "protocol": "SW",
+#      "parameters": {"settlingTime": 1000, "startingPotential": -500, "endingPotential": 500,
+#                     "scanRate": 200, "pulsePotential": 100, "pulseFrequency": 10, "samplePeriodPulse": 1}}
+#   ]
+# }
+
+import argparse
+import json
+import os
+import time
+
+from openafe import OpenAFE
+from openafe_recorder import PointRecorder
+from openafe_waveform import cyclicVoltammetryWaveform, differentialPulseVoltammetryWaveform, squareWaveVoltammetryWaveform
+
+# protocol name -> function validating its parameters and building its `Waveform`
+PROTOCOLS = {
+	"CV": cyclicVoltammetryWaveform,
+	"DPV": differentialPulseVoltammetryWaveform,
+	"SW": squareWaveVoltammetryWaveform,
+	"SWV": squareWaveVoltammetryWaveform,
+}
+
+
+def loadSequence(path):
+	"""
+	NOTE: This function can raise an Exception.
+
+	The function `loadSequence` reads a sequence file and returns its runs, with the defaults applied and
+	the parameters of every run already validated, so a mistake in the file is found before the first run
+	starts instead of in the middle of the sequence.
+
+	:param path: The path of the JSON sequence file
+	:return: a tuple (comPort, runs), where comPort is None if the file does not set it and runs is a list of
+	dictionaries with the keys: name, protocol, parameters, waveform (see `openafe_waveform`), command,
+	currentRange, repeats and delay_seconds.
+	"""
+	try:
+		with open(path, "r") as file:
+			sequence = json.load(file)
+	except (OSError, ValueError) as e:
+		raise Exception("Could not read the sequence file. Reason: ", e)
+
+	defaults = sequence.get("defaults", {})
+	runs = []
+	for index, run in enumerate(sequence.get("runs", [])):
+		parameters = dict(defaults.get("parameters", {}))
+		parameters.update(run.get("parameters", {}))
+		protocol = run.get("protocol", defaults.get("protocol"))
+		name = run.get("name", str(protocol) + str(index))
+
+		if protocol not in PROTOCOLS:
+			raise Exception("Unknown protocol in run " + name + ": " + str(protocol) + ", use one of: " + ", ".join(PROTOCOLS))
+		try:
+			waveform = PROTOCOLS[protocol](**parameters)
+		except Exception as e:
+			raise Exception("Wrong parameters in run " + name + ". Reason: ", e)
+
+		runs.append({
+			"name": name,
+			"protocol": protocol,
+			"parameters": parameters,
+			"waveform": waveform,
+			"command": waveform.command,
+			"currentRange": run.get("currentRange", defaults.get("currentRange")),
+			"repeats": int(run.get("repeats", defaults.get("repeats", 1))),
+			"delay_seconds": float(run.get("delay_seconds", defaults.get("delay_seconds", 0))),
+		})
+
+	if len(runs) == 0:
+		raise Exception("The sequence file has no runs.")
+
+	return sequence.get("comPort"), runs
+
+
+class BatchRunner:
+
+	def __init__(self, device, outputDirectory=None, stopOnError=False, onRunStartCallback=None,
+			  onRunEndCallback=None, archive=None, deviceId=None, autoRanger=None):
+		"""
+		The `BatchRunner` runs a sequence of voltammetries (see `loadSequence`) on one connected `OpenAFE`,
+		without reopening the port or waiting for `MSG,RDY` between runs. The current range is only sent
+		when it changes (see `OpenAFE.sendCommandsToMCU`), so the time between runs is one or two command
+		round trips, the settling time of the device and the delay asked by the sequence.
+		Every run is streamed to its own `PointRecorder` file in `outputDirectory`.
+
+		:param device: A connected `OpenAFE`, its callbacks are called for every run as usual
+		:param outputDirectory: The directory of the recordings, e.g.: "results/001_cv_1.oafe". None does not
+		record the runs
+		:param stopOnError: When True, the first failed run stops the sequence, otherwise the failure is
+		reported in the results and the next run starts
+		:param onRunStartCallback: An optional function called with the run dictionary and the repeat number
+		(from 1) before each run
+		:param onRunEndCallback: An optional function called with the result dictionary after each run
+		:param archive: An optional `RunArchive` every recorded run is added to, see `openafe_archive`
+		:param deviceId: The id of the device in the archive, None uses its serial port
+		:param autoRanger: An optional `AutoRanger` choosing the current range of every run instead of the
+		sequence, see `openafe_autorange`. The range of the sequence is where its search starts
+		"""
+		self.device = device
+		self.outputDirectory = outputDirectory
+		self.stopOnError = stopOnError
+		self.onRunStartCallback = onRunStartCallback
+		self.onRunEndCallback = onRunEndCallback
+		self.archive = archive
+		self.autoRanger = autoRanger
+		self.deviceId = deviceId if deviceId is not None else device.comPort
+		self.currentRange = None  # last current range accepted by the device
+
+		if outputDirectory is not None:
+			os.makedirs(outputDirectory, exist_ok=True)
+
+
+	def run(self, runs):
+		"""
+		NOTE: This method can raise an Exception, when `stopOnError` is True.
+
+		The function `run` runs every run of the sequence, with its repeats, and waits for each one to end.
+
+		:param runs: The list of runs returned by `loadSequence`
+		:return: a list with one dictionary per run and repeat, with the keys: name, protocol, repeat,
+		command, currentRange, points (the number of recorded points), duration_seconds, path, archiveId (the
+		id of the run in the archive, if any), rangeStatus and suggestedRange (with an `autoRanger`, see
+		`AutoRanger.check`) and error (None if the run succeeded).
+		"""
+		results = []
+		number = 0
+		for run in runs:
+			for repeat in range(1, run["repeats"] + 1):
+				if number > 0 and run["delay_seconds"] > 0:
+					time.sleep(run["delay_seconds"])
+				number += 1
+
+				result = self._runOnce(run, repeat, number)
+				results.append(result)
+
+				if self.onRunEndCallback is not None:
+					self.onRunEndCallback(result)
+				if result["error"] is not None and self.stopOnError:
+					raise Exception("Run " + run["name"] + " failed. Reason: ", result["error"])
+		return results
+
+
+	def _runOnce(self, run, repeat, number):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Sends the commands of one run, receives its points into its recording and returns its result.
+		"""
+		if self.onRunStartCallback is not None:
+			self.onRunStartCallback(run, repeat)
+
+		result = {
+			"name": run["name"],
+			"protocol": run["protocol"],
+			"repeat": repeat,
+			"command": run["command"],
+			"currentRange": run["currentRange"],
+			"points": 0,
+			"duration_seconds": 0.0,
+			"path": None,
+			"archiveId": None,
+			"rangeStatus": None,
+			"suggestedRange": None,
+			"error": None,
+		}
+
+		recorder = None
+		started = False  # the device is running the voltammetry
+		start = time.perf_counter()
+		try:
+			if self.autoRanger is not None:
+				try:
+					result["currentRange"] = self.autoRanger.selectRange(run["waveform"], run["currentRange"])
+				finally:
+					self.currentRange = self.device.currentRange  # the probes changed it
+
+			if self.outputDirectory is not None:
+				result["path"] = os.path.join(self.outputDirectory, f"{number:03d}_{run['name']}_{repeat}.oafe")
+				recorder = PointRecorder(result["path"], {
+					"name": run["name"],
+					"protocol": run["protocol"],
+					"repeat": repeat,
+					"command": run["command"],
+					"currentRange": result["currentRange"],
+					"parameters": run["parameters"],
+				})
+
+			commands = []
+			if result["currentRange"] is not None and result["currentRange"] != self.currentRange:
+				commands.append(OpenAFE.currentRangeCommand(result["currentRange"]))
+			commands.append(run["command"])
+
+			try:
+				self.device.sendCommandsToMCU(commands)
+			except Exception:
+				self.currentRange = None  # unknown whether the range was accepted
+				raise
+			self.currentRange = result["currentRange"] if result["currentRange"] is not None else self.currentRange
+
+			started = True
+			self.device.receiveVoltammetryPoints(recorder=recorder)
+			started = False
+
+			if self.autoRanger is not None:
+				result["rangeStatus"], result["suggestedRange"] = self.autoRanger.check(run["waveform"])
+
+		except Exception as e:
+			result["error"] = str(e)
+			if started:
+				# the rest of the failed run is still coming, it must not be read as the answers of the next one
+				try:
+					self.device.discardVoltammetry()
+				except Exception as discardError:
+					result["error"] += ", then could not discard the rest of the run: " + str(discardError)
+		finally:
+			if recorder is not None:
+				result["points"] = recorder.numberOfRecords
+				recorder.close()
+			result["duration_seconds"] = time.perf_counter() - start
+
+		if self.archive is not None and recorder is not None and result["error"] is None:
+			try:
+				result["archiveId"] = self.archive.storeRecording(result["path"], self.deviceId)
+			except Exception as e:
+				result["error"] = "Could not archive the run: " + str(e)
+
+		return result
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Runs a sequence of voltammetries on an OpenAFE device.")
+	parser.add_argument("sequence", help="the JSON sequence file")
+	parser.add_argument("--port", help="the COM port of the device, overrides the one in the sequence file")
+	parser.add_argument("--output", default="results", help="the directory of the recordings (default: results)")
+	parser.add_argument("--stop-on-error", action="store_true", help="stop the sequence at the first failed run")
+	parser.add_argument("--archive", help="also add every run to the run archive in this directory")
+	parser.add_argument("--device-id", help="the id of the device in the archive (default: its COM port)")
+	parser.add_argument("--auto-range", metavar="FILE",
+		help="choose the current range of every run, remembering the chosen ranges in this JSON file")
+	arguments = parser.parse_args()
+
+	def onRunStart(run, repeat):
+		print(f"INFO: Starting {run['name']} ({run['protocol']}), repeat {repeat} of {run['repeats']}, "
+			f"{run['waveform'].numberOfPoints} points in about {run['waveform'].duration_seconds:.0f} s")
+
+	def onRunEnd(result):
+		if result["error"] is None:
+			print(f"INFO: {result['name']} finished, {result['points']} points in {result['duration_seconds']:.1f} s")
+			if result["rangeStatus"] in ("saturated", "coarse"):
+				print(f"WARNING: {result['name']} was {result['rangeStatus']} at {result['currentRange']} uA, its next "
+					f"runs use {result['suggestedRange']} uA")
+		else:
+			print(f"ERROR: {result['name']} failed: {result['error']}")
+
+	try:
+		comPort, runs = loadSequence(arguments.sequence)
+		comPort = arguments.port or comPort
+		if comPort is None:
+			raise Exception("No COM port given, set it with --port or in the sequence file.")
+
+		openAFE_device = OpenAFE(comPort)
+		archive = None
+		if arguments.archive:
+			from openafe_archive import RunArchive
+			archive = RunArchive(arguments.archive)
+
+		autoRanger = None
+		if arguments.auto_range:
+			from openafe_autorange import AutoRanger, RangeMemory
+			autoRanger = AutoRanger(openAFE_device, RangeMemory(arguments.auto_range))
+
+		runner = BatchRunner(openAFE_device, arguments.output, arguments.stop_on_error, onRunStart, onRunEnd, archive,
+			arguments.device_id, autoRanger)
+		results = runner.run(runs)
+
+		failed = sum(1 for result in results if result["error"] is not None)
+		print(f"INFO: Sequence finished, {len(results) - failed} runs succeeded, {failed} failed.")
+
+	except Exception as exception:
+		print(exception)
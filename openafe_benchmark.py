@@ -0,0 +1,880 @@
+# Benchmarks for the OpenAFE Python tools. Run it with:
+#
+#   python openafe_benchmark.py                          # every benchmark
+#   python openafe_benchmark.py framing latency          # some of them
+#   python openafe_benchmark.py --save baseline.json     # keep the results
+#   python openafe_benchmark.py --compare baseline.json  # flag the regressions against kept results
+#   python openafe_benchmark.py --stream capture.bin     # parse a recorded byte stream instead of a synthetic one
+#
+# No device is needed: the frames are replayed from memory through a fake serial port.
+
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import math
+import tracemalloc
+from collections import deque
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+import openafe_cli
+from openafe import OpenAFE
+from openafe_cycles import segmentCycles
+from openafe_framing import FrameReader, makeFrame
+from openafe_liveplot import LivePlot, CYCLE_COLORS
+from openafe_metrics import LatencyHistogram
+from openafe_peaks import StreamingPeakAnalyzer, analyzeCyclicVoltammetry, analyzePulseVoltammetryBatch
+from openafe_pipeline import AnalysisPipeline
+from openafe_pointstore import PointStore
+from openafe_pool import OpenAFEPool
+from openafe_simulator import SimulatedOpenAFE
+
+
+class ReplaySerial(io.RawIOBase):
+
+	def __init__(self, data):
+		"""
+		The `ReplaySerial` is an in-memory stand-in for `serial.Serial` that replays a recorded byte stream.
+		Like `serial.Serial`, it is a raw IO object, so its `readline` reads one byte at a time.
+
+		:param data: The bytes to be replayed
+		"""
+		super().__init__()
+		self.data = data
+		self.position = 0
+
+
+	@property
+	def in_waiting(self):
+		return len(self.data) - self.position
+
+
+	def readable(self):
+		return True
+
+
+	def read(self, size=1):
+		chunk = self.data[self.position:self.position + size]
+		self.position += len(chunk)
+		return chunk
+
+
+	def write(self, data):
+		return len(data)
+
+
+class PacedReplaySerial(ReplaySerial):
+
+	def __init__(self, data, frameRate):
+		"""
+		The `PacedReplaySerial` is a `ReplaySerial` that releases the frames of the stream one by one at
+		`frameRate` frames per second, like a device sending them, and keeps the time at which each frame
+		was released, to measure the latency until it reaches a callback.
+
+		:param data: The bytes to be replayed, made of complete frames
+		:param frameRate: The number of frames released per second
+		"""
+		super().__init__(data)
+		self.frameEnds = []
+		end = data.find(b"\n")
+		while end >= 0:
+			self.frameEnds.append(end + 1)
+			end = data.find(b"\n", end + 1)
+		self.frameInterval = 1.0 / frameRate
+		self.startTime = None
+
+
+	def releaseTime(self, frameIndex):
+		"""
+		The function `releaseTime` returns the `time.perf_counter()` at which a frame was released.
+
+		:param frameIndex: The index of the frame in the stream
+		"""
+		return self.startTime + frameIndex * self.frameInterval
+
+
+	@property
+	def in_waiting(self):
+		return self._released() - self.position
+
+
+	def read(self, size=1):
+		while self._released() <= self.position:
+			if self.position >= len(self.data):
+				return b""
+			time.sleep(min(self.frameInterval, 0.001))
+		chunk = self.data[self.position:min(self.position + size, self._released())]
+		self.position += len(chunk)
+		return chunk
+
+
+	def _released(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Returns the number of bytes released so far, the pacing starts at the first read.
+		"""
+		if self.startTime is None:
+			self.startTime = time.perf_counter()
+		frames = int((time.perf_counter() - self.startTime) / self.frameInterval) + 1
+		return self.frameEnds[min(frames, len(self.frameEnds)) - 1]
+
+
+def loadStream(path):
+	"""
+	NOTE: This function can raise an Exception.
+
+	The function `loadStream` reads a byte stream recorded from the serial port of a device (e.g.: with a
+	serial terminal logging to a file), keeping its complete frames and ending it with "MSG,END".
+
+	:param path: The path of the recorded stream
+	:return: the stream bytes.
+	"""
+	try:
+		with open(path, "rb") as file:
+			data = file.read()
+	except OSError as e:
+		raise Exception("Could not read the recorded stream. Reason: ", e)
+
+	data = data[:data.rfind(b"\n") + 1]
+	if makeFrame("MSG,END") not in data:
+		data += makeFrame("MSG,END")
+	return data
+
+
+def makeCyclicVoltammetryPoints(numberOfPoints, startingPotential=-500, endingPotential=500, stepSize=2):
+	"""
+	The function `makeCyclicVoltammetryPoints` generates a synthetic cyclic voltammetry with as many cycles
+	as needed to reach `numberOfPoints`.
+
+	:param numberOfPoints: The number of points to generate
+	:param startingPotential: The starting potential, in millivolts (mV)
+	:param endingPotential: The ending potential, in millivolts (mV)
+	:param stepSize: The step size, in millivolts (mV)
+	:return: a tuple of two lists (voltages, currents).
+	"""
+	voltages = []
+	currents = []
+	voltage = startingPotential
+	step = stepSize
+	for _ in range(numberOfPoints):
+		voltages.append(voltage)
+		currents.append(50 * math.tanh((voltage - 100) / 80) + (5 if step > 0 else -5))
+		if voltage + step > endingPotential or voltage + step < startingPotential:
+			step = -step
+		voltage += step
+	return voltages, currents
+
+
+def makePointStream(numberOfPoints):
+	"""
+	The function `makePointStream` generates the byte stream of a synthetic cyclic voltammetry, as sent by
+	the OpenAFE device: one point frame per point followed by the end message.
+
+	:param numberOfPoints: The number of point frames
+	:return: the stream bytes.
+	"""
+	voltages, currents = makeCyclicVoltammetryPoints(numberOfPoints)
+	frames = [makeFrame(f"SET,{voltage:.2f},{current:.4f}") for voltage, current in zip(voltages, currents)]
+	frames.append(makeFrame("MSG,END"))
+	return b"".join(frames)
+
+
+def _legacyWaitForMessage(ser):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	The line framing used by `OpenAFE.waitForMessage` before the `FrameReader`: the repr of the line is
+	sliced and the checksum is computed one character at a time. Kept here only as the baseline for the
+	framing benchmark.
+	"""
+	messageReceived = str(ser.readline())[2:][:-3]
+	checksum = messageReceived[-2:]
+
+	calculatedChecksum = 0
+	for char in messageReceived[1:][:-3]:
+		calculatedChecksum = (calculatedChecksum ^ ord(char))
+
+	checksumInMessage = 0
+	index = 1
+	for char in checksum:
+		if ord(char) < 0x41:
+			checksumInMessage |= (ord(char) - 0x30) << (index * 4)
+		else:
+			checksumInMessage |= (ord(char) - 0x37) << (index * 4)
+		index -= 1
+
+	if calculatedChecksum != checksumInMessage:
+		raise Exception("Message from the MCU got corrupted.")
+	return messageReceived[1:][:-3]
+
+
+def benchmarkFraming(numberOfFrames=50000, stream=None):
+	"""
+	The function `benchmarkFraming` measures how many frames per second are framed and validated from a
+	recorded byte stream, with the legacy readline path and with the `FrameReader`.
+
+	:param numberOfFrames: The number of point frames of the synthetic stream
+	:param stream: A recorded stream (see `loadStream`) used instead of the synthetic one
+	:return: a dictionary with the frames per second of each path and the number of corrupted frames.
+	"""
+	if stream is None:
+		stream = makePointStream(numberOfFrames)
+	frames = stream[:stream.find(makeFrame("MSG,END"))].count(b"\n") + 1
+
+	ser = ReplaySerial(stream)
+	start = time.perf_counter()
+	while True:
+		try:
+			if _legacyWaitForMessage(ser) == "MSG,END":
+				break
+		except Exception:
+			pass  # a corrupted frame of a recorded stream
+	legacyTime = time.perf_counter() - start
+
+	frameReader = FrameReader(ReplaySerial(stream))
+	corruptedFrames = 0
+	start = time.perf_counter()
+	while True:
+		message, isValid = frameReader.readFrame()
+		if not isValid:
+			corruptedFrames += 1
+		elif message == "MSG,END":
+			break
+	frameReaderTime = time.perf_counter() - start
+
+	return {
+		"frames": frames,
+		"corruptedFrames": corruptedFrames,
+		"legacyFramesPerSecond": frames / legacyTime,
+		"frameReaderFramesPerSecond": frames / frameReaderTime,
+	}
+
+
+def benchmarkLatency(frameRate=2000, numberOfPoints=4000, stream=None):
+	"""
+	The function `benchmarkLatency` measures the end to end latency of the points, from the moment their
+	frame is available on the (fake) serial port until they reach the point callback, for each way of
+	receiving them with `OpenAFE.receiveVoltammetryPoints`.
+
+	:param frameRate: The number of frames per second released by the fake serial port
+	:param numberOfPoints: The number of points of the synthetic stream
+	:param stream: A recorded stream (see `loadStream`) used instead of the synthetic one
+	:return: a list of dictionaries, one per mode, with the latency percentiles in milliseconds.
+	"""
+	if stream is None:
+		stream = makePointStream(numberOfPoints)
+	stream = makeFrame("MSG,RDY") + stream
+
+	# frame index of every valid point frame, the corrupted frames of a recorded stream are skipped
+	pointFrames = []
+	for frameIndex, line in enumerate(stream.split(b"\n")):
+		message, isValid = FrameReader.checkFrame(line)
+		if isValid and message.startswith("SET"):
+			pointFrames.append(frameIndex)
+
+	modes = [
+		("plain", {}),
+		("readerThread", {"useReaderThread": True}),
+		("batches", {"batchSize": 64, "maxLatency_milliseconds": 10}),
+	]
+	results = []
+	for mode, options in modes:
+		ser = PacedReplaySerial(stream, frameRate)
+		histogram = LatencyHistogram()
+		received = [0]
+
+		def onPoint(voltage, current):
+			histogram.record(time.perf_counter() - ser.releaseTime(pointFrames[received[0]]))
+			received[0] += 1
+
+		device = OpenAFE(None, onPoint, transport=ser)
+		if mode == "batches":
+			device.onPointCallback = None
+			device.onBatchCallback = lambda voltages, currents: [onPoint(None, None) for _ in range(len(voltages))]
+		device.enableRecovery(maxCorruptedFrames=None)
+		device.receiveVoltammetryPoints(**options)
+
+		results.append({
+			"mode": mode,
+			"points": histogram.count,
+			"p50_milliseconds": histogram.percentile(50) * 1e3,
+			"p99_milliseconds": histogram.percentile(99) * 1e3,
+			"max_milliseconds": histogram.maximum * 1e3,
+		})
+	return results
+
+
+def benchmarkInstrumentation(numberOfPoints=50000, repeats=3):
+	"""
+	The function `benchmarkInstrumentation` measures the points per second of `OpenAFE.receiveVoltammetryPoints`
+	on a recorded byte stream, with the instrumentation disabled and enabled.
+
+	:param numberOfPoints: The number of points of the stream
+	:param repeats: The number of runs of each mode, the fastest one is kept
+	:return: a dictionary with the points per second of each mode and the metrics of the last enabled run.
+	"""
+	stream = makeFrame("MSG,RDY") + makePointStream(numberOfPoints)
+	results = {}
+	for instrumented in (False, True):
+		best = math.inf
+		for _ in range(repeats):
+			device = OpenAFE(None, lambda voltage, current: None, transport=ReplaySerial(stream))
+			if instrumented:
+				metrics = device.enableInstrumentation()
+			start = time.perf_counter()
+			device.receiveVoltammetryPoints()
+			best = min(best, time.perf_counter() - start)
+		results["instrumented" if instrumented else "plain"] = numberOfPoints / best
+
+	return {
+		"points": numberOfPoints,
+		"plainPointsPerSecond": results["plain"],
+		"instrumentedPointsPerSecond": results["instrumented"],
+		"metrics": metrics.toDict(),
+	}
+
+
+def _heavyAnalysis(voltages, currents, firstIndex):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	A CPU bound analysis of a batch for the pipeline benchmark: a sliding cubic fit of the currents.
+	"""
+	fitted = []
+	for start in range(0, len(voltages) - 16, 4):
+		fitted.append(np.polyval(np.polyfit(voltages[start:start + 16], currents[start:start + 16], 3), voltages[start + 8]))
+	return firstIndex, fitted
+
+
+def benchmarkPipeline(numberOfPoints=20000, workers=None, batchSize=256):
+	"""
+	The function `benchmarkPipeline` measures the points per second of a run whose batches go through a
+	CPU bound analysis, run in the batch callback and run in an `AnalysisPipeline`.
+
+	:param numberOfPoints: The number of points of the run
+	:param workers: The number of worker processes of the pipeline, None uses the number of cores
+	:param batchSize: The number of points of each batch
+	:return: a dictionary with the points per second of each mode.
+	"""
+	stream = makeFrame("MSG,RDY") + makePointStream(numberOfPoints)
+
+	device = OpenAFE(None, onBatchCallback=lambda voltages, currents: _heavyAnalysis(voltages, currents, 0),
+		transport=ReplaySerial(stream))
+	start = time.perf_counter()
+	device.receiveVoltammetryPoints(batchSize=batchSize)
+	inlineTime = time.perf_counter() - start
+
+	with AnalysisPipeline(_heavyAnalysis, workers) as pipeline:
+		pipeline.submit(np.arange(batchSize, dtype=float), np.ones(batchSize))  # start the workers before measuring
+		pipeline.finish()
+		device = OpenAFE(None, transport=ReplaySerial(stream))
+		start = time.perf_counter()
+		device.receiveVoltammetryPoints(batchSize=batchSize, pipeline=pipeline)
+		pipelineTime = time.perf_counter() - start
+		workers = pipeline.workers
+
+	return {
+		"points": numberOfPoints,
+		"workers": workers,
+		"inlinePointsPerSecond": numberOfPoints / inlineTime,
+		"pipelinePointsPerSecond": numberOfPoints / pipelineTime,
+	}
+
+
+def benchmarkCommandLine(numberOfPoints=50000, repeats=5):
+	"""
+	The function `benchmarkCommandLine` measures the startup time of the command line tool, headless and
+	with the plotting imports of `openafe_plotter.py`, and the points per second of its headless output.
+
+	:param numberOfPoints: The number of points written by the headless output
+	:param repeats: The number of times each startup is measured, the fastest one is kept
+	:return: a dictionary with the startup times in milliseconds and the headless points per second.
+	"""
+	def startupTime(code):
+		best = math.inf
+		for _ in range(repeats):
+			start = time.perf_counter()
+			subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+			best = min(best, time.perf_counter() - start)
+		return best
+
+	headlessStartup = startupTime("import sys, openafe_cli; assert 'matplotlib' not in sys.modules")
+	plotterStartup = startupTime("import openafe_plotter")
+
+	stream = makeFrame("MSG,RDY") + makePointStream(numberOfPoints)
+	device = OpenAFE(None, transport=ReplaySerial(stream))
+	with open(os.devnull, "w") as output:
+		start = time.perf_counter()
+		openafe_cli.runHeadless(device, output)
+		headlessTime = time.perf_counter() - start
+
+	return {
+		"headlessStartup_milliseconds": headlessStartup * 1e3,
+		"plotterStartup_milliseconds": plotterStartup * 1e3,
+		"points": numberOfPoints,
+		"headlessPointsPerSecond": numberOfPoints / headlessTime,
+	}
+
+
+def benchmarkPool(deviceCounts=(1, 2, 4, 8), pointRate=4000, numberOfCycles=2):
+	"""
+	The function `benchmarkPool` measures the total throughput of an `OpenAFEPool` of simulated devices,
+	each one sending points in real time at `pointRate`.
+
+	:param deviceCounts: The numbers of devices measured
+	:param pointRate: The number of points per second sent by each simulated device
+	:param numberOfCycles: The number of cycles of the cyclic voltammetry run on every device
+	:return: a list of dictionaries, one per device count, with the total points per second.
+	"""
+	results = []
+	for deviceCount in deviceCounts:
+		deviceIds = [f"sim{index}" for index in range(deviceCount)]
+		pool = OpenAFEPool(deviceIds, {deviceId: SimulatedOpenAFE(pointRate=pointRate) for deviceId in deviceIds})
+		pool.open()
+		statistics = pool.run(lambda device: device.makeCyclicVoltammetry(0, -500, 500, 250, 1, numberOfCycles))
+		pool.close()
+		results.append({
+			"devices": deviceCount,
+			"totalPointsPerSecond": pool.totalPointsPerSecond(),
+			"errors": sum(1 for deviceStatistics in statistics.values() if deviceStatistics.error is not None),
+		})
+	return results
+
+
+def benchmarkSegmentation(numberOfPoints=100000):
+	"""
+	The function `benchmarkSegmentation` measures the labelling of cycles and sweep directions with the
+	per point loop of the legacy plotter and with the vectorized `segmentCycles`.
+
+	:param numberOfPoints: The number of points of the synthetic cyclic voltammetry
+	:return: a dictionary with the time of each approach, in milliseconds.
+	"""
+	voltages, _ = makeCyclicVoltammetryPoints(numberOfPoints)
+
+	start = time.perf_counter()
+	cycleBoundaries = [0]
+	for i in range(1, len(voltages) - 1):
+		if voltages[i - 1] > voltages[i] and voltages[i] <= voltages[0]:
+			cycleBoundaries.append(i)
+	cycleIndex = 0
+	ascending = []
+	for i in range(1, len(voltages)):
+		if cycleIndex < len(cycleBoundaries) - 1 and i >= cycleBoundaries[cycleIndex + 1]:
+			cycleIndex += 1
+		ascending.append(voltages[i] > voltages[i - 1])
+	legacyTime = time.perf_counter() - start
+
+	voltageArray = np.asarray(voltages)
+	start = time.perf_counter()
+	segmentCycles(voltageArray)
+	vectorizedTime = time.perf_counter() - start
+
+	return {
+		"points": numberOfPoints,
+		"legacy_milliseconds": legacyTime * 1e3,
+		"vectorized_milliseconds": vectorizedTime * 1e3,
+	}
+
+
+def benchmarkPeaks(numberOfPoints=100000, numberOfRuns=1000, pointsPerRun=201):
+	"""
+	The function `benchmarkPeaks` measures the throughput of the peak analysis: a long cyclic voltammetry
+	analysed in batch and in streaming mode, and many stored pulse voltammetry runs analysed at once.
+
+	:param numberOfPoints: The number of points of the synthetic cyclic voltammetry
+	:param numberOfRuns: The number of synthetic pulse voltammetry runs
+	:param pointsPerRun: The number of points of each pulse voltammetry run
+	:return: a dictionary with the points per second of the cyclic analyses and the runs per second of
+	the pulse analysis.
+	"""
+	voltages, currents = makeCyclicVoltammetryPoints(numberOfPoints)
+
+	start = time.perf_counter()
+	analyzeCyclicVoltammetry(voltages, currents)
+	batchTime = time.perf_counter() - start
+
+	analyzer = StreamingPeakAnalyzer()
+	start = time.perf_counter()
+	for voltage, current in zip(voltages, currents):
+		analyzer.addPoint(voltage, current)
+	analyzer.finish()
+	streamingTime = time.perf_counter() - start
+
+	runVoltages = np.tile(np.linspace(-500, 500, pointsPerRun), (numberOfRuns, 1))
+	runCurrents = 20 / np.cosh((runVoltages - 75) / 50) ** 2 + np.random.default_rng(0).normal(0, 0.2, runVoltages.shape)
+	start = time.perf_counter()
+	analyzePulseVoltammetryBatch(runVoltages, runCurrents)
+	pulseTime = time.perf_counter() - start
+
+	return {
+		"cyclicBatchPointsPerSecond": numberOfPoints / batchTime,
+		"cyclicStreamingPointsPerSecond": numberOfPoints / streamingTime,
+		"pulseRunsPerSecond": numberOfRuns / pulseTime,
+	}
+
+
+def _legacyPlotPoints(voltages, currents, startingPotential, endingPotential):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	The full redraw approach used by the plotter before the `LivePlot`: clear the figure and plot one
+	segment per point. Kept here only as the baseline for the plotting benchmark.
+	"""
+	plt.clf()
+	cycleBoundaries = [0]
+	for i in range(1, len(voltages) - 1):
+		if voltages[i - 1] > voltages[i] and voltages[i] <= startingPotential:
+			cycleBoundaries.append(i)
+
+	cycleIndex = 0
+	for i in range(1, len(voltages)):
+		if cycleIndex < len(cycleBoundaries) - 1 and i >= cycleBoundaries[cycleIndex + 1]:
+			cycleIndex += 1
+		ascendingColor, descendingColor = CYCLE_COLORS[cycleIndex % len(CYCLE_COLORS)]
+		color = ascendingColor if voltages[i] > voltages[i - 1] else descendingColor
+		plt.plot([voltages[i - 1], voltages[i]], [currents[i - 1], currents[i]], color=color)
+
+	plt.xlim(startingPotential - 100, endingPotential + 100)
+	plt.gcf().canvas.draw()
+
+
+def benchmarkPlotting(historySizes=(1000, 10000, 100000), framesPerSize=5, legacyMaxSize=5000):
+	"""
+	The function `benchmarkPlotting` measures the time of one frame (one refresh of the plot) with a given
+	number of points already plotted, for the legacy full redraw and for the `LivePlot`.
+
+	:param historySizes: The numbers of points already plotted when the frames are measured
+	:param framesPerSize: The number of frames averaged for each history size
+	:param legacyMaxSize: The largest history size measured with the legacy full redraw, which is slow
+	:return: a list of dictionaries, one per history size, with the frame times in milliseconds.
+	"""
+	results = []
+	for historySize in historySizes:
+		# under four cycles whatever the history size, so no frame adds a new line (and legend entry)
+		voltages, currents = makeCyclicVoltammetryPoints(historySize + framesPerSize * 5, stepSize=7000 / historySize)
+
+		# live plot: add the history, then measure frames of 5 new points each
+		livePlot = LivePlot(-500, 500, maxFramesPerSecond=1e9)
+		livePlot.addPoints(voltages[:historySize], currents[:historySize])
+		livePlot.redraw()
+		start = time.perf_counter()
+		for frame in range(framesPerSize):
+			first = historySize + frame * 5
+			livePlot.addPoints(voltages[first:first + 5], currents[first:first + 5])
+		liveFrame = (time.perf_counter() - start) / framesPerSize
+		plt.close(livePlot.figure)
+
+		legacyFrame = None
+		if historySize <= legacyMaxSize:
+			plt.figure()
+			start = time.perf_counter()
+			_legacyPlotPoints(voltages[:historySize], currents[:historySize], -500, 500)
+			legacyFrame = time.perf_counter() - start
+			plt.close("all")
+
+		results.append({
+			"historySize": historySize,
+			"liveFrame_milliseconds": liveFrame * 1e3,
+			"legacyFrame_milliseconds": None if legacyFrame is None else legacyFrame * 1e3,
+		})
+	return results
+
+
+def benchmarkPointStore(numberOfPoints=100000, pixelBudget=2000):
+	"""
+	The function `benchmarkPointStore` measures the memory used to hold a run in two deques of floats (the
+	legacy plotter) and in a `PointStore`, and the time to get the points to be drawn from the store.
+
+	:param numberOfPoints: The number of points of the run
+	:param pixelBudget: The number of points to be drawn
+	:return: a dictionary with the memory per point in bytes and the display times in milliseconds.
+	"""
+	voltages, currents = makeCyclicVoltammetryPoints(numberOfPoints)
+	tracemalloc.start()
+	legacyVoltages = deque()
+	legacyCurrents = deque()
+	for voltage, current in zip(voltages, currents):
+		legacyVoltages.append(voltage * 1.0)  # new float objects, as parsed from the serial port
+		legacyCurrents.append(current * 1.0)
+	legacyBytes = tracemalloc.get_traced_memory()[0]
+	del legacyVoltages, legacyCurrents
+	tracemalloc.stop()
+
+	tracemalloc.start()
+	store = PointStore()
+	for voltage, current in zip(voltages, currents):
+		store.append(voltage * 1.0, current * 1.0)
+	storeBytes = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+
+	start = time.perf_counter()
+	store.getDisplayPoints(pixelBudget)
+	fullDisplay = time.perf_counter() - start
+
+	start = time.perf_counter()
+	for i in range(100):
+		store.append(voltages[i], currents[i])
+		store.getDisplayPoints(pixelBudget)
+	incrementalDisplay = (time.perf_counter() - start) / 100
+
+	return {
+		"points": numberOfPoints,
+		"legacyBytesPerPoint": legacyBytes / numberOfPoints,
+		"storeBytesPerPoint": storeBytes / numberOfPoints,
+		"fullDisplay_milliseconds": fullDisplay * 1e3,
+		"incrementalDisplay_milliseconds": incrementalDisplay * 1e3,
+	}
+
+
+def _printFraming(framing):
+	print(f"Framing, {framing['frames']} frames ({framing['corruptedFrames']} corrupted):")
+	print(f"  legacy readline: {framing['legacyFramesPerSecond']:10.0f} frames/s")
+	print(f"  FrameReader:     {framing['frameReaderFramesPerSecond']:10.0f} frames/s")
+
+
+def _printLatency(latency):
+	print("Latency from the serial port to the point callback:")
+	for result in latency:
+		print(f"  {result['mode']:12s} p50 {result['p50_milliseconds']:7.2f} ms, p99 {result['p99_milliseconds']:7.2f} ms, "
+			f"max {result['max_milliseconds']:7.2f} ms")
+
+
+def _printSegmentation(segmentation):
+	print(f"Cycle segmentation, {segmentation['points']} points:")
+	print(f"  legacy loop: {segmentation['legacy_milliseconds']:8.2f} ms")
+	print(f"  vectorized:  {segmentation['vectorized_milliseconds']:8.2f} ms")
+
+
+def _printPeaks(peaks):
+	print("Peak analysis:")
+	print(f"  cyclic, batch:     {peaks['cyclicBatchPointsPerSecond']:12.0f} points/s")
+	print(f"  cyclic, streaming: {peaks['cyclicStreamingPointsPerSecond']:12.0f} points/s")
+	print(f"  pulse, batch:      {peaks['pulseRunsPerSecond']:12.0f} runs/s")
+
+
+def _printInstrumentation(instrumentation):
+	print(f"Acquisition loop, {instrumentation['points']} points:")
+	print(f"  instrumentation off: {instrumentation['plainPointsPerSecond']:10.0f} points/s")
+	print(f"  instrumentation on:  {instrumentation['instrumentedPointsPerSecond']:10.0f} points/s")
+	for stage, histogram in instrumentation["metrics"]["stages"].items():
+		print(f"    {stage:13s} p50 {histogram['p50_microseconds']:8.2f} us, p99 {histogram['p99_microseconds']:8.2f} us")
+
+
+def _printPipeline(pipeline):
+	print(f"Analysis of every batch, {pipeline['points']} points:")
+	print(f"  in the batch callback:          {pipeline['inlinePointsPerSecond']:10.0f} points/s")
+	print(f"  in the pipeline, {pipeline['workers']:2d} workers:    {pipeline['pipelinePointsPerSecond']:10.0f} points/s")
+
+
+def _printCommandLine(commandLine):
+	print("Command line:")
+	print(f"  startup, headless:        {commandLine['headlessStartup_milliseconds']:8.1f} ms")
+	print(f"  startup, plotter imports: {commandLine['plotterStartup_milliseconds']:8.1f} ms")
+	print(f"  headless output:          {commandLine['headlessPointsPerSecond']:8.0f} points/s")
+
+
+def _printPool(pool):
+	print("Device pool, total throughput:")
+	for result in pool:
+		print(f"  {result['devices']:2d} devices: {result['totalPointsPerSecond']:10.0f} points/s, {result['errors']} errors")
+
+
+def _printPointStore(pointStore):
+	print(f"Point store, {pointStore['points']} points:")
+	print(f"  memory, deques:     {pointStore['legacyBytesPerPoint']:8.1f} bytes/point")
+	print(f"  memory, PointStore: {pointStore['storeBytesPerPoint']:8.1f} bytes/point")
+	print(f"  LTTB display, full:        {pointStore['fullDisplay_milliseconds']:8.2f} ms")
+	print(f"  LTTB display, incremental: {pointStore['incrementalDisplay_milliseconds']:8.2f} ms")
+
+
+def _printPlotting(plotting):
+	print("Plotting, time per frame:")
+	for result in plotting:
+		legacy = result["legacyFrame_milliseconds"]
+		legacyText = "skipped" if legacy is None else f"{legacy:10.2f} ms"
+		print(f"  {result['historySize']:7d} points: live {result['liveFrame_milliseconds']:8.2f} ms, legacy {legacyText}")
+
+
+# name -> (benchmark, printer, True if it can replay a recorded stream)
+BENCHMARKS = {
+	"framing": (benchmarkFraming, _printFraming, True),
+	"latency": (benchmarkLatency, _printLatency, True),
+	"segmentation": (benchmarkSegmentation, _printSegmentation, False),
+	"peaks": (benchmarkPeaks, _printPeaks, False),
+	"instrumentation": (benchmarkInstrumentation, _printInstrumentation, False),
+	"pipeline": (benchmarkPipeline, _printPipeline, False),
+	"commandLine": (benchmarkCommandLine, _printCommandLine, False),
+	"pool": (benchmarkPool, _printPool, False),
+	"pointStore": (benchmarkPointStore, _printPointStore, False),
+	"plotting": (benchmarkPlotting, _printPlotting, False),
+}
+
+# keys identifying the entries of the benchmarks returning lists
+LIST_KEYS = ("mode", "devices", "historySize")
+
+
+def flattenResults(results):
+	"""
+	The function `flattenResults` flattens the results of the benchmarks into one number per measurement,
+	e.g.: "plotting[10000].liveFrame_milliseconds", keeping only the measurements that tell if a change
+	made things better or worse: rates (`PerSecond`, higher is better) and times or sizes (`_milliseconds`,
+	`_microseconds`, `BytesPerPoint`, lower is better). The measurements of the legacy code (named `legacy*`)
+	are left out: they are the frozen reference the current code is compared with, not code that can regress.
+
+	:param results: A dictionary of benchmark name -> result, as saved by `--save`
+	:return: a dictionary of measurement name -> (value, higherIsBetter).
+	"""
+	flat = {}
+
+	def visit(prefix, value):
+		if isinstance(value, dict):
+			for key, item in value.items():
+				visit(f"{prefix}.{key}" if prefix else key, item)
+		elif isinstance(value, list):
+			for item in value:
+				if isinstance(item, dict):
+					label = next((item[key] for key in LIST_KEYS if key in item), None)
+					visit(f"{prefix}[{label}]", {key: item for key, item in item.items() if key not in LIST_KEYS})
+		elif isinstance(value, (int, float)) and not isinstance(value, bool):
+			higherIsBetter = _isHigherBetter(prefix.rsplit(".", 1)[-1])
+			if higherIsBetter is not None:
+				flat[prefix] = (value, higherIsBetter)
+
+	visit("", results)
+	return flat
+
+
+def bestResults(runs):
+	"""
+	The function `bestResults` merges the results of several runs of a benchmark, keeping the best value of
+	each measurement (see `flattenResults`), so a run slowed down by the rest of the machine does not show
+	as a regression. The other values are the ones of the first run.
+
+	:param runs: A list of results of the same benchmark
+	:return: the merged results.
+	"""
+	def merge(name, values):
+		first = values[0]
+		if isinstance(first, dict):
+			return {key: merge(key, [value[key] for value in values]) for key in first}
+		if isinstance(first, list):
+			return [merge(name, [value[index] for value in values]) for index in range(len(first))]
+		if isinstance(first, (int, float)) and not isinstance(first, bool):
+			higherIsBetter = _isHigherBetter(name)
+			if higherIsBetter is not None:
+				return max(values) if higherIsBetter else min(values)
+		return first
+
+	return merge("", runs)
+
+
+def compareResults(baseline, current, tolerance=0.1):
+	"""
+	The function `compareResults` compares two sets of results, see `flattenResults`.
+
+	:param baseline: The results of reference, e.g.: loaded from the file saved before a change
+	:param current: The new results
+	:param tolerance: The relative change tolerated before a measurement is flagged as a regression
+	:return: a list of (measurement, baseline value, current value, relative change, isRegression), where a
+	positive change is an improvement.
+	"""
+	baselineFlat = flattenResults(baseline)
+	comparison = []
+	for name, (value, higherIsBetter) in flattenResults(current).items():
+		if name not in baselineFlat or baselineFlat[name][0] == 0:
+			continue
+		reference = baselineFlat[name][0]
+		change = (value - reference) / reference if higherIsBetter else (reference - value) / reference
+		comparison.append((name, reference, value, change, change < -tolerance))
+	return comparison
+
+
+def _isHigherBetter(name):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	Returns True if a larger value of a measurement is better, False if a smaller one is, None if the
+	measurement is not compared (see `flattenResults`).
+	"""
+	if name.startswith("legacy"):
+		return None
+	if "PerSecond" in name:
+		return True
+	if name.endswith(("_milliseconds", "_microseconds", "BytesPerPoint")):
+		return False
+	return None
+
+
+def main(argv=None):
+	"""
+	The function `main` runs the benchmarks, prints their results and optionally saves them or compares
+	them with saved ones.
+
+	:param argv: The arguments, None uses `sys.argv`
+	:return: the exit code: 0, or 1 if `--compare` found a regression.
+	"""
+	parser = argparse.ArgumentParser(description="Benchmarks of the OpenAFE Python tools.")
+	parser.add_argument("benchmarks", nargs="*", metavar="BENCHMARK",
+		help="the benchmarks to run (default: all): " + ", ".join(BENCHMARKS))
+	parser.add_argument("--stream", help="a byte stream recorded from a device, replayed by the framing and latency benchmarks")
+	parser.add_argument("--save", help="save the results to this JSON file")
+	parser.add_argument("--compare", help="compare the results with the ones saved in this JSON file")
+	parser.add_argument("--tolerance", type=float, default=10, help="regression tolerance, in percent (default: 10)")
+	parser.add_argument("--repeats", type=int, default=3,
+		help="runs of each benchmark, the best value of each measurement is kept (default: 3)")
+	arguments = parser.parse_args(argv)
+
+	names = arguments.benchmarks or list(BENCHMARKS)
+	for name in names:
+		if name not in BENCHMARKS:
+			parser.error(f"unknown benchmark {name}, use one of: " + ", ".join(BENCHMARKS))
+	stream = loadStream(arguments.stream) if arguments.stream else None
+
+	results = {}
+	for name in names:
+		benchmark, printer, replaysStreams = BENCHMARKS[name]
+		runs = [benchmark(stream=stream) if replaysStreams and stream is not None else benchmark()
+			for _ in range(max(arguments.repeats, 1))]
+		results[name] = bestResults(runs)
+		printer(results[name])
+
+	report = {
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"processor": platform.processor() or platform.machine(),
+		"stream": arguments.stream,
+		"repeats": arguments.repeats,
+		"results": results,
+	}
+	if arguments.save:
+		with open(arguments.save, "w") as file:
+			json.dump(report, file, indent=2)
+		print(f"Results saved to {arguments.save}")
+
+	regressions = 0
+	if arguments.compare:
+		with open(arguments.compare, "r") as file:
+			baseline = json.load(file)
+		print(f"Compared with {arguments.compare} ({baseline['time']}, Python {baseline['python']}):")
+		for name, reference, value, change, isRegression in compareResults(baseline["results"], results,
+				arguments.tolerance / 100):
+			regressions += isRegression
+			print(f"  {name:60s} {reference:12.4g} -> {value:12.4g} {change * 100:+7.1f}%" +
+				("  REGRESSION" if isRegression else ""))
+		print(f"{regressions} regressions.")
+
+	return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
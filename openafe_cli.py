@@ -0,0 +1,247 @@
+# Command line entry point of the OpenAFE tools, an alternative to editing the constants of
+# `openafe_plotter.py`. Examples:
+#
+#   python openafe_cli.py --port COM14 cv --starting-potential -500 --ending-potential 500 --scan-rate 200
+#   python openafe_cli.py --port /dev/ttyACM0 --headless --output run.csv dpv --pulse-potential 50
+#   python openafe_cli.py --simulate --headless swv --pulse-frequency 20
+#
+# In --headless mode matplotlib is never imported, the points are streamed to the standard output or to a
+# file, as "voltage,current" lines (CSV) or as a `PointRecorder` recording (files ending in .oafe).
+
+import argparse
+import os
+import sys
+import time
+
+from openafe import OpenAFE
+from openafe_waveform import commandNumber, cyclicVoltammetryWaveform, differentialPulseVoltammetryWaveform, \
+	squareWaveVoltammetryWaveform
+
+# the defaults are the ones of `openafe_plotter.py`
+PROTOCOL_PARAMETERS = {
+	"cv": [
+		("settlingTime", 1000, "settling time before the first point, in milliseconds (ms)"),
+		("startingPotential", -500, "starting potential, in millivolts (mV)"),
+		("endingPotential", 500, "ending potential, in millivolts (mV)"),
+		("scanRate", 200, "scan rate, in millivolts per second (mV/s)"),
+		("stepSize", 5, "step size, in millivolts (mV)"),
+		("numberOfCycles", 2, "number of cycles"),
+	],
+	"dpv": [
+		("settlingTime", 1000, "settling time before the first point, in milliseconds (ms)"),
+		("startingPotential", -500, "starting potential, in millivolts (mV)"),
+		("endingPotential", 500, "ending potential, in millivolts (mV)"),
+		("pulsePotential", 100, "pulse potential, in millivolts (mV)"),
+		("stepPotential", 5, "step potential, in millivolts (mV)"),
+		("pulseWidth", 2, "pulse width, in milliseconds (ms)"),
+		("baseWidth", 20, "base width, in milliseconds (ms)"),
+		("samplePeriodPulse", 1, "sample period of the pulse, in milliseconds (ms)"),
+		("samplePeriodBase", 2, "sample period of the base, in milliseconds (ms)"),
+	],
+	"swv": [
+		("settlingTime", 1000, "settling time before the first point, in milliseconds (ms)"),
+		("startingPotential", -500, "starting potential, in millivolts (mV)"),
+		("endingPotential", 500, "ending potential, in millivolts (mV)"),
+		("scanRate", 200, "scan rate, in millivolts per second (mV/s)"),
+		("pulsePotential", 100, "pulse potential, in millivolts (mV)"),
+		("pulseFrequency", 10, "pulse frequency, in hertz (Hz)"),
+		("samplePeriodPulse", 1, "when to sample the pulse, in milliseconds (ms) before its end"),
+	],
+}
+
+PROTOCOL_WAVEFORMS = {
+	"cv": cyclicVoltammetryWaveform,
+	"dpv": differentialPulseVoltammetryWaveform,
+	"swv": squareWaveVoltammetryWaveform,
+}
+
+PROTOCOL_TITLES = {
+	"cv": "Cyclic Voltammetry",
+	"dpv": "Differential Pulse Voltammetry",
+	"swv": "Square Wave Voltammetry",
+}
+
+
+def parseArguments(argv=None):
+	"""
+	The function `parseArguments` parses the command line.
+
+	:param argv: The arguments, None uses `sys.argv`
+	:return: the `argparse.Namespace`, with the protocol parameters under their `OpenAFE` argument names.
+	"""
+	parser = argparse.ArgumentParser(description="Runs a voltammetry on an OpenAFE device.")
+	source = parser.add_mutually_exclusive_group(required=True)
+	source.add_argument("--port", help="the serial port of the device, e.g.: COM14 or /dev/ttyACM0")
+	source.add_argument("--simulate", action="store_true", help="use a simulated device instead of a real one")
+	parser.add_argument("--current-range", type=float, default=200, help="current range, in microamps (default: 200)")
+	parser.add_argument("--auto-range", metavar="FILE",
+		help="choose the current range, starting from --current-range, and remember it per parameter set in this "
+			"JSON file")
+	parser.add_argument("--max-corrupted-frames", type=int, default=100,
+		help="corrupted messages skipped before the run is aborted (default: 100)")
+	parser.add_argument("--headless", action="store_true", help="do not plot, stream the points instead")
+	parser.add_argument("--output", default="-",
+		help="headless output: a .csv or .oafe file, or - for the standard output (default: -)")
+	parser.add_argument("--metrics", help="save the acquisition metrics to this JSON file")
+	parser.add_argument("--title", help="graph title (default: the protocol name)")
+	parser.add_argument("--subtitle", default="", help="graph sub title")
+	parser.add_argument("--no-grid", action="store_true", help="hide the graph grid")
+
+	protocols = parser.add_subparsers(dest="protocol", required=True, metavar="PROTOCOL")
+	for protocol, parameters in PROTOCOL_PARAMETERS.items():
+		subparser = protocols.add_parser(protocol, help=PROTOCOL_TITLES[protocol])
+		for name, default, description in parameters:
+			flag = "--" + "".join("-" + char.lower() if char.isupper() else char for char in name)
+			subparser.add_argument(flag, dest=name, type=float, default=default,
+				help=f"{description} (default: {default})")
+
+	return parser.parse_args(argv)
+
+
+def startVoltammetry(device, arguments, autoRanger=None):
+	"""
+	NOTE: This function can raise an Exception.
+
+	The function `startVoltammetry` sets the current range and sends the voltammetry command of the parsed
+	arguments to the device.
+
+	:param device: A connected `OpenAFE`
+	:param arguments: The arguments returned by `parseArguments`
+	:param autoRanger: An optional `AutoRanger` choosing the current range, see `openafe_autorange`
+	"""
+	parameters = {name: commandNumber(getattr(arguments, name)) for name, default, description in
+		PROTOCOL_PARAMETERS[arguments.protocol]}
+
+	currentRange = commandNumber(arguments.current_range)
+	if autoRanger is not None:
+		currentRange = autoRanger.selectRange(PROTOCOL_WAVEFORMS[arguments.protocol](**parameters), currentRange)
+	device.setCurrentRange(currentRange)
+	if arguments.protocol == "cv":
+		device.makeCyclicVoltammetry(**parameters)
+	elif arguments.protocol == "dpv":
+		device.makeDifferentialPulseVoltammetry(**parameters)
+	else:
+		device.makeSquareWaveVoltammetry(**parameters)
+
+
+def runHeadless(device, output, batchSize=1024):
+	"""
+	NOTE: This function can raise an Exception.
+
+	The function `runHeadless` receives the points of the running voltammetry and writes them to `output`
+	as "voltage,current" lines, one write per batch, from the reader thread's buffer so the serial port is
+	always drained.
+
+	:param device: A connected `OpenAFE` running a voltammetry
+	:param output: A text file, e.g.: `sys.stdout`
+	:param batchSize: The maximum number of points written at once
+	:return: the number of points written.
+	"""
+	written = 0
+	pointBuffer = device.startReaderThread()
+	while not pointBuffer.isDrained():
+		voltages, currents, timestamps = pointBuffer.pull(batchSize, 0.05, minPoints=batchSize)
+		if len(voltages) > 0:
+			output.write("".join([f"{voltage:.2f},{current:.4f}\n" for voltage, current in zip(voltages, currents)]))
+			written += len(voltages)
+	output.flush()
+
+	device.readerThread.join()
+	if device.readerException is not None:
+		raise device.readerException
+	return written
+
+
+def runPlot(device, arguments):
+	"""
+	NOTE: This function can raise an Exception.
+
+	The function `runPlot` receives the points of the running voltammetry into a `LivePlot`, importing
+	matplotlib only now, and shows the plot once it ends.
+
+	:param device: A connected `OpenAFE` running a voltammetry
+	:param arguments: The arguments returned by `parseArguments`
+	"""
+	import matplotlib.pyplot as plt
+	from openafe_liveplot import LivePlot
+
+	plt.ion()
+	livePlot = LivePlot(arguments.startingPotential, arguments.endingPotential,
+		arguments.title or PROTOCOL_TITLES[arguments.protocol], arguments.subtitle, not arguments.no_grid)
+	plt.show(block=False)
+
+	device.onPointCallback = livePlot.addPoint
+	device.receiveVoltammetryPoints()
+	livePlot.finish()
+	print("INFO: Voltammetry finished!")
+	plt.ioff()
+	plt.show()
+
+
+def main(argv=None):
+	"""
+	The function `main` runs the command line tool.
+
+	:param argv: The arguments, None uses `sys.argv`
+	:return: the exit code, 0 on success.
+	"""
+	arguments = parseArguments(argv)
+	log = sys.stderr if arguments.headless and arguments.output == "-" else sys.stdout
+
+	try:
+		if arguments.simulate:
+			from openafe_simulator import SimulatedOpenAFE
+			device = OpenAFE(None, transport=SimulatedOpenAFE())
+		else:
+			device = OpenAFE(arguments.port)
+
+		device.enableRecovery(arguments.max_corrupted_frames)
+		metrics = device.enableInstrumentation() if arguments.metrics else None
+		autoRanger = None
+		if arguments.auto_range:
+			from openafe_autorange import AutoRanger, RangeMemory
+			autoRanger = AutoRanger(device, RangeMemory(arguments.auto_range))
+
+		startVoltammetry(device, arguments, autoRanger)
+		print(f"INFO: Expecting {device.waveform.numberOfPoints} points, in about "
+			f"{device.waveform.duration_seconds:.0f} seconds, at {device.currentRange} uA.", file=log)
+
+		start = time.perf_counter()
+		if not arguments.headless:
+			runPlot(device, arguments)
+		elif arguments.output.endswith(".oafe"):
+			from openafe_recorder import PointRecorder
+			with PointRecorder(arguments.output, {"command": device.waveform.command,
+					"currentRange": device.currentRange}) as recorder:
+				device.receiveVoltammetryPoints(useReaderThread=True, recorder=recorder)
+			print(f"INFO: {recorder.numberOfRecords} points recorded in {time.perf_counter() - start:.1f} s.", file=log)
+		elif arguments.output == "-":
+			written = runHeadless(device, sys.stdout)
+			print(f"INFO: {written} points in {time.perf_counter() - start:.1f} s.", file=log)
+		else:
+			with open(arguments.output, "w") as output:
+				written = runHeadless(device, output)
+			print(f"INFO: {written} points written in {time.perf_counter() - start:.1f} s.", file=log)
+
+		if device.corruptedFrames > 0:
+			print(f"WARNING: {device.corruptedFrames} corrupted messages were skipped.", file=log)
+		if autoRanger is not None:
+			status, suggestedRange = autoRanger.check(device.waveform)
+			if status in ("saturated", "coarse"):
+				print(f"WARNING: The run was {status} at {device.currentRange} uA, the next runs of these parameters "
+					f"use {suggestedRange} uA.", file=log)
+		if metrics is not None:
+			metrics.save(arguments.metrics)
+
+	except BrokenPipeError:
+		# the reader of the standard output went away (e.g.: `| head`), stop quietly
+		os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+		return 0
+	except Exception as exception:
+		print(exception, file=sys.stderr)
+		return 1
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
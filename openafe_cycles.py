@@ -0,0 +1,148 @@
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+ASCENDING = 1
+DESCENDING = -1
+
+
+def segmentCycles(voltages, startingPotential=None):
+	"""
+	NOTE: This function can raise an Exception.
+
+	The function `segmentCycles` labels every point of a voltammetry with its cycle and sweep direction, and
+	finds the vertices (turning points) of the sweep, in one vectorized pass.
+
+	A new cycle starts when the sweep, back at the starting potential after a vertex, moves again in the
+	direction of the first sweep; the vertex closes the previous cycle, so the last point of a run never
+	opens one. Both sweep directions are handled (e.g.: -500 to 500 mV and 500 to -500 mV). The direction
+	of a point is the direction of the step that led to it: ascending if its voltage is higher than the
+	previous one, descending otherwise. The first point has no direction.
+
+	:param voltages: The voltage values of the voltammetry, in millivolts (mV)
+	:param startingPotential: The starting potential of the voltammetry, in millivolts (mV). None uses the
+	first voltage
+	:return: a tuple (cycles, vertices, ascending, descending): the cycle index of every point, the indices
+	of the vertices, and the ascending and descending boolean masks.
+	"""
+	return CycleSegmenter(startingPotential).addPoints(voltages)
+
+
+class CycleSegmenter:
+
+	def __init__(self, startingPotential=None):
+		"""
+		The `CycleSegmenter` is the incremental form of `segmentCycles`, for streamed points: it keeps the
+		state between calls, so each point is labelled once, as it arrives.
+
+		:param startingPotential: The starting potential of the voltammetry, in millivolts (mV). None uses
+		the first voltage
+		"""
+		self.startingPotential = startingPotential
+		self.numberOfPoints = 0
+		self.cycle = 0
+		self.previousVoltage = None
+		self.lastSign = 0
+		self.firstSign = 0  # direction of the first sweep
+		self.vertices = []
+
+
+	def addPoint(self, voltage):
+		"""
+		The function `addPoint` labels the next point.
+
+		:param voltage: The voltage value of the point, in millivolts (mV)
+		:return: a tuple (cycle, direction), where direction is `ASCENDING`, `DESCENDING` or 0 for the first point.
+		"""
+		previousVoltage = self.previousVoltage
+		self.previousVoltage = voltage
+		self.numberOfPoints += 1
+
+		if previousVoltage is None:
+			if self.startingPotential is None:
+				self.startingPotential = voltage
+			return self.cycle, 0
+
+		if voltage > previousVoltage:
+			sign = ASCENDING
+		elif voltage < previousVoltage:
+			sign = DESCENDING
+		else:
+			sign = 0
+
+		if sign != 0:
+			if self.firstSign == 0:
+				self.firstSign = sign
+			elif sign == self.firstSign and self.lastSign == -sign and \
+					(previousVoltage - self.startingPotential) * sign <= abs(voltage - previousVoltage):
+				self.cycle += 1  # turned back to the first direction, at the starting potential
+			if self.lastSign != 0 and sign != self.lastSign:
+				self.vertices.append(self.numberOfPoints - 2)
+			self.lastSign = sign
+
+		return self.cycle, ASCENDING if sign == ASCENDING else DESCENDING
+
+
+	def addPoints(self, voltages):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `addPoints` labels the next points, vectorized like `segmentCycles`.
+
+		:param voltages: The voltage values of the points, in millivolts (mV)
+		:return: a tuple (cycles, vertices, ascending, descending) for the given points, with the vertices
+		as indices from the first point ever added.
+		"""
+		if np is None:
+			raise Exception("NumPy is required to segment the cycles, install it with: pip install numpy")
+
+		voltages = np.asarray(voltages, dtype=float)
+		count = len(voltages)
+		ascending = np.zeros(count, dtype=bool)
+		descending = np.zeros(count, dtype=bool)
+		if count == 0:
+			return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), ascending, descending
+
+		first = self.numberOfPoints
+		if self.previousVoltage is None:
+			if self.startingPotential is None:
+				self.startingPotential = voltages[0]
+			steps = np.diff(voltages)
+			previous = voltages[:-1]
+			labelled = slice(1, None)  # the first point ever added has no direction
+			stepStart = first
+		else:
+			steps = np.diff(voltages, prepend=self.previousVoltage)
+			previous = np.concatenate(([self.previousVoltage], voltages[:-1]))
+			labelled = slice(0, None)
+			stepStart = first - 1
+
+		ascending[labelled] = steps > 0
+		descending[labelled] = steps <= 0
+
+		# sign of every step, with flat steps taking the sign of the last step that moved
+		stepSigns = np.sign(steps).astype(np.int64)
+		signs = np.concatenate(([self.lastSign], stepSigns))
+		moving = np.where(signs != 0, np.arange(len(signs)), 0)
+		np.maximum.accumulate(moving, out=moving)
+		signs = signs[moving]
+		vertices = np.flatnonzero((signs[1:] != signs[:-1]) & (signs[:-1] != 0)) + stepStart
+
+		if self.firstSign == 0 and np.any(stepSigns):
+			self.firstSign = int(stepSigns[np.flatnonzero(stepSigns)[0]])
+
+		# a cycle starts on a step turning back to the first direction, at the starting potential
+		boundaries = np.zeros(count, dtype=np.int64)
+		if self.firstSign != 0:
+			boundaries[labelled] = (stepSigns == self.firstSign) & (signs[:-1] == -self.firstSign) & \
+				((previous - self.startingPotential) * self.firstSign <= np.abs(steps))
+		cycles = np.cumsum(boundaries) + self.cycle
+
+		self.cycle = int(cycles[-1])
+		self.previousVoltage = float(voltages[-1])
+		self.lastSign = int(signs[-1])
+		self.numberOfPoints += count
+		self.vertices.extend(vertices.tolist())
+
+		return cycles, vertices, ascending, descending
@@ -0,0 +1,118 @@
+import time
+from collections import deque
+from functools import reduce
+from operator import xor
+
+# the maximum number of bytes read from the serial port at once
+READ_CHUNK_SIZE = 4096
+
+
+def calculateChecksum(data):
+	"""
+	The function `calculateChecksum` calculates the checksum of the given bytes, the XOR of all of them.
+
+	:param data: The bytes for which we want to calculate the checksum, e.g.: b"CVW,500,-500,250,2,1".
+	:return: the checksum of the given bytes, e.g.: 119 (0x77).
+	"""
+	return reduce(xor, data, 0)
+
+
+def makeFrame(message):
+	"""
+	The function `makeFrame` wraps a message in a checksummed frame, as sent by the OpenAFE device.
+
+	:param message: The message, e.g.: "MSG,RDY"
+	:return: the frame bytes, e.g.: b"$MSG,RDY*36\n".
+	"""
+	payload = message.encode("ascii")
+	return b"$" + payload + b"*" + format(calculateChecksum(payload), "02X").encode("ascii") + b"\n"
+
+
+class FrameReader:
+
+	def __init__(self, ser):
+		"""
+		The `FrameReader` splits the `$MESSAGE*XX` frames sent by the OpenAFE device out of the serial
+		stream. It reads every byte already waiting on the port at once into a reusable buffer, instead of
+		reading one line per call.
+
+		:param ser: The serial port, any object with `read(size)` and `in_waiting`
+		"""
+		self.ser = ser
+		self.buffer = bytearray()
+		self.lines = deque()
+
+
+	def readFrame(self):
+		"""
+		NOTE: This method can raise a `serial.serialutil.SerialException`.
+
+		The function `readFrame` waits for the next complete frame and validates its checksum.
+
+		:return: a tuple (message, isValid), where message is the frame content between "$" and "*", e.g.:
+		"MSG,RDY", and isValid tells if the frame is well formed and its checksum matches.
+		"""
+		return self.checkFrame(self.readLine())
+
+
+	def readLine(self, timeout=None):
+		"""
+		NOTE: This method can raise a `serial.serialutil.SerialException`.
+
+		The function `readLine` waits for the next complete line, without checking it (see `checkFrame`).
+
+		:param timeout: The maximum time to wait, in seconds (s), None waits forever. The serial port must
+		have a read timeout for the wait to be interrupted
+		:return: the line, as a bytearray without the line ending, or None if the timeout expired.
+		"""
+		deadline = None if timeout is None else time.perf_counter() + timeout
+		while not self.lines:
+			if deadline is not None and time.perf_counter() >= deadline:
+				return None
+			self._fill()
+		return self.lines.popleft()
+
+
+	@staticmethod
+	def checkFrame(line):
+		"""
+		The function `checkFrame` extracts the message of a frame and validates its checksum.
+
+		:param line: The frame, without the line ending, e.g.: b"$MSG,RDY*36"
+		:return: a tuple (message, isValid), see `readFrame`.
+		"""
+		start = line.rfind(b"$")
+		star = line.rfind(b"*")
+		message = line[start + 1:star]
+
+		if start < 0 or star < start or len(line) - star < 3:
+			return message.decode("ascii", "replace"), False
+
+		try:
+			checksumInMessage = int(line[star + 1:star + 3], 16)
+		except ValueError:
+			return message.decode("ascii", "replace"), False
+
+		return message.decode("ascii", "replace"), calculateChecksum(message) == checksumInMessage
+
+
+	def _fill(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Reads every byte waiting on the serial port (blocking for at least one) and moves the complete
+		lines from the buffer to the line queue.
+		"""
+		waiting = self.ser.in_waiting
+		chunk = self.ser.read(min(waiting, READ_CHUNK_SIZE) if waiting else 1)
+
+		self.buffer += chunk
+		end = self.buffer.rfind(b"\n")
+		if end < 0:
+			return
+
+		for line in self.buffer[:end].split(b"\n"):
+			if line.endswith(b"\r"):
+				del line[-1]
+			self.lines.append(line)
+		del self.buffer[:end + 1]
@@ -0,0 +1,290 @@
+import time
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+from openafe_cycles import ASCENDING, CycleSegmenter
+from openafe_pointstore import PointStore
+
+# Colors for each cycle: (ascending, descending)
+CYCLE_COLORS = [
+	("blue", "red"),
+	("green", "purple"),
+	("orange", "cyan"),
+	("black", "magenta")
+]
+
+
+class _LiveLine:
+	"""
+	NOTE: PRIVATE CLASS, DO NOT USE IT!
+
+	A single matplotlib line (one cycle, one sweep direction) backed by a `PointStore`, so appending a
+	point never copies the whole history and only the points that can be seen are handed to matplotlib.
+	"""
+
+	def __init__(self, artist):
+		self.artist = artist
+		self.points = PointStore()
+		self.lastPointIndex = -2
+		self._shown = None
+
+
+	def append(self, voltage, current):
+		self.points.append(voltage, current)
+
+
+	def updateArtist(self, pixelBudget, xRange):
+		shown = (len(self.points), pixelBudget, xRange)
+		if shown == self._shown:
+			return
+		self._shown = shown
+
+		if len(self.points) <= pixelBudget:
+			self.artist.set_data(*self.points.arrays())
+		else:
+			self.artist.set_data(*self.points.getDisplayPoints(pixelBudget, xRange))
+
+
+class LivePlot:
+
+	def __init__(self, startingPotential, endingPotential, graphTitle="", graphSubTitle="", gridVisible=True,
+			  maxFramesPerSecond=20, pointsPerPixel=2):
+		"""
+		The `LivePlot` keeps one persistent `Line2D` per cycle and sweep direction, appends new points into
+		compact point stores and redraws only the lines (blitting) at most `maxFramesPerSecond` times per
+		second, so the cost of a frame does not depend on how many artists the run has produced. Lines
+		longer than the axes can show are downsampled (LTTB) to `pointsPerPixel` points per pixel of width.
+		Every point of the run is kept in `self.points`, a `PointStore`.
+
+		:param startingPotential: The starting potential of the voltammetry, in millivolts (mV). A new cycle
+		is detected when a descending voltage reaches this value
+		:param endingPotential: The ending potential of the voltammetry, in millivolts (mV)
+		:param graphTitle: The graph title to be displayed, can be left blank
+		:param graphSubTitle: The graph sub title, can be left blank
+		:param gridVisible: True or False, to make the grid visible or hidden, respectively
+		:param maxFramesPerSecond: The maximum number of redraws per second while points are arriving
+		:param pointsPerPixel: The number of points drawn per pixel of the axes width, for long lines
+		"""
+		self.startingPotential = startingPotential
+		self.endingPotential = endingPotential
+		self.minFrameInterval = 1.0 / maxFramesPerSecond
+		self.pointsPerPixel = pointsPerPixel
+		self.points = PointStore()
+
+		self.figure = plt.figure()
+		self.figure.suptitle(graphTitle)
+		self.axes = self.figure.gca()
+		self.axes.set_title(graphSubTitle)
+		self.axes.set_xlabel('Voltage (mV)')
+		self.axes.set_ylabel('Current (uA)')
+		self.axes.grid(visible=gridVisible)
+		self.axes.set_xlim(startingPotential - 100, endingPotential + 100)
+		self.axes.set_ylim(-1, 1)
+
+		self.lines = {}  # (cycle, direction) -> _LiveLine
+		self.legendDirty = False
+		self.background = None
+		self.lastFrameTime = 0.0
+		self.numberOfPoints = 0
+		self.warnedAboutColors = False
+
+		self.cycleSegmenter = CycleSegmenter(startingPotential)
+		self.previousVoltage = None
+		self.previousCurrent = None
+		self.yMin = None
+		self.yMax = None
+		self.limitsDirty = False
+
+		self.figure.canvas.mpl_connect("draw_event", self._onDraw)
+		self.axes.callbacks.connect("xlim_changed", self._onZoom)
+		self.fullRedraw()
+
+
+	def addPoint(self, voltage, current):
+		"""
+		The function `addPoint` appends a point to the plot and redraws it if the frame interval has elapsed.
+
+		:param voltage: The voltage value of the point, in millivolts (mV)
+		:param current: The current value of the point, in microamps (uA)
+		"""
+		self._appendPoint(voltage, current)
+		now = time.perf_counter()
+		if now - self.lastFrameTime >= self.minFrameInterval:
+			self.lastFrameTime = now
+			self.redraw()
+
+
+	def addPoints(self, voltages, currents):
+		"""
+		The function `addPoints` appends several points to the plot and redraws it at most once.
+
+		:param voltages: An iterable of voltage values, in millivolts (mV)
+		:param currents: An iterable of current values, in microamps (uA)
+		"""
+		for voltage, current in zip(voltages, currents):
+			self._appendPoint(voltage, current)
+		now = time.perf_counter()
+		if now - self.lastFrameTime >= self.minFrameInterval:
+			self.lastFrameTime = now
+			self.redraw()
+
+
+	def redraw(self):
+		"""
+		The function `redraw` updates the lines on screen. It blits only the lines when the axes did not
+		change, and falls back to a full redraw when a new line appeared or the data left the current limits.
+		"""
+		self._updateArtists()
+
+		canvas = self.figure.canvas
+		if self.legendDirty or self.limitsDirty or self.background is None or not getattr(canvas, "supports_blit", False):
+			self.fullRedraw()
+		else:
+			canvas.restore_region(self.background)
+			for line in self.lines.values():
+				self.axes.draw_artist(line.artist)
+			canvas.blit(self.axes.bbox)
+		canvas.flush_events()
+
+
+	def fullRedraw(self):
+		"""
+		The function `fullRedraw` updates the axes limits and the legend and redraws the whole figure,
+		capturing a new background for the following blits.
+		"""
+		if self.limitsDirty:
+			margin = max((self.yMax - self.yMin) * 0.1, 1e-9)
+			self.axes.set_ylim(self.yMin - margin, self.yMax + margin)
+			self.limitsDirty = False
+
+		if self.legendDirty:
+			handles = [line.artist for line in self.lines.values()]
+			self.axes.legend(handles, [handle.get_label() for handle in handles], loc="upper right")
+			self.legendDirty = False
+
+		self.figure.canvas.draw()
+
+
+	def finish(self):
+		"""
+		The function `finish` draws the remaining points and makes the lines regular (non animated) artists,
+		so the figure can be tweaked and saved after the voltammetry is done.
+		"""
+		self._updateArtists()
+		for line in self.lines.values():
+			line.artist.set_animated(False)
+		self.fullRedraw()
+
+
+	def _updateArtists(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Hands the points of every line to its artist, downsampled to the current width and zoom.
+		"""
+		pixelBudget = max(int(self.axes.bbox.width * self.pointsPerPixel), 16)
+		xRange = tuple(self.axes.get_xlim())
+		for line in self.lines.values():
+			line.updateArtist(pixelBudget, xRange)
+
+
+	def _onZoom(self, axes):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Recomputes the points shown by every line when the x limits change (zoom or pan), before the
+		figure is drawn.
+		"""
+		self._updateArtists()
+
+
+	def _onDraw(self, event):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Captures the axes background (everything but the animated lines) after every full draw, including
+		the ones triggered by the GUI (e.g.: window resize).
+		"""
+		canvas = self.figure.canvas
+		if getattr(canvas, "supports_blit", False):
+			self.background = canvas.copy_from_bbox(self.axes.bbox)
+			for line in self.lines.values():
+				self.axes.draw_artist(line.artist)
+
+
+	def _appendPoint(self, voltage, current):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Updates the cycle tracking with the new point and appends the segment ending on it to the line of
+		its cycle and sweep direction. A line receiving a segment that does not continue its last point gets
+		a NaN break, so separate runs are not joined together.
+		"""
+		pointIndex = self.numberOfPoints
+		self.numberOfPoints += 1
+		self.points.append(voltage, current)
+		self._updateLimits(voltage, current)
+
+		previousVoltage = self.previousVoltage
+		previousCurrent = self.previousCurrent
+		self.previousVoltage = voltage
+		self.previousCurrent = current
+
+		cycleIndex, direction = self.cycleSegmenter.addPoint(voltage)
+		if previousVoltage is None:
+			return
+
+		line = self._getLine(cycleIndex, direction)
+
+		if line.lastPointIndex != pointIndex - 1:
+			if len(line.points) > 0:
+				line.append(np.nan, np.nan)
+			line.append(previousVoltage, previousCurrent)
+		line.append(voltage, current)
+		line.lastPointIndex = pointIndex
+
+
+	def _getLine(self, cycleIndex, direction):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Returns the line of the given cycle and direction, creating it on its first use.
+		"""
+		key = (cycleIndex, direction)
+		line = self.lines.get(key)
+		if line is None:
+			if cycleIndex >= len(CYCLE_COLORS) and not self.warnedAboutColors:
+				print(f"Warning: More cycles detected ({cycleIndex + 1}) than colors available. Colors will repeat.")
+				self.warnedAboutColors = True
+
+			color = CYCLE_COLORS[cycleIndex % len(CYCLE_COLORS)][0 if direction == ASCENDING else 1]
+			label = f"Ciclo {cycleIndex + 1} - " + ("Subida" if direction == ASCENDING else "Descida")
+			artist, = self.axes.plot([], [], color=color, label=label, animated=True)
+			line = _LiveLine(artist)
+			self.lines[key] = line
+			self.legendDirty = True
+		return line
+
+
+	def _updateLimits(self, voltage, current):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Keeps track of the current extremes and flags a full redraw when a point falls outside the y axis.
+		"""
+		if self.yMin is None:
+			self.yMin = self.yMax = current
+			self.limitsDirty = True
+			return
+
+		if current < self.yMin:
+			self.yMin = current
+		elif current > self.yMax:
+			self.yMax = current
+		else:
+			return
+
+		bottom, top = self.axes.get_ylim()
+		if current < bottom or current > top:
+			self.limitsDirty = True
@@ -0,0 +1,240 @@
+import json
+import math
+import time
+
+# histogram buckets: 4 per power of two of microseconds, from 1 us up to 2^40 us (about 12 days)
+BUCKETS_PER_OCTAVE = 4
+NUMBER_OF_OCTAVES = 40
+
+
+class LatencyHistogram:
+
+	def __init__(self):
+		"""
+		The `LatencyHistogram` counts durations in logarithmic buckets (4 per power of two, so a percentile
+		is known within about 20%), keeping the count, mean, minimum and maximum exactly. Recording a
+		duration is a few arithmetic operations and never allocates.
+		"""
+		self.buckets = [0] * (BUCKETS_PER_OCTAVE * NUMBER_OF_OCTAVES)
+		self.count = 0
+		self.total = 0.0
+		self.minimum = math.inf
+		self.maximum = 0.0
+
+
+	def record(self, seconds):
+		"""
+		The function `record` adds a duration to the histogram.
+
+		:param seconds: The duration, in seconds (s)
+		"""
+		self.count += 1
+		self.total += seconds
+		if seconds < self.minimum:
+			self.minimum = seconds
+		if seconds > self.maximum:
+			self.maximum = seconds
+		self.buckets[_bucketIndex(seconds)] += 1
+
+
+	@property
+	def mean(self):
+		return self.total / self.count if self.count else 0.0
+
+
+	def percentile(self, percent):
+		"""
+		The function `percentile` estimates a percentile of the recorded durations, as the upper bound of the
+		bucket holding it.
+
+		:param percent: The percentile, from 0 to 100, e.g.: 99
+		:return: the duration, in seconds (s), or 0 if nothing was recorded.
+		"""
+		if self.count == 0:
+			return 0.0
+		rank = max(math.ceil(self.count * percent / 100), 1)
+		seen = 0
+		for index, bucketCount in enumerate(self.buckets):
+			seen += bucketCount
+			if seen >= rank:
+				return min(_bucketUpperBound(index), self.maximum)
+		return self.maximum
+
+
+	def toDict(self):
+		"""
+		The function `toDict` returns the histogram as a dictionary of plain numbers, in microseconds.
+
+		:return: a dictionary with the count, mean, min, max, p50, p90, p99 and p999 in microseconds and the
+		non empty buckets as a list of [upper bound in microseconds, count].
+		"""
+		return {
+			"count": self.count,
+			"mean_microseconds": self.mean * 1e6,
+			"min_microseconds": self.minimum * 1e6 if self.count else 0.0,
+			"max_microseconds": self.maximum * 1e6,
+			"p50_microseconds": self.percentile(50) * 1e6,
+			"p90_microseconds": self.percentile(90) * 1e6,
+			"p99_microseconds": self.percentile(99) * 1e6,
+			"p999_microseconds": self.percentile(99.9) * 1e6,
+			"buckets": [[_bucketUpperBound(index) * 1e6, bucketCount]
+				for index, bucketCount in enumerate(self.buckets) if bucketCount],
+		}
+
+
+class AcquisitionMetrics:
+
+	# stages of the path of a point, from the serial port to the callback
+	STAGES = ("read", "checksum", "parse", "pointCallback", "batchCallback")
+
+	def __init__(self, callbackBudget_milliseconds=None):
+		"""
+		The `AcquisitionMetrics` collects the timings and counters of the acquisition loop of an `OpenAFE`,
+		see `OpenAFE.enableInstrumentation`. Every stage has a `LatencyHistogram` in `self.stages`:
+
+		- read: waiting for and reading the bytes of a frame from the serial port
+		- checksum: splitting the frame and checking its checksum
+		- parse: converting the point message to floats
+		- pointCallback and batchCallback: the time spent in `onPointCallback` and `onBatchCallback`
+
+		It can be read at any time, also while a voltammetry is running, with `toDict` or `toJson`.
+
+		:param callbackBudget_milliseconds: The time a point callback may take before it is counted as an
+		overrun. None uses the interval between points of the running voltammetry, when known
+		"""
+		self.callbackBudget = None if callbackBudget_milliseconds is None else callbackBudget_milliseconds / 1000
+		self.expectedPointInterval = None
+		self.reset()
+
+
+	def reset(self):
+		"""
+		The function `reset` clears every histogram and counter.
+		"""
+		self.stages = {stage: LatencyHistogram() for stage in self.STAGES}
+		self.interArrival = LatencyHistogram()
+		self.frames = 0
+		self.corruptedFrames = 0
+		self.errorFrames = 0
+		self.points = 0
+		self.callbackOverruns = 0
+		self.firstPointTime = None
+		self.lastPointTime = None
+
+		# running mean and sum of squared deviations of the inter-arrival times (Welford's method)
+		self._intervalMean = 0.0
+		self._intervalSquares = 0.0
+
+
+	def recordPoint(self, arrivalTime):
+		"""
+		The function `recordPoint` counts a received point and the time since the previous one.
+
+		:param arrivalTime: The `time.perf_counter()` at which the point was received
+		"""
+		self.points += 1
+		if self.lastPointTime is None:
+			self.firstPointTime = arrivalTime
+		else:
+			interval = arrivalTime - self.lastPointTime
+			self.interArrival.record(interval)
+			delta = interval - self._intervalMean
+			self._intervalMean += delta / self.interArrival.count
+			self._intervalSquares += delta * (interval - self._intervalMean)
+		self.lastPointTime = arrivalTime
+
+
+	def recordCallback(self, stage, seconds):
+		"""
+		The function `recordCallback` records the time spent in a callback, counting an overrun when a point
+		callback takes longer than the budget.
+
+		:param stage: "pointCallback" or "batchCallback"
+		:param seconds: The time spent in the callback, in seconds (s)
+		"""
+		self.stages[stage].record(seconds)
+		budget = self.callbackBudget if self.callbackBudget is not None else self.expectedPointInterval
+		if stage == "pointCallback" and budget is not None and seconds > budget:
+			self.callbackOverruns += 1
+
+
+	@property
+	def pointsPerSecond(self):
+		if self.points < 2 or self.lastPointTime == self.firstPointTime:
+			return 0.0
+		return (self.points - 1) / (self.lastPointTime - self.firstPointTime)
+
+
+	@property
+	def jitter(self):
+		"""
+		The standard deviation of the time between two points, in seconds (s).
+		"""
+		if self.interArrival.count < 2:
+			return 0.0
+		return math.sqrt(self._intervalSquares / (self.interArrival.count - 1))
+
+
+	def toDict(self):
+		"""
+		The function `toDict` returns every metric as a dictionary of plain numbers, e.g.: to be logged.
+
+		:return: a dictionary with the counters, the points per second, the jitter and the histograms.
+		"""
+		return {
+			"time": time.time(),
+			"frames": self.frames,
+			"corruptedFrames": self.corruptedFrames,
+			"errorFrames": self.errorFrames,
+			"points": self.points,
+			"pointsPerSecond": self.pointsPerSecond,
+			"jitter_microseconds": self.jitter * 1e6,
+			"callbackOverruns": self.callbackOverruns,
+			"interArrival": self.interArrival.toDict(),
+			"stages": {stage: histogram.toDict() for stage, histogram in self.stages.items()},
+		}
+
+
+	def toJson(self):
+		"""
+		The function `toJson` returns every metric as a JSON string, see `toDict`.
+		"""
+		return json.dumps(self.toDict())
+
+
+	def save(self, path):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `save` writes every metric to a JSON file, see `toDict`.
+
+		:param path: The path of the file to be written
+		"""
+		try:
+			with open(path, "w") as file:
+				json.dump(self.toDict(), file, indent=2)
+		except OSError as e:
+			raise Exception("Could not save the metrics. Reason: ", e)
+
+
+def _bucketIndex(seconds):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	Returns the histogram bucket of a duration.
+	"""
+	mantissa, exponent = math.frexp(seconds * 1e6)  # microseconds = mantissa * 2^exponent, 0.5 <= mantissa < 1
+	if exponent <= 0:
+		return BUCKETS_PER_OCTAVE - 1  # below 1 us
+	index = exponent * BUCKETS_PER_OCTAVE + int((mantissa - 0.5) * 2 * BUCKETS_PER_OCTAVE)
+	return min(index, BUCKETS_PER_OCTAVE * NUMBER_OF_OCTAVES - 1)
+
+
+def _bucketUpperBound(index):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	Returns the upper bound of a histogram bucket, in seconds (s).
+	"""
+	exponent, subBucket = divmod(index, BUCKETS_PER_OCTAVE)
+	return math.ldexp(0.5 + (subBucket + 1) / (2 * BUCKETS_PER_OCTAVE), exponent) / 1e6
@@ -0,0 +1,340 @@
+import numpy as np
+
+from openafe_cycles import ASCENDING, CycleSegmenter, segmentCycles
+
+
+class Peak:
+
+	def __init__(self, index, potential, current, area):
+		"""
+		The `Peak` holds the features of a voltammetric peak.
+
+		:param index: The index of the peak point in the analysed points
+		:param potential: The peak potential, in millivolts (mV)
+		:param current: The peak current above (or below) the baseline, in microamps (uA)
+		:param area: The area between the peak and the baseline, in microamps times millivolts (uA.mV).
+		Divide it by the scan rate (mV/s) to get the charge, in microcoulombs (uC)
+		"""
+		self.index = index
+		self.potential = potential
+		self.current = current
+		self.area = area
+
+
+	def __repr__(self):
+		return f"Peak(potential={self.potential:.2f} mV, current={self.current:.4f} uA, area={self.area:.2f} uA.mV)"
+
+
+def smooth(currents, windowSize=5):
+	"""
+	The function `smooth` applies a centered moving average to the currents. Near the edges the window
+	shrinks, so the output has the same length as the input.
+
+	:param currents: The current values, a 1D array or a 2D array with one run per row
+	:param windowSize: The number of points averaged, 1 disables the smoothing
+	:return: the smoothed currents.
+	"""
+	currents = np.asarray(currents, dtype=float)
+	if windowSize <= 1 or currents.shape[-1] == 0:
+		return currents
+
+	count = currents.shape[-1]
+	half = windowSize // 2
+	sums = np.concatenate((np.zeros(currents.shape[:-1] + (1,)), np.cumsum(currents, axis=-1)), axis=-1)
+	low = np.clip(np.arange(count) - half, 0, count)
+	high = np.clip(np.arange(count) + half + 1, 0, count)
+	return (sums[..., high] - sums[..., low]) / (high - low)
+
+
+def subtractBaseline(voltages, currents, edgePoints=5):
+	"""
+	The function `subtractBaseline` removes a linear baseline drawn through the average of the first and
+	of the last `edgePoints` points of the sweep.
+
+	:param voltages: The voltage values of the sweep, a 1D array or a 2D array with one run per row
+	:param currents: The current values of the sweep, with the same shape as the voltages
+	:param edgePoints: The number of points averaged at each end of the sweep
+	:return: the baseline corrected currents.
+	"""
+	voltages = np.asarray(voltages, dtype=float)
+	currents = np.asarray(currents, dtype=float)
+	if voltages.shape[-1] < 2:
+		return currents - currents
+
+	edgePoints = max(1, min(edgePoints, voltages.shape[-1] // 2))
+	startVoltage = voltages[..., :edgePoints].mean(axis=-1, keepdims=True)
+	endVoltage = voltages[..., -edgePoints:].mean(axis=-1, keepdims=True)
+	startCurrent = currents[..., :edgePoints].mean(axis=-1, keepdims=True)
+	endCurrent = currents[..., -edgePoints:].mean(axis=-1, keepdims=True)
+
+	span = endVoltage - startVoltage
+	slope = np.divide(endCurrent - startCurrent, span, out=np.zeros_like(span), where=span != 0)
+	return currents - (startCurrent + slope * (voltages - startVoltage))
+
+
+def findPeak(voltages, correctedCurrents, polarity=1):
+	"""
+	The function `findPeak` finds the largest peak of a baseline corrected sweep and integrates it over the
+	contiguous region around it where the current stays on the same side of the baseline.
+
+	:param voltages: The voltage values of the sweep, in millivolts (mV)
+	:param correctedCurrents: The baseline corrected currents of the sweep, in microamps (uA)
+	:param polarity: 1 for a peak above the baseline (anodic), -1 for a peak below it (cathodic), 0 for
+	whichever is the largest
+	:return: a `Peak`, or None if the sweep has no point on the requested side of the baseline.
+	"""
+	voltages = np.asarray(voltages, dtype=float)
+	correctedCurrents = np.asarray(correctedCurrents, dtype=float)
+	if len(correctedCurrents) == 0:
+		return None
+
+	if polarity == 0:
+		polarity = 1 if correctedCurrents.max() >= -correctedCurrents.min() else -1
+
+	signed = correctedCurrents * polarity
+	index = int(np.argmax(signed))
+	if signed[index] <= 0:
+		return None
+
+	outside = signed <= 0
+	left = np.flatnonzero(outside[:index])
+	right = np.flatnonzero(outside[index:])
+	start = left[-1] if len(left) else 0
+	end = index + right[0] + 1 if len(right) else len(signed)
+
+	x = voltages[start:end]
+	y = correctedCurrents[start:end]
+	area = abs(float(np.sum((y[1:] + y[:-1]) * np.diff(x)) / 2))
+
+	return Peak(index, float(voltages[index]), float(correctedCurrents[index]), area)
+
+
+def analyzeSweep(voltages, currents, polarity=0, smoothingWindow=5, edgePoints=5):
+	"""
+	The function `analyzeSweep` smooths a single sweep, removes its baseline and finds its peak.
+
+	:param voltages: The voltage values of the sweep, in millivolts (mV)
+	:param currents: The current values of the sweep, in microamps (uA)
+	:param polarity: The polarity of the peak, see `findPeak`
+	:param smoothingWindow: The window of the moving average, see `smooth`
+	:param edgePoints: The number of points at each end used for the baseline, see `subtractBaseline`
+	:return: a `Peak`, or None if no peak was found.
+	"""
+	corrected = subtractBaseline(voltages, smooth(currents, smoothingWindow), edgePoints)
+	return findPeak(voltages, corrected, polarity)
+
+
+def analyzeCyclicVoltammetry(voltages, currents, startingPotential=None, smoothingWindow=5, edgePoints=5):
+	"""
+	The function `analyzeCyclicVoltammetry` extracts, for every cycle, the anodic peak of the ascending
+	sweep, the cathodic peak of the descending sweep and the peak separation (delta Ep).
+
+	:param voltages: The voltage values of the voltammetry, in millivolts (mV)
+	:param currents: The current values of the voltammetry, in microamps (uA)
+	:param startingPotential: The starting potential, in millivolts (mV), see `segmentCycles`
+	:param smoothingWindow: The window of the moving average, see `smooth`
+	:param edgePoints: The number of points at each end used for the baseline, see `subtractBaseline`
+	:return: a list with a dictionary per cycle, with the keys "cycle", "anodicPeak", "cathodicPeak" (a
+	`Peak` or None) and "peakSeparation" (in mV, or None).
+	"""
+	voltages = np.asarray(voltages, dtype=float)
+	currents = np.asarray(currents, dtype=float)
+	cycles, _, ascending, _ = segmentCycles(voltages, startingPotential)
+	if len(cycles) == 0:
+		return []
+
+	# the first point has no direction, it belongs to the first sweep
+	ascending[0] = len(ascending) > 1 and ascending[1]
+
+	# a sweep is a run of consecutive points with the same cycle and direction
+	keys = cycles * 2 + ascending
+	boundaries = np.flatnonzero(np.diff(keys)) + 1
+	starts = np.concatenate(([0], boundaries))
+	ends = np.concatenate((boundaries, [len(keys)]))
+
+	results = {}
+	sweepLengths = {}
+	for start, end in zip(starts, ends):
+		cycle = int(cycles[start])
+		key = "anodicPeak" if ascending[start] else "cathodicPeak"
+
+		# a cycle may hold short runs (e.g.: a repeated vertex), keep the longest sweep; a cycle made only
+		# of short runs is not reported
+		if end - start < 3 or end - start <= sweepLengths.get((cycle, key), 0):
+			continue
+		sweepLengths[(cycle, key)] = end - start
+		cycleResult = results.setdefault(cycle, {"cycle": cycle, "anodicPeak": None, "cathodicPeak": None,
+			"peakSeparation": None})
+
+		peak = analyzeSweep(voltages[start:end], currents[start:end], 1 if ascending[start] else -1,
+			smoothingWindow, edgePoints)
+		if peak is not None:
+			peak.index += int(start)
+		cycleResult[key] = peak
+
+	for cycleResult in results.values():
+		if cycleResult["anodicPeak"] is not None and cycleResult["cathodicPeak"] is not None:
+			cycleResult["peakSeparation"] = cycleResult["anodicPeak"].potential - cycleResult["cathodicPeak"].potential
+
+	return list(results.values())
+
+
+def analyzePulseVoltammetryBatch(voltages, currents, smoothingWindow=5, edgePoints=5):
+	"""
+	The function `analyzePulseVoltammetryBatch` finds the peak of many DPV or SWV runs at once. The runs
+	must have the same number of points, and are processed as 2D arrays, one run per row, so the smoothing,
+	the baseline and the peak search are vectorized across the runs.
+
+	:param voltages: A 2D array with the voltage values of the runs, in millivolts (mV)
+	:param currents: A 2D array with the differential current values of the runs, in microamps (uA)
+	:param smoothingWindow: The window of the moving average, see `smooth`
+	:param edgePoints: The number of points at each end used for the baseline, see `subtractBaseline`
+	:return: a tuple of four arrays (peakPotentials, peakCurrents, peakIndices, peakAreas), one entry per
+	run, the areas integrated like in `findPeak`, in microamps times millivolts (uA.mV).
+	"""
+	voltages = np.atleast_2d(np.asarray(voltages, dtype=float))
+	currents = np.atleast_2d(np.asarray(currents, dtype=float))
+
+	corrected = subtractBaseline(voltages, smooth(currents, smoothingWindow), edgePoints)
+	rows = np.arange(len(corrected))
+	maxima = np.argmax(corrected, axis=-1)
+	minima = np.argmin(corrected, axis=-1)
+	indices = np.where(corrected[rows, maxima] >= -corrected[rows, minima], maxima, minima)
+
+	# the area of the contiguous region around each peak where the current stays on the side of the peak
+	count = corrected.shape[-1]
+	columns = np.arange(count)
+	signed = corrected * np.sign(corrected[rows, indices])[:, None]
+	outside = signed <= 0
+	starts = np.where(outside & (columns < indices[:, None]), columns, 0).max(axis=-1)
+	ends = np.minimum(np.where(outside & (columns >= indices[:, None]), columns, count).min(axis=-1) + 1, count)
+	trapezoids = (corrected[:, 1:] + corrected[:, :-1]) * np.diff(voltages, axis=-1) / 2
+	inside = (columns[:-1] >= starts[:, None]) & (columns[:-1] < ends[:, None] - 1)
+	areas = np.abs(np.sum(trapezoids * inside, axis=-1))
+
+	return voltages[rows, indices], corrected[rows, indices], indices, areas
+
+
+class StreamingPeakAnalyzer:
+
+	def __init__(self, startingPotential=None, cyclic=True, onCycleCallback=None, smoothingWindow=5, edgePoints=5):
+		"""
+		The `StreamingPeakAnalyzer` extracts the peaks during the acquisition. It keeps only the sweep being
+		received and analyses it as soon as the sweep turns, so the results of a cycle are ready while the
+		next one is being acquired. It gives the same results as `analyzeCyclicVoltammetry`. It can be fed
+		by the `OpenAFE` point or batch callbacks.
+
+		:param startingPotential: The starting potential, in millivolts (mV), see `segmentCycles`
+		:param cyclic: True for cyclic voltammetry, False for DPV or SWV (a single sweep, analysed on `finish`)
+		:param onCycleCallback: An optional function called with the result dictionary of every cycle, see
+		`analyzeCyclicVoltammetry`
+		:param smoothingWindow: The window of the moving average, see `smooth`
+		:param edgePoints: The number of points at each end used for the baseline, see `subtractBaseline`
+		"""
+		self.cyclic = cyclic
+		self.onCycleCallback = onCycleCallback
+		self.smoothingWindow = smoothingWindow
+		self.edgePoints = edgePoints
+		self.cycleSegmenter = CycleSegmenter(startingPotential)
+
+		self.results = []
+		self.peak = None
+		self._sweepVoltages = []
+		self._sweepCurrents = []
+		self._sweepKey = None
+		self._sweepStart = 0
+		self._sweepLengths = {}
+		self._cycleResult = None
+
+
+	def addPoint(self, voltage, current):
+		"""
+		The function `addPoint` feeds the next point to the analyzer.
+
+		:param voltage: The voltage value of the point, in millivolts (mV)
+		:param current: The current value of the point, in microamps (uA)
+		"""
+		cycle, direction = self.cycleSegmenter.addPoint(voltage)
+
+		if self.cyclic and direction != 0 and (cycle, direction) != self._sweepKey:
+			if self._sweepKey is not None:
+				self._analyzeSweep()
+				self._sweepVoltages = []
+				self._sweepCurrents = []
+				self._sweepStart = self.cycleSegmenter.numberOfPoints - 1
+			self._sweepKey = (cycle, direction)
+
+		self._sweepVoltages.append(voltage)
+		self._sweepCurrents.append(current)
+
+
+	def addPoints(self, voltages, currents):
+		"""
+		The function `addPoints` feeds several points to the analyzer, e.g.: as the `OpenAFE` batch callback.
+
+		:param voltages: An iterable of voltage values, in millivolts (mV)
+		:param currents: An iterable of current values, in microamps (uA)
+		"""
+		for voltage, current in zip(voltages, currents):
+			self.addPoint(float(voltage), float(current))
+
+
+	def finish(self):
+		"""
+		The function `finish` analyses the last sweep, it must be called when the voltammetry ends.
+
+		:return: the list of cycle results for cyclic voltammetry, or the `Peak` of the sweep for DPV or SWV.
+		"""
+		if not self.cyclic:
+			self.peak = analyzeSweep(self._sweepVoltages, self._sweepCurrents, 0, self.smoothingWindow, self.edgePoints)
+			return self.peak
+
+		if self._sweepKey is not None:
+			self._analyzeSweep()
+		if self._cycleResult is not None:
+			self._finishCycle()
+		return self.results
+
+
+	def _analyzeSweep(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Analyses the sweep just completed and stores its peak in the result of its cycle.
+		"""
+		cycle, direction = self._sweepKey
+		length = len(self._sweepVoltages)
+		if length < 3:
+			return  # a short run (e.g.: a repeated vertex), a cycle made only of them is not reported
+
+		if self._cycleResult is not None and self._cycleResult["cycle"] != cycle:
+			self._finishCycle()
+		if self._cycleResult is None:
+			self._cycleResult = {"cycle": cycle, "anodicPeak": None, "cathodicPeak": None, "peakSeparation": None}
+			self._sweepLengths = {}
+
+		key = "anodicPeak" if direction == ASCENDING else "cathodicPeak"
+
+		# keep the longest sweep of the cycle
+		if length > self._sweepLengths.get(key, 0):
+			self._sweepLengths[key] = length
+			peak = analyzeSweep(self._sweepVoltages, self._sweepCurrents, 1 if direction == ASCENDING else -1,
+				self.smoothingWindow, self.edgePoints)
+			if peak is not None:
+				peak.index += self._sweepStart
+			self._cycleResult[key] = peak
+
+
+	def _finishCycle(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Completes the result of the current cycle and reports it.
+		"""
+		cycleResult = self._cycleResult
+		self._cycleResult = None
+		if cycleResult["anodicPeak"] is not None and cycleResult["cathodicPeak"] is not None:
+			cycleResult["peakSeparation"] = cycleResult["anodicPeak"].potential - cycleResult["cathodicPeak"].potential
+		self.results.append(cycleResult)
+		if self.onCycleCallback is not None:
+			self.onCycleCallback(cycleResult)
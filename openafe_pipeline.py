@@ -0,0 +1,204 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+# the shared ring attached by each worker process: (SharedMemory, voltages, currents)
+_workerRing = None
+
+
+class AnalysisPipeline:
+
+	def __init__(self, analysis, workers=None, ringCapacity=262144, onResultCallback=None):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The `AnalysisPipeline` moves CPU bound analysis (filtering, peak tracking, fitting...) off the
+		process reading the device. Point batches are copied into a ring of NumPy arrays in shared memory and
+		analysed by a pool of worker processes, which read them from the ring without any pickling and
+		return their results asynchronously. The reader never waits for the analysis and the analysis runs
+		on several cores. It can be given to `OpenAFE.receiveVoltammetryPoints`, or fed with `submit`.
+
+		The `analysis` function is called in a worker as `analysis(voltages, currents, firstIndex)`, with read
+		only arrays of one batch and the index of its first point in the run, and its return value is handed
+		to `onResultCallback`. It must be a module level function, so it can be sent to the workers, e.g.:
+
+			def analysis(voltages, currents, firstIndex):
+				return firstIndex, openafe_peaks.smooth(currents, 15)
+
+		:param analysis: The function run on every batch, see above
+		:param workers: The number of worker processes, None uses the number of cores
+		:param ringCapacity: The number of points held by the shared ring, i.e.: waiting or being analysed
+		:param onResultCallback: An optional function called with the result of each batch, in the order the
+		batches were submitted, from the thread calling `submit`, `poll` or `finish`. Without it, the results
+		are kept in `self.results`
+		"""
+		if np is None:
+			raise Exception("NumPy is required by the analysis pipeline, install it with: pip install numpy")
+
+		self.analysis = analysis
+		self.ringCapacity = ringCapacity
+		self.onResultCallback = onResultCallback
+		self.results = []
+		self.submittedPoints = 0
+		self.stalls = 0  # times `submit` had to wait for the workers to free the ring
+
+		try:
+			self.sharedMemory = shared_memory.SharedMemory(create=True, size=2 * 8 * ringCapacity)
+		except OSError as e:
+			raise Exception("Could not allocate the shared memory of the analysis pipeline. Reason: ", e)
+
+		self.voltages = np.ndarray(ringCapacity, np.float64, self.sharedMemory.buf)
+		self.currents = np.ndarray(ringCapacity, np.float64, self.sharedMemory.buf, 8 * ringCapacity)
+		self.writePosition = 0
+		self._pending = deque()  # (future, start, end) of the batches being analysed, in submission order
+
+		self.workers = workers or os.cpu_count()
+		self.executor = ProcessPoolExecutor(self.workers, initializer=_attachRing,
+			initargs=(self.sharedMemory.name, ringCapacity))
+
+
+	def submit(self, voltages, currents):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `submit` copies a batch of points into the shared ring and queues its analysis. It only
+		waits when the ring is full of batches still being analysed, delivering their results.
+
+		:param voltages: The voltage values of the batch, in millivolts (mV)
+		:param currents: The current values of the batch, in microamps (uA)
+		"""
+		count = len(voltages)
+		if count == 0:
+			return
+		if count > self.ringCapacity:
+			half = count // 2
+			self.submit(voltages[:half], currents[:half])
+			self.submit(voltages[half:], currents[half:])
+			return
+
+		start = self.writePosition
+		if start + count > self.ringCapacity:
+			start = 0  # the batches are kept contiguous, the end of the ring is left unused
+		end = start + count
+
+		while self._pending and self._overlaps(start, end):
+			self.stalls += 1
+			self._deliverOldest()
+
+		self.voltages[start:end] = voltages
+		self.currents[start:end] = currents
+		future = self.executor.submit(_analyzeSlice, self.analysis, start, end, self.submittedPoints)
+		self._pending.append((future, start, end))
+		self.writePosition = end
+		self.submittedPoints += count
+
+		self.poll()
+
+
+	def poll(self):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `poll` delivers the results of the batches already analysed, without waiting.
+		"""
+		while self._pending and self._pending[0][0].done():
+			self._deliverOldest()
+
+
+	def finish(self):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The function `finish` waits for every submitted batch and delivers its result.
+
+		:return: the results kept in `self.results`.
+		"""
+		while self._pending:
+			self._deliverOldest()
+		return self.results
+
+
+	def close(self):
+		"""
+		The function `close` stops the worker processes and releases the shared memory. Pending batches are
+		discarded, call `finish` first to get them.
+		"""
+		for future, start, end in self._pending:
+			future.cancel()
+		self._pending.clear()
+		self.executor.shutdown(wait=True)
+		self.voltages = None
+		self.currents = None
+		self.sharedMemory.close()
+		self.sharedMemory.unlink()
+
+
+	def __enter__(self):
+		return self
+
+
+	def __exit__(self, *exception):
+		self.close()
+
+
+	def _overlaps(self, start, end):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Tells if the region [start, end) of the ring holds a batch still being analysed.
+		"""
+		for future, pendingStart, pendingEnd in self._pending:
+			if start < pendingEnd and pendingStart < end:
+				return True
+		return False
+
+
+	def _deliverOldest(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+		NOTE: This method can raise an Exception.
+
+		Waits for the oldest pending batch and delivers its result.
+		"""
+		future, start, end = self._pending.popleft()
+		try:
+			result = future.result()
+		except Exception as e:
+			raise Exception("The analysis of a batch failed. Reason: ", e)
+
+		if self.onResultCallback is not None:
+			self.onResultCallback(result)
+		else:
+			self.results.append(result)
+
+
+def _attachRing(name, capacity):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	Initializer of the worker processes: attaches the shared ring, as read only arrays.
+	"""
+	global _workerRing
+	sharedMemory = shared_memory.SharedMemory(name)  # the workers share the resource tracker of the pipeline
+
+	voltages = np.ndarray(capacity, np.float64, sharedMemory.buf)
+	currents = np.ndarray(capacity, np.float64, sharedMemory.buf, 8 * capacity)
+	voltages.flags.writeable = False
+	currents.flags.writeable = False
+	_workerRing = (sharedMemory, voltages, currents)
+
+
+def _analyzeSlice(analysis, start, end, firstIndex):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	Runs in a worker process: analyses the batch held in [start, end) of the shared ring.
+	"""
+	sharedMemory, voltages, currents = _workerRing
+	return analysis(voltages[start:end], currents[start:end], firstIndex)
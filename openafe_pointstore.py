@@ -0,0 +1,215 @@
+from array import array
+
+import numpy as np
+
+
+def lttbDownsample(x, y, threshold):
+	"""
+	The function `lttbDownsample` reduces a line to `threshold` points with the Largest-Triangle-Three-
+	Buckets algorithm: the points are split into buckets and, from each bucket, the point forming the
+	largest triangle with the point kept from the previous bucket and the average of the next bucket is
+	kept. Peaks and turning points survive, unlike with plain decimation.
+
+	:param x: The x values of the line
+	:param y: The y values of the line
+	:param threshold: The number of points to keep, at least 3
+	:return: a tuple of two arrays (x, y) with the kept points, or the given arrays if they already have
+	no more than `threshold` points.
+	"""
+	x = np.asarray(x, dtype=float)
+	y = np.asarray(y, dtype=float)
+	count = len(x)
+	if threshold >= count or threshold < 3:
+		return x, y
+
+	# bucket i holds the points edges[i]:edges[i + 1], the first and the last points are always kept
+	edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+	edges = np.append(edges, count)
+	selected = np.empty(threshold, dtype=np.int64)
+	selected[0] = 0
+	selected[-1] = count - 1
+
+	# averages of every bucket, computed at once with cumulative sums
+	sumsX = np.concatenate(([0.0], np.cumsum(x)))
+	sumsY = np.concatenate(([0.0], np.cumsum(y)))
+	sizes = edges[1:] - edges[:-1]
+	averagesX = (sumsX[edges[1:]] - sumsX[edges[:-1]]) / sizes
+	averagesY = (sumsY[edges[1:]] - sumsY[edges[:-1]]) / sizes
+
+	previous = 0
+	for bucket in range(threshold - 2):
+		start = edges[bucket]
+		end = edges[bucket + 1]
+		previousX = x[previous]
+		previousY = y[previous]
+		areas = np.abs((previousX - averagesX[bucket + 1]) * (y[start:end] - previousY)
+			- (previousX - x[start:end]) * (averagesY[bucket + 1] - previousY))
+		previous = start + int(np.argmax(areas))
+		selected[bucket + 1] = previous
+
+	return x[selected], y[selected]
+
+
+class PointStore:
+
+	def __init__(self, chunkSize=65536):
+		"""
+		The `PointStore` holds the (voltage, current) points of a run compactly: the points are appended to
+		`array('d')` chunks (16 bytes per point, against more than 60 for two deques of Python floats) and it
+		grows without a cap. `getDisplayPoints` returns the points reduced to what can be seen on screen.
+
+		:param chunkSize: The number of points of each chunk
+		"""
+		self.chunkSize = chunkSize
+		self.chunks = []  # completed chunks, as (voltages, currents) NumPy arrays
+		self.voltages = array('d')
+		self.currents = array('d')
+		self.length = 0
+
+		self._arrays = None
+		self._displayCache = {}
+
+
+	def __len__(self):
+		return self.length
+
+
+	def append(self, voltage, current):
+		"""
+		The function `append` stores a point.
+
+		:param voltage: The voltage value of the point, in millivolts (mV)
+		:param current: The current value of the point, in microamps (uA)
+		"""
+		self.voltages.append(voltage)
+		self.currents.append(current)
+		self.length += 1
+		if len(self.voltages) == self.chunkSize:
+			self._closeChunk()
+
+
+	def extend(self, voltages, currents):
+		"""
+		The function `extend` stores several points.
+
+		:param voltages: An iterable of voltage values, in millivolts (mV)
+		:param currents: An iterable of current values, in microamps (uA)
+		"""
+		for voltage, current in zip(voltages, currents):
+			self.append(voltage, current)
+
+
+	def arrays(self):
+		"""
+		The function `arrays` returns every stored point as two contiguous NumPy arrays. The arrays are
+		cached until new points are stored.
+
+		:return: a tuple of two arrays (voltages, currents).
+		"""
+		if self._arrays is None or len(self._arrays[0]) != self.length:
+			voltages = [chunk[0] for chunk in self.chunks] + [np.frombuffer(self.voltages)]
+			currents = [chunk[1] for chunk in self.chunks] + [np.frombuffer(self.currents)]
+			self._arrays = (np.concatenate(voltages), np.concatenate(currents))
+		return self._arrays
+
+
+	def getDisplayPoints(self, pixelBudget, xRange=None):
+		"""
+		The function `getDisplayPoints` returns the points to be drawn: the points inside `xRange` reduced
+		with `lttbDownsample` to about `pixelBudget` points. The result is cached per budget and x range
+		(zoom level); while points keep arriving, the new ones are appended raw to the cached result, which
+		is only recomputed once they amount to a quarter of the budget, so each call costs about the same
+		however long the run is. NaN values split the line into segments that are reduced separately.
+
+		:param pixelBudget: The maximum number of points to be drawn, e.g.: twice the width of the axes
+		in pixels
+		:param xRange: An optional (left, right) tuple, only the points with x inside it are kept
+		:return: a tuple of two arrays (voltages, currents).
+		"""
+		key = (pixelBudget, xRange)
+		cached = self._displayCache.get(key)
+		if cached is not None:
+			cachedLength, cachedVoltages, cachedCurrents = cached
+			if cachedLength == self.length:
+				return cachedVoltages, cachedCurrents
+			if self.length - cachedLength < max(pixelBudget // 4, 1):
+				voltages, currents = self._tail(cachedLength, xRange)
+				return np.concatenate((cachedVoltages, voltages)), np.concatenate((cachedCurrents, currents))
+
+		voltages, currents = self._tail(0, xRange)
+		if len(voltages) > pixelBudget:
+			voltages, currents = self._downsample(voltages, currents, pixelBudget)
+
+		if len(self._displayCache) >= 8 and key not in self._displayCache:
+			self._displayCache.pop(next(iter(self._displayCache)))
+		self._displayCache[key] = (self.length, voltages, currents)
+		return voltages, currents
+
+
+	def _tail(self, start, xRange):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Returns the points from `start` on, keeping only the ones inside `xRange`, if given, and the NaN breaks.
+		"""
+		if start == 0:
+			voltages, currents = self.arrays()
+		else:
+			voltages, currents = self._pointsFrom(start)
+		if xRange is not None:
+			inside = (voltages >= xRange[0]) & (voltages <= xRange[1])
+			inside |= np.isnan(voltages)  # keep the breaks, or the segments around them would be joined
+			voltages = voltages[inside]
+			currents = currents[inside]
+		return voltages, currents
+
+
+	def _pointsFrom(self, start):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Returns the points from `start` on, copying only the chunks that hold them.
+		"""
+		voltages = []
+		currents = []
+		offset = 0
+		for chunkVoltages, chunkCurrents in self.chunks + [(np.frombuffer(self.voltages), np.frombuffer(self.currents))]:
+			if offset + len(chunkVoltages) > start:
+				voltages.append(chunkVoltages[max(start - offset, 0):])
+				currents.append(chunkCurrents[max(start - offset, 0):])
+			offset += len(chunkVoltages)
+		return np.concatenate(voltages), np.concatenate(currents)
+
+
+	def _downsample(self, voltages, currents, pixelBudget):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Downsamples every segment between NaN breaks to its share of the budget, keeping the breaks.
+		"""
+		breaks = np.flatnonzero(np.isnan(voltages))
+		if len(breaks) == 0:
+			return lttbDownsample(voltages, currents, pixelBudget)
+
+		starts = np.concatenate(([0], breaks + 1))
+		ends = np.concatenate((breaks, [len(voltages)]))
+		total = len(voltages) - len(breaks)
+		resultVoltages = []
+		resultCurrents = []
+		for start, end in zip(starts, ends):
+			threshold = max(3, pixelBudget * (end - start) // max(total, 1))
+			segmentVoltages, segmentCurrents = lttbDownsample(voltages[start:end], currents[start:end], threshold)
+			resultVoltages += [segmentVoltages, [np.nan]]
+			resultCurrents += [segmentCurrents, [np.nan]]
+		return np.concatenate(resultVoltages[:-1]), np.concatenate(resultCurrents[:-1])
+
+
+	def _closeChunk(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Moves the current chunk to the completed chunks, as NumPy arrays sharing its memory.
+		"""
+		self.chunks.append((np.frombuffer(self.voltages), np.frombuffer(self.currents)))
+		self.voltages = array('d')
+		self.currents = array('d')
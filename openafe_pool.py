@@ -0,0 +1,196 @@
+import queue
+import threading
+import time
+
+from openafe import OpenAFE
+
+
+class DeviceStatistics:
+
+	def __init__(self, deviceId):
+		"""
+		The `DeviceStatistics` holds the throughput and error report of one device of an `OpenAFEPool`.
+
+		:param deviceId: The id of the device in the pool
+		"""
+		self.deviceId = deviceId
+		self.points = 0
+		self.droppedPoints = 0
+		self.startTime = None
+		self.endTime = None
+		self.error = None
+
+
+	@property
+	def pointsPerSecond(self):
+		if self.startTime is None:
+			return 0.0
+		elapsed = (self.endTime or time.perf_counter()) - self.startTime
+		return self.points / elapsed if elapsed > 0 else 0.0
+
+
+	def __repr__(self):
+		return f"DeviceStatistics({self.deviceId!r}, points={self.points}, pointsPerSecond={self.pointsPerSecond:.1f}, " \
+			f"droppedPoints={self.droppedPoints}, error={self.error!r})"
+
+
+class OpenAFEPool:
+
+	def __init__(self, comPorts, transports=None, bufferCapacity=65536, batchSize=256, maxLatency_milliseconds=50):
+		"""
+		The `OpenAFEPool` runs voltammetries on several OpenAFE devices in parallel, one thread per device,
+		and merges their points into one stream tagged with the device id. A device that fails is reported
+		in its statistics and does not stall the others.
+
+		:param comPorts: The serial ports of the devices, either a list (the ports are the device ids) or a
+		dictionary of device id -> serial port
+		:param transports: An optional dictionary of device id -> serial-like object used instead of opening
+		the port of that device, see `OpenAFE`
+		:param bufferCapacity: The capacity of the ring buffer of each device, see `OpenAFE.startReaderThread`
+		:param batchSize: The maximum number of points of a device merged into the stream at once
+		:param maxLatency_milliseconds: The maximum time a point waits before being merged into the stream
+		"""
+		if not isinstance(comPorts, dict):
+			comPorts = {comPort: comPort for comPort in comPorts}
+
+		self.comPorts = comPorts
+		self.transports = transports or {}
+		self.bufferCapacity = bufferCapacity
+		self.batchSize = batchSize
+		self.maxLatency = maxLatency_milliseconds / 1000
+
+		self.devices = {}
+		self.statistics = {deviceId: DeviceStatistics(deviceId) for deviceId in comPorts}
+		self._stream = queue.Queue()
+		self._threads = []
+
+
+	def open(self):
+		"""
+		The function `open` connects to every device concurrently. Devices that fail to connect are left out
+		of the pool, with the reason in their statistics.
+
+		:return: the list of ids of the connected devices.
+		"""
+		def connect(deviceId):
+			try:
+				self.devices[deviceId] = OpenAFE(self.comPorts[deviceId], transport=self.transports.get(deviceId))
+			except Exception as e:
+				self.statistics[deviceId].error = e
+
+		threads = [threading.Thread(target=connect, args=(deviceId,)) for deviceId in self.comPorts]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		return [deviceId for deviceId in self.comPorts if deviceId in self.devices]
+
+
+	def start(self, experiment):
+		"""
+		The function `start` starts an experiment on every connected device, each one on its own thread.
+
+		:param experiment: A function called with each `OpenAFE` device to send the commands of the
+		experiment, e.g.: `lambda device: device.makeCyclicVoltammetry(1000, -500, 500, 250, 2, 1)`
+		"""
+		self._threads = []
+		for deviceId, device in self.devices.items():
+			self.statistics[deviceId] = DeviceStatistics(deviceId)
+			thread = threading.Thread(target=self._runDevice, args=(deviceId, device, experiment),
+				name=f"OpenAFE pool {deviceId}", daemon=True)
+			self._threads.append(thread)
+			thread.start()
+
+
+	def batches(self):
+		"""
+		The function `batches` iterates over the merged points of every device until all of them are done.
+
+		:return: an iterator of (deviceId, voltages, currents) tuples, where voltages and currents are float
+		arrays of the same device.
+		"""
+		running = len(self._threads)
+		while running > 0:
+			item = self._stream.get()
+			if item is None:
+				running -= 1
+			else:
+				yield item
+
+
+	def points(self):
+		"""
+		The function `points` iterates over the merged points of every device until all of them are done.
+
+		:return: an iterator of (deviceId, voltage, current) tuples.
+		"""
+		for deviceId, voltages, currents in self.batches():
+			for voltage, current in zip(voltages, currents):
+				yield deviceId, voltage, current
+
+
+	def run(self, experiment, onPointsCallback=None):
+		"""
+		The function `run` starts an experiment on every connected device and waits for all of them.
+
+		:param experiment: A function called with each `OpenAFE` device to send the commands of the
+		experiment, see `start`
+		:param onPointsCallback: An optional function called with (deviceId, voltages, currents) for every
+		batch of points
+		:return: the dictionary of device id -> `DeviceStatistics`.
+		"""
+		self.start(experiment)
+		for deviceId, voltages, currents in self.batches():
+			if onPointsCallback is not None:
+				onPointsCallback(deviceId, voltages, currents)
+		return self.statistics
+
+
+	def totalPointsPerSecond(self):
+		"""
+		The function `totalPointsPerSecond` sums the throughput of every device.
+
+		:return: the number of points per second of the whole pool.
+		"""
+		return sum(statistics.pointsPerSecond for statistics in self.statistics.values())
+
+
+	def close(self):
+		"""
+		The function `close` closes the serial port of every device.
+		"""
+		for device in self.devices.values():
+			close = getattr(device.ser, "close", None)
+			if close is not None:
+				close()
+
+
+	def _runDevice(self, deviceId, device, experiment):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		The body of a device thread: sends the experiment commands, then moves the points buffered by the
+		device reader thread into the merged stream. Any error is kept in the device statistics.
+		"""
+		statistics = self.statistics[deviceId]
+		try:
+			experiment(device)
+			statistics.startTime = time.perf_counter()
+			pointBuffer = device.startReaderThread(self.bufferCapacity)
+
+			while not pointBuffer.isDrained():
+				voltages, currents, _ = pointBuffer.pull(self.batchSize, self.maxLatency, minPoints=self.batchSize)
+				if len(voltages) > 0:
+					statistics.points += len(voltages)
+					self._stream.put((deviceId, voltages, currents))
+
+			device.readerThread.join()
+			statistics.droppedPoints = pointBuffer.droppedPoints
+			if device.readerException is not None:
+				raise device.readerException
+		except Exception as e:
+			statistics.error = e
+		finally:
+			statistics.endTime = time.perf_counter()
+			self._stream.put(None)
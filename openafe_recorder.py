@@ -0,0 +1,228 @@
+import json
+import mmap
+import struct
+import time
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+from openafe_cycles import CycleSegmenter
+
+MAGIC = b"OAFEREC1"
+
+# record: time (s), voltage (mV), current (uA), cycle, direction (+1 ascending, -1 descending, 0 unknown)
+RECORD_FORMAT = "<dffIb3x"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+
+class PointRecorder:
+
+	def __init__(self, path, parameters=None, chunkSize=4096):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The `PointRecorder` streams voltammetry points to a binary file made of a small header, holding the
+		experiment parameters, followed by fixed-width (time, voltage, current, cycle, direction) records.
+		The records are packed into a preallocated chunk and written once it is full, so recording costs
+		little on the read loop and the memory used does not grow with the run. It can be given to
+		`OpenAFE.receiveVoltammetryPoints`, and the file is read back with `RecordingReader`.
+
+		:param path: The path of the file to be written
+		:param parameters: A dictionary with the experiment parameters to be stored in the header, e.g.:
+		{"command": "CVW,1000,-500,500,250,2,1", "currentRange": 200}
+		:param chunkSize: The number of records written to the file at once
+		"""
+		header = json.dumps(parameters or {}).encode("utf-8")
+		header += b" " * (-(len(MAGIC) + 4 + len(header)) % 8)  # keep the records 8 byte aligned
+
+		try:
+			self.file = open(path, "wb")
+		except OSError as e:
+			raise Exception("Could not create the recording file. Reason: ", e)
+
+		self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+		self.chunkSize = chunkSize
+		self.chunk = bytearray(chunkSize * RECORD_SIZE)
+		self.chunkCount = 0
+		self.numberOfRecords = 0
+		self.startTime = time.perf_counter()
+
+		self.cycleSegmenter = CycleSegmenter()
+
+
+	def record(self, voltage, current, timestamp=None):
+		"""
+		The function `record` appends a point to the recording.
+
+		:param voltage: The voltage value of the point, in millivolts (mV)
+		:param current: The current value of the point, in microamps (uA)
+		:param timestamp: The `time.perf_counter()` at which the point was received, None uses the current time
+		"""
+		if timestamp is None:
+			timestamp = time.perf_counter()
+
+		cycle, direction = self.cycleSegmenter.addPoint(voltage)
+
+		struct.pack_into(RECORD_FORMAT, self.chunk, self.chunkCount * RECORD_SIZE, timestamp - self.startTime,
+			voltage, current, cycle, direction)
+		self.chunkCount += 1
+		self.numberOfRecords += 1
+
+		if self.chunkCount == self.chunkSize:
+			self.flush()
+
+
+	def recordBatch(self, voltages, currents, timestamps=None):
+		"""
+		The function `recordBatch` appends several points to the recording.
+
+		:param voltages: An iterable of voltage values, in millivolts (mV)
+		:param currents: An iterable of current values, in microamps (uA)
+		:param timestamps: An optional iterable with the `time.perf_counter()` of each point
+		"""
+		if timestamps is None:
+			now = time.perf_counter()
+			for voltage, current in zip(voltages, currents):
+				self.record(voltage, current, now)
+		else:
+			for voltage, current, timestamp in zip(voltages, currents, timestamps):
+				self.record(voltage, current, timestamp)
+
+
+	def flush(self):
+		"""
+		The function `flush` writes the pending records to the file.
+		"""
+		if self.chunkCount > 0:
+			self.file.write(memoryview(self.chunk)[:self.chunkCount * RECORD_SIZE])
+			self.chunkCount = 0
+		self.file.flush()
+
+
+	def close(self):
+		"""
+		The function `close` writes the pending records and closes the file.
+		"""
+		if not self.file.closed:
+			self.flush()
+			self.file.close()
+
+
+	def __enter__(self):
+		return self
+
+
+	def __exit__(self, *exception):
+		self.close()
+
+
+class RecordingReader:
+
+	def __init__(self, path):
+		"""
+		NOTE: This method can raise an Exception.
+
+		The `RecordingReader` opens a file written by `PointRecorder` with memory mapping, so its records are
+		exposed as NumPy arrays without being copied into memory, e.g.: `reader.voltages`, `reader.currents`.
+		A file still being recorded can be opened; only the records already flushed are visible.
+
+		:param path: The path of the recording file
+		"""
+		if np is None:
+			raise Exception("NumPy is required to read the recordings, install it with: pip install numpy")
+
+		self.file = open(path, "rb")
+		magic = self.file.read(len(MAGIC))
+		if magic != MAGIC:
+			self.file.close()
+			raise Exception("The file is not an OpenAFE recording.")
+
+		headerLength, = struct.unpack("<I", self.file.read(4))
+		self.parameters = json.loads(self.file.read(headerLength).decode("utf-8"))
+		dataOffset = len(MAGIC) + 4 + headerLength
+
+		fileSize = self.file.seek(0, 2)
+		numberOfRecords = (fileSize - dataOffset) // RECORD_SIZE
+
+		dtype = np.dtype([("time", "<f8"), ("voltage", "<f4"), ("current", "<f4"), ("cycle", "<u4"),
+			("direction", "i1"), ("padding", "V3")])
+		if numberOfRecords > 0:
+			self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+			self.records = np.frombuffer(self.map, dtype, numberOfRecords, dataOffset)
+		else:
+			self.map = None
+			self.records = np.empty(0, dtype)
+
+
+	def __len__(self):
+		return len(self.records)
+
+
+	@property
+	def times(self):
+		return self.records["time"]
+
+
+	@property
+	def voltages(self):
+		return self.records["voltage"]
+
+
+	@property
+	def currents(self):
+		return self.records["current"]
+
+
+	@property
+	def cycles(self):
+		return self.records["cycle"]
+
+
+	@property
+	def directions(self):
+		return self.records["direction"]
+
+
+	def replay(self, onPointCallback=None, onBatchCallback=None, batchSize=4096):
+		"""
+		The function `replay` feeds the recorded points to the same callbacks used with `OpenAFE`, e.g.: to
+		plot a recorded run with `LivePlot.addPoint` or to analyse it.
+
+		:param onPointCallback: An optional function called with (voltage, current) for every point
+		:param onBatchCallback: An optional function called with (voltages, currents) arrays of up to
+		`batchSize` points
+		:param batchSize: The maximum number of points of a batch
+		"""
+		for start in range(0, len(self.records), batchSize):
+			voltages = self.voltages[start:start + batchSize]
+			currents = self.currents[start:start + batchSize]
+			if onPointCallback is not None:
+				for voltage, current in zip(voltages.tolist(), currents.tolist()):
+					onPointCallback(voltage, current)
+			if onBatchCallback is not None:
+				onBatchCallback(voltages, currents)
+
+
+	def close(self):
+		"""
+		The function `close` releases the memory map and closes the file. The arrays obtained from the
+		reader must not be used afterwards.
+		"""
+		self.records = None
+		if self.map is not None:
+			try:
+				self.map.close()
+			except BufferError:
+				pass  # arrays still in use, the map is released with them
+		self.file.close()
+
+
+	def __enter__(self):
+		return self
+
+
+	def __exit__(self, *exception):
+		self.close()
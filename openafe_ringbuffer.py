@@ -0,0 +1,111 @@
+import threading
+from array import array
+
+
+class PointRingBuffer:
+
+	def __init__(self, capacity=65536):
+		"""
+		The `PointRingBuffer` is a preallocated, array-backed ring of (voltage, current, timestamp) points.
+		A single producer (the serial reader thread) pushes points without ever blocking, and consumers
+		pull them in batches at their own pace. When the ring is full the oldest point is overwritten and
+		counted in `droppedPoints`.
+
+		:param capacity: The maximum number of points held by the ring
+		"""
+		self.capacity = capacity
+		self.voltages = array('d', bytes(8 * capacity))
+		self.currents = array('d', bytes(8 * capacity))
+		self.timestamps = array('d', bytes(8 * capacity))
+
+		self.writeCount = 0  # total points pushed
+		self.readCount = 0  # total points pulled or dropped
+		self.highWaterMark = 0
+		self.droppedPoints = 0
+		self.finished = False
+
+		self._condition = threading.Condition(threading.Lock())
+
+
+	def __len__(self):
+		return self.writeCount - self.readCount
+
+
+	def push(self, voltage, current, timestamp):
+		"""
+		The function `push` appends a point to the ring, overwriting the oldest one if the ring is full.
+
+		:param voltage: The voltage value of the point, in millivolts (mV)
+		:param current: The current value of the point, in microamps (uA)
+		:param timestamp: The time at which the point was received, in seconds
+		"""
+		with self._condition:
+			index = self.writeCount % self.capacity
+			self.voltages[index] = voltage
+			self.currents[index] = current
+			self.timestamps[index] = timestamp
+			self.writeCount += 1
+
+			pending = self.writeCount - self.readCount
+			if pending > self.capacity:
+				self.readCount += 1
+				self.droppedPoints += 1
+				pending = self.capacity
+			if pending > self.highWaterMark:
+				self.highWaterMark = pending
+
+			self._condition.notify()
+
+
+	def pull(self, maxPoints=None, timeout=None, minPoints=1):
+		"""
+		The function `pull` removes up to `maxPoints` points from the ring, waiting up to `timeout` seconds
+		for at least `minPoints` points to be available.
+
+		:param maxPoints: The maximum number of points to pull, None pulls every pending point
+		:param timeout: The maximum time to wait for the points, in seconds. None waits until the points
+		arrive or the ring is closed, 0 does not wait
+		:param minPoints: The number of points to wait for, fewer points are returned only if the timeout
+		expires or the ring is closed
+		:return: a tuple of three arrays (voltages, currents, timestamps), which are empty if no point
+		arrived before the timeout or the ring was closed.
+		"""
+		with self._condition:
+			if self.writeCount - self.readCount < minPoints and not self.finished and timeout != 0:
+				self._condition.wait_for(lambda: self.writeCount - self.readCount >= minPoints or self.finished, timeout)
+
+			count = self.writeCount - self.readCount
+			if maxPoints is not None and count > maxPoints:
+				count = maxPoints
+
+			start = self.readCount % self.capacity
+			end = start + count
+			if end <= self.capacity:
+				batch = (self.voltages[start:end], self.currents[start:end], self.timestamps[start:end])
+			else:
+				end -= self.capacity
+				batch = (self.voltages[start:] + self.voltages[:end], self.currents[start:] + self.currents[:end],
+					self.timestamps[start:] + self.timestamps[:end])
+
+			self.readCount += count
+			return batch
+
+
+	def close(self):
+		"""
+		The function `close` marks the ring as finished (no more points will be pushed) and wakes up any
+		consumer waiting on `pull`.
+		"""
+		with self._condition:
+			self.finished = True
+			self._condition.notify_all()
+
+
+	def isDrained(self):
+		"""
+		The function `isDrained` checks if the ring was closed and every point was already pulled.
+
+		:return: True if no more points will ever be pulled from the ring, False otherwise.
+		"""
+		with self._condition:
+			return self.finished and self.writeCount == self.readCount
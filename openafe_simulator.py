@@ -0,0 +1,350 @@
+import math
+import random
+import threading
+import time
+from collections import deque
+
+from openafe_framing import calculateChecksum, makeFrame
+
+
+def _wave(potential, halfWavePotential, width):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	A unit height sigmoid, the shape of the diffusion limited current sampled in the pulse voltammetries.
+	"""
+	return 0.5 * (1 + math.tanh((potential - halfWavePotential) / (2 * width)))
+
+
+def _peak(potential, peakPotential, width):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	A unit height bell shaped peak, the shape of a faradaic peak in the simulated voltammograms.
+	"""
+	return 1.0 / math.cosh((potential - peakPotential) / width) ** 2
+
+
+class SimulatedOpenAFE:
+
+	def __init__(self, pointRate=None, realTime=True, corruptionRate=0.0, commandLatency_milliseconds=0,
+			  formalPotential=100, peakCurrent=40, noise=0.2, seed=0, timeout=None):
+		"""
+		The `SimulatedOpenAFE` is an in-process stand-in for the serial port of an OpenAFE device running
+		OpenAFE Comm. It speaks the same protocol (`MSG,RDY` on open, ACK or ERR for every command, the
+		`$...*XX` checksummed point frames and `MSG,END`), generating the CV, DPV and SWV waveforms of a
+		single reversible redox couple. It can be given to `OpenAFE` as its transport.
+
+		:param pointRate: The number of points per second sent during a voltammetry. None uses the rate the
+		real device would have for the requested waveform
+		:param realTime: When False the points are sent as fast as they are read, ignoring the point rate
+		and the settling time, which is useful for deterministic tests and benchmarks
+		:param corruptionRate: The probability of a point frame being corrupted (one byte changed)
+		:param commandLatency_milliseconds: The time the simulated device takes to answer a command
+		:param formalPotential: The formal potential of the simulated redox couple, in millivolts (mV)
+		:param peakCurrent: The faradaic peak current of the simulated redox couple, in microamps (uA)
+		:param noise: The standard deviation of the noise added to the currents, in microamps (uA)
+		:param seed: The seed of the random generator used for the noise and the corruption
+		:param timeout: Like `serial.Serial.timeout`, the maximum time `read` blocks, None blocks forever
+		"""
+		self.pointRate = pointRate
+		self.realTime = realTime
+		self.corruptionRate = corruptionRate
+		self.commandLatency = commandLatency_milliseconds / 1000
+		self.formalPotential = formalPotential
+		self.peakCurrent = peakCurrent
+		self.noise = noise
+		self.timeout = timeout
+		self.random = random.Random(seed)
+
+		self.currentRange = None
+		self.commandsReceived = []
+		self.is_open = True
+
+		self._input = bytearray()
+		self._output = bytearray()
+		self._pending = deque()  # (due time, frame bytes) of the answers not sent yet
+		self._points = None  # iterator over the (voltage, current) points of the running voltammetry
+		self._pointInterval = 0.0
+		self._nextPointTime = 0.0
+		self._condition = threading.Condition()
+
+		self._output += makeFrame("MSG,RDY")
+
+
+	@property
+	def in_waiting(self):
+		with self._condition:
+			self._produce()
+			return len(self._output)
+
+
+	def read(self, size=1):
+		"""
+		The function `read` reads up to `size` bytes, blocking until at least one byte is available or the
+		timeout expires.
+
+		:param size: The maximum number of bytes to read
+		:return: the bytes read.
+		"""
+		deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+		with self._condition:
+			while True:
+				self._produce()
+				if self._output:
+					chunk = bytes(self._output[:size])
+					del self._output[:size]
+					return chunk
+
+				now = time.perf_counter()
+				wait = self._nextEventTime()
+				if deadline is not None:
+					if now >= deadline:
+						return b""
+					wait = deadline if wait is None else min(wait, deadline)
+				self._condition.wait(None if wait is None else max(wait - now, 0))
+
+
+	def readline(self):
+		"""
+		The function `readline` reads bytes until a newline, like `serial.Serial.readline`.
+
+		:return: the line read, including the newline.
+		"""
+		line = bytearray()
+		while not line.endswith(b"\n"):
+			chunk = self.read(1)
+			if not chunk:
+				break
+			line += chunk
+		return bytes(line)
+
+
+	def write(self, data):
+		"""
+		The function `write` receives the bytes sent to the device, answering every complete command.
+
+		:param data: The bytes sent to the device, e.g.: b"$CMD,CUR,200*XX"
+		:return: the number of bytes written.
+		"""
+		with self._condition:
+			self._input += data
+			while True:
+				start = self._input.find(b"$")
+				star = self._input.find(b"*", start)
+				if start < 0 or star < 0 or len(self._input) < star + 3:
+					break
+				frame = bytes(self._input[start:star + 3])
+				del self._input[:star + 3]
+				self._onCommandFrame(frame)
+			self._condition.notify_all()
+		return len(data)
+
+
+	def reset_input_buffer(self):
+		with self._condition:
+			self._output.clear()
+
+
+	def close(self):
+		self.is_open = False
+
+
+	def _onCommandFrame(self, frame):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Validates a command frame and schedules its answer and, for voltammetry commands, its points.
+		"""
+		command = frame[1:-3].decode("ascii", "replace")
+		self.commandsReceived.append(command)
+
+		try:
+			if calculateChecksum(frame[1:-3]) != int(frame[-2:], 16):
+				self._answer("ERR,CHK")
+				return
+		except ValueError:
+			self._answer("ERR,CHK")
+			return
+
+		if self._points is not None:
+			self._answer("ERR,BSY")
+			return
+
+		fields = command.split(",")
+		try:
+			if fields[0] == "CMD" and len(fields) == 3 and fields[1] == "CUR":
+				currentRange = float(fields[2])
+				if currentRange <= 0:
+					raise ValueError
+				self.currentRange = currentRange
+				self._answer("MSG,ACK")
+				return
+
+			parameters = [float(field) for field in fields[1:]]
+			if fields[0] == "CVW" and len(parameters) == 6:
+				points, naturalRate = self._cyclicVoltammetry(*parameters)
+			elif fields[0] == "DPV" and len(parameters) == 9:
+				points, naturalRate = self._differentialPulseVoltammetry(*parameters)
+			elif fields[0] == "SWV" and len(parameters) == 7:
+				points, naturalRate = self._squareWaveVoltammetry(*parameters)
+			else:
+				self._answer("ERR,CMD")
+				return
+		except ValueError:
+			self._answer("ERR,PAR")
+			return
+
+		self._answer("MSG,ACK")
+		self._points = iter(points)
+		rate = self.pointRate or naturalRate
+		self._pointInterval = 1.0 / rate
+		self._nextPointTime = time.perf_counter() + self.commandLatency
+		if self.realTime:
+			self._nextPointTime += parameters[0] / 1000  # settling time
+
+
+	def _answer(self, message):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Schedules an answer to a command after the command latency.
+		"""
+		self._pending.append((time.perf_counter() + self.commandLatency, makeFrame(message)))
+
+
+	def _nextEventTime(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Returns the time at which the next byte will be available, or None if nothing is scheduled.
+		"""
+		times = []
+		if self._pending:
+			times.append(self._pending[0][0])
+		if self._points is not None:
+			times.append(self._nextPointTime)
+		return min(times) if times else None
+
+
+	def _produce(self):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Moves every answer and point that is due to the output buffer.
+		"""
+		now = time.perf_counter()
+		while self._pending and self._pending[0][0] <= now:
+			self._output += self._pending.popleft()[1]
+
+		if self._points is None or self._nextPointTime > now:
+			return
+
+		if self.realTime:
+			due = int((now - self._nextPointTime) / self._pointInterval) + 1
+			self._nextPointTime += due * self._pointInterval
+		else:
+			due = 64
+
+		for _ in range(due):
+			point = next(self._points, None)
+			if point is None:
+				self._points = None
+				self._output += makeFrame("MSG,END")
+				return
+			self._output += self._pointFrame(*point)
+
+
+	def _pointFrame(self, voltage, current):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Builds the frame of a point, adding noise, clipping the current to the current range and, at the
+		corruption rate, changing one byte of the frame.
+		"""
+		current += self.random.gauss(0, self.noise) if self.noise else 0
+		if self.currentRange is not None:
+			current = max(-self.currentRange, min(self.currentRange, current))
+
+		frame = makeFrame(f"SET,{voltage:.2f},{current:.4f}")
+		if self.corruptionRate and self.random.random() < self.corruptionRate:
+			frame = bytearray(frame)
+			index = self.random.randrange(1, len(frame) - 1)
+			frame[index] = frame[index] ^ (1 << self.random.randrange(7)) or 0x3F
+			frame = bytes(frame)
+		return frame
+
+
+	def _cyclicVoltammetry(self, settlingTime, startingPotential, endingPotential, scanRate, stepSize, numberOfCycles):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Returns the points generator and the natural point rate of a cyclic voltammetry.
+		"""
+		if settlingTime < 0 or scanRate <= 0 or stepSize <= 0 or numberOfCycles < 1 or startingPotential == endingPotential:
+			raise ValueError
+
+		def points():
+			direction = 1 if endingPotential > startingPotential else -1
+			sweep = int(abs(endingPotential - startingPotential) // stepSize)
+			capacitive = 0.05 * self.peakCurrent
+			for _ in range(int(numberOfCycles)):
+				for forward in (True, False):
+					ascending = forward == (direction > 0)  # the anodic peak is on the ascending sweep
+					for step in range(sweep + 1) if forward else range(sweep, -1, -1):
+						voltage = startingPotential + direction * step * stepSize
+						if ascending:
+							current = capacitive + self.peakCurrent * _peak(voltage, self.formalPotential + 30, 45)
+						else:
+							current = -capacitive - self.peakCurrent * _peak(voltage, self.formalPotential - 30, 45)
+						yield voltage, current
+
+		return points(), scanRate / stepSize
+
+
+	def _differentialPulseVoltammetry(self, settlingTime, startingPotential, endingPotential, pulsePotential,
+								   stepPotential, pulseWidth, baseWidth, samplePeriodPulse, samplePeriodBase):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Returns the points generator and the natural point rate of a differential pulse voltammetry.
+		"""
+		if settlingTime < 0 or stepPotential <= 0 or pulseWidth <= 0 or baseWidth <= 0 or samplePeriodPulse <= 0 \
+			or samplePeriodBase <= 0 or samplePeriodPulse > pulseWidth or samplePeriodBase > baseWidth \
+			or startingPotential == endingPotential:
+			raise ValueError
+
+		def points():
+			direction = 1 if endingPotential > startingPotential else -1
+			steps = int(abs(endingPotential - startingPotential) // stepPotential)
+			for step in range(steps + 1):
+				voltage = startingPotential + direction * step * stepPotential
+				base = self.peakCurrent * _wave(voltage, self.formalPotential, 25)
+				pulse = self.peakCurrent * _wave(voltage + pulsePotential, self.formalPotential, 25)
+				yield voltage, pulse - base
+
+		return points(), 1000 / (pulseWidth + baseWidth)
+
+
+	def _squareWaveVoltammetry(self, settlingTime, startingPotential, endingPotential, scanRate, pulsePotential,
+							pulseFrequency, samplePeriodPulse):
+		"""
+		NOTE: PRIVATE METHOD, DO NOT CALL IT!
+
+		Returns the points generator and the natural point rate of a square wave voltammetry.
+		"""
+		if settlingTime < 0 or scanRate <= 0 or pulseFrequency <= 0 or samplePeriodPulse <= 0 \
+			or samplePeriodPulse > 500 / pulseFrequency or startingPotential == endingPotential:
+			raise ValueError
+
+		def points():
+			direction = 1 if endingPotential > startingPotential else -1
+			stepPotential = scanRate / pulseFrequency
+			steps = int(abs(endingPotential - startingPotential) // stepPotential)
+			for step in range(steps + 1):
+				voltage = startingPotential + direction * step * stepPotential
+				forward = self.peakCurrent * _wave(voltage + pulsePotential, self.formalPotential, 25)
+				reverse = self.peakCurrent * _wave(voltage - pulsePotential, self.formalPotential, 25)
+				yield voltage, forward - reverse
+
+		return points(), pulseFrequency
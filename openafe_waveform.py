@@ -0,0 +1,300 @@
+import math
+import numbers
+from functools import lru_cache, wraps
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+# Device limits, the parameters are checked against them before a command is sent to the MCU
+MIN_POTENTIAL_MILLIVOLTS = -2000  # lowest cell potential the AFE can apply
+MAX_POTENTIAL_MILLIVOLTS = 2000  # highest cell potential the AFE can apply
+MAX_POINT_RATE_HERTZ = 400  # points per second the 115200 baud link carries, with ~25 bytes per point frame
+
+
+class Waveform:
+
+	def __init__(self, protocol, command, settlingTime, startingPotential, endingPotential, stepPotential,
+			  sweepsPerRun, pointRate):
+		"""
+		The `Waveform` is the client side model of a voltammetry: the command sent to the MCU and what the
+		device will answer to it. It is built, validated and memoized by `cyclicVoltammetryWaveform`,
+		`differentialPulseVoltammetryWaveform` and `squareWaveVoltammetryWaveform`, so it must not be
+		changed.
+
+		:param protocol: "CV", "DPV" or "SWV"
+		:param command: The command string sent to the MCU, e.g.: "CVW,1000,-500,500,250,2,1"
+		:param settlingTime: The settling time before the first point, in milliseconds (ms)
+		:param startingPotential: The starting potential, in millivolts (mV)
+		:param endingPotential: The ending potential, in millivolts (mV)
+		:param stepPotential: The potential step between two points, in millivolts (mV)
+		:param sweepsPerRun: The number of sweeps between the potentials, alternating their direction (e.g.:
+		2 per cycle for a CV, 1 for a DPV)
+		:param pointRate: The number of points sent per second
+		"""
+		self.protocol = protocol
+		self.command = command
+		self.settlingTime = settlingTime
+		self.startingPotential = startingPotential
+		self.endingPotential = endingPotential
+		self.stepPotential = stepPotential
+		self.sweepsPerRun = sweepsPerRun
+		self.pointRate = pointRate
+
+		self.pointsPerSweep = int(abs(endingPotential - startingPotential) // stepPotential) + 1
+		self.numberOfPoints = self.pointsPerSweep * sweepsPerRun
+		self.duration_seconds = settlingTime / 1000 + self.numberOfPoints / pointRate
+
+		self._potentials = None
+
+
+	def __repr__(self):
+		return f"Waveform({self.command!r}, {self.numberOfPoints} points, {self.duration_seconds:.1f} s)"
+
+
+	@property
+	def potentials(self):
+		"""
+		NOTE: This property can raise an Exception.
+
+		The potential of every point the device will send, in the order they are sent, as a read only
+		NumPy array, e.g.: to preallocate the arrays of the run or to tell a point from a dropped one.
+		"""
+		if self._potentials is None:
+			if np is None:
+				raise Exception("NumPy is required to compute the potentials, install it with: pip install numpy")
+
+			direction = 1 if self.endingPotential > self.startingPotential else -1
+			sweep = self.startingPotential + direction * self.stepPotential * np.arange(self.pointsPerSweep)
+			potentials = np.tile(np.concatenate((sweep, sweep[::-1])), (self.sweepsPerRun + 1) // 2)
+			potentials = potentials[:self.numberOfPoints]
+			potentials.flags.writeable = False
+			self._potentials = potentials
+		return self._potentials
+
+
+	def remainingTime(self, pointsReceived):
+		"""
+		The function `remainingTime` estimates the time until the end of the run.
+
+		:param pointsReceived: The number of points received so far
+		:return: the remaining time, in seconds (s).
+		"""
+		return max(self.numberOfPoints - pointsReceived, 0) / self.pointRate
+
+
+def _memoizedWaveform(name):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	Decorates a function building a `Waveform`: its parameters are checked to be numbers and written as in
+	a command (see `commandNumber`) before the memoized call, so 1000 and 1000.0 give the same command
+	whatever was called before.
+	"""
+	def decorator(builder):
+		memoized = lru_cache(maxsize=128)(builder)
+
+		@wraps(builder)
+		def normalized(*parameters, **namedParameters):
+			parameters = [_commandParameter(name, value) for value in parameters]
+			namedParameters = {key: _commandParameter(name, value) for key, value in namedParameters.items()}
+			return memoized(*parameters, **namedParameters)
+
+		normalized.cache_info = memoized.cache_info
+		normalized.cache_clear = memoized.cache_clear
+		return normalized
+	return decorator
+
+
+@_memoizedWaveform("Cyclic Voltammetry")
+def cyclicVoltammetryWaveform(settlingTime, startingPotential, endingPotential, scanRate, stepSize, numberOfCycles):
+	"""
+	NOTE: This function can raise an Exception.
+
+	The function `cyclicVoltammetryWaveform` validates the parameters of a cyclic voltammetry and returns its
+	`Waveform`. The result is memoized by the parameters, see `OpenAFE.makeCyclicVoltammetry` for them.
+
+	:return: the `Waveform` of the cyclic voltammetry.
+	"""
+	problems = _checkCommonParameters(settlingTime, startingPotential, endingPotential)
+	if scanRate <= 0:
+		problems.append("the scan rate must be positive")
+	if stepSize <= 0:
+		problems.append("the step size must be positive")
+	elif stepSize > abs(endingPotential - startingPotential):
+		problems.append("the step size must not be larger than the potential window")
+	if numberOfCycles < 1 or int(numberOfCycles) != numberOfCycles:
+		problems.append("the number of cycles must be a positive integer")
+	if scanRate > 0 and stepSize > 0 and scanRate / stepSize > MAX_POINT_RATE_HERTZ:
+		problems.append(f"the point rate (scan rate / step size = {scanRate / stepSize:g} points/s) is above "
+			f"{MAX_POINT_RATE_HERTZ} points/s")
+	_raiseProblems("Cyclic Voltammetry", problems)
+
+	command = "CVW," + str(settlingTime) + "," + str(startingPotential) + "," + str(endingPotential) + \
+		"," + str(scanRate) + "," + str(stepSize) + "," + str(numberOfCycles)
+	return Waveform("CV", command, settlingTime, startingPotential, endingPotential, stepSize,
+		2 * int(numberOfCycles), scanRate / stepSize)
+
+
+@_memoizedWaveform("Differential Pulse Voltammetry")
+def differentialPulseVoltammetryWaveform(settlingTime, startingPotential, endingPotential, pulsePotential,
+				      stepPotential, pulseWidth, baseWidth, samplePeriodPulse, samplePeriodBase):
+	"""
+	NOTE: This function can raise an Exception.
+
+	The function `differentialPulseVoltammetryWaveform` validates the parameters of a differential pulse
+	voltammetry and returns its `Waveform`. The result is memoized by the parameters, see
+	`OpenAFE.makeDifferentialPulseVoltammetry` for them.
+
+	:return: the `Waveform` of the differential pulse voltammetry.
+	"""
+	problems = _checkCommonParameters(settlingTime, startingPotential, endingPotential, pulsePotential)
+	if stepPotential <= 0:
+		problems.append("the step potential must be positive")
+	elif stepPotential > abs(endingPotential - startingPotential):
+		problems.append("the step potential must not be larger than the potential window")
+	if pulseWidth <= 0 or baseWidth <= 0:
+		problems.append("the pulse and base widths must be positive")
+	if not 0 < samplePeriodPulse <= pulseWidth:
+		problems.append("the pulse sample period must be positive and not longer than the pulse width")
+	if not 0 < samplePeriodBase <= baseWidth:
+		problems.append("the base sample period must be positive and not longer than the base width")
+	if pulseWidth > 0 and baseWidth > 0 and 1000 / (pulseWidth + baseWidth) > MAX_POINT_RATE_HERTZ:
+		problems.append(f"the point rate (1000 / (pulse width + base width) = {1000 / (pulseWidth + baseWidth):g} "
+			f"points/s) is above {MAX_POINT_RATE_HERTZ} points/s")
+	_raiseProblems("Differential Pulse Voltammetry", problems)
+
+	command = "DPV," + str(settlingTime) + "," + str(startingPotential) + "," + \
+		str(endingPotential) + "," + str(pulsePotential) + "," + str(stepPotential) + "," + \
+		str(pulseWidth) + "," + str(baseWidth) + "," + str(samplePeriodPulse) + "," + str(samplePeriodBase)
+	return Waveform("DPV", command, settlingTime, startingPotential, endingPotential, stepPotential, 1,
+		1000 / (pulseWidth + baseWidth))
+
+
+@_memoizedWaveform("Square Wave Voltammetry")
+def squareWaveVoltammetryWaveform(settlingTime, startingPotential, endingPotential, scanRate, pulsePotential,
+							   pulseFrequency, samplePeriodPulse):
+	"""
+	NOTE: This function can raise an Exception.
+
+	The function `squareWaveVoltammetryWaveform` validates the parameters of a square wave voltammetry and
+	returns its `Waveform`, with a step of scanRate / pulseFrequency per pulse. The result is memoized by the
+	parameters, see `OpenAFE.makeSquareWaveVoltammetry` for them.
+
+	:return: the `Waveform` of the square wave voltammetry.
+	"""
+	problems = _checkCommonParameters(settlingTime, startingPotential, endingPotential, pulsePotential)
+	if scanRate <= 0:
+		problems.append("the scan rate must be positive")
+	if pulseFrequency <= 0:
+		problems.append("the pulse frequency must be positive")
+	elif pulseFrequency > MAX_POINT_RATE_HERTZ:
+		problems.append(f"the pulse frequency (one point per pulse) is above {MAX_POINT_RATE_HERTZ} Hz")
+	elif not 0 < samplePeriodPulse <= 500 / pulseFrequency:
+		problems.append("the pulse sample period must be positive and not longer than half of the pulse period")
+	if scanRate > 0 and pulseFrequency > 0 and scanRate / pulseFrequency > abs(endingPotential - startingPotential):
+		problems.append("the step potential (scan rate / pulse frequency) must not be larger than the potential window")
+	_raiseProblems("Square Wave Voltammetry", problems)
+
+	command = "SWV," + str(settlingTime) + "," + str(startingPotential) + "," + \
+		str(endingPotential) + "," + str(scanRate) + "," + str(pulsePotential) + "," + \
+		str(pulseFrequency) + "," + str(samplePeriodPulse)
+	return Waveform("SWV", command, settlingTime, startingPotential, endingPotential, scanRate / pulseFrequency, 1,
+		pulseFrequency)
+
+
+# first field of a voltammetry command -> the function building its `Waveform`, the other fields are its
+# arguments, in order
+COMMAND_WAVEFORMS = {
+	"CVW": cyclicVoltammetryWaveform,
+	"DPV": differentialPulseVoltammetryWaveform,
+	"SWV": squareWaveVoltammetryWaveform,
+}
+
+
+def waveformOfCommand(command):
+	"""
+	NOTE: This function can raise an Exception.
+
+	The function `waveformOfCommand` returns the `Waveform` of a voltammetry command string, validating its
+	parameters, e.g.: for a command sent with `OpenAFE.sendCommandsToMCU`.
+
+	:param command: The command string, e.g.: "CVW,1000,-500,500,250,2,1"
+	:return: the `Waveform`, or None if the command does not start a voltammetry (e.g.: "CMD,CUR,200").
+	"""
+	fields = command.split(",")
+	builder = COMMAND_WAVEFORMS.get(fields[0])
+	if builder is None:
+		return None
+	try:
+		return builder(*[_parseNumber(field) for field in fields[1:]])
+	except (ValueError, TypeError):
+		raise Exception("Invalid voltammetry command: " + command)
+
+
+def commandNumber(value):
+	"""
+	The function `commandNumber` returns a parameter as it is written in a command: whole numbers as int, so
+	the commands read "CVW,1000,..." and not "CVW,1000.0,...".
+
+	:param value: The parameter, a number or a string
+	:return: the parameter, as an int or a float.
+	"""
+	value = float(value)
+	return int(value) if value.is_integer() else value
+
+
+def _parseNumber(field):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	Parses a field of a command, as an int when it is written as one, so the command is rebuilt unchanged.
+	"""
+	try:
+		return int(field)
+	except ValueError:
+		return float(field)
+
+
+def _commandParameter(name, value):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+	NOTE: This function can raise an Exception.
+
+	Returns a parameter of a voltammetry as written in its command, raising if it is not a finite number
+	(True would be sent as "True").
+	"""
+	if isinstance(value, bool) or not isinstance(value, numbers.Real) or not math.isfinite(value):
+		raise Exception("Invalid " + name + " parameters: " + repr(value) + " is not a number.")
+	return commandNumber(value)
+
+
+def _checkCommonParameters(settlingTime, startingPotential, endingPotential, pulsePotential=0):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	Returns the problems with the parameters shared by every voltammetry, as a list of strings.
+	"""
+	problems = []
+	if settlingTime < 0:
+		problems.append("the settling time must not be negative")
+	if startingPotential == endingPotential:
+		problems.append("the starting and ending potentials must be different")
+
+	lowest = min(startingPotential, endingPotential) - abs(pulsePotential)
+	highest = max(startingPotential, endingPotential) + abs(pulsePotential)
+	if lowest < MIN_POTENTIAL_MILLIVOLTS or highest > MAX_POTENTIAL_MILLIVOLTS:
+		problems.append(f"the applied potentials ({lowest:g} mV to {highest:g} mV) must be within "
+			f"{MIN_POTENTIAL_MILLIVOLTS} mV and {MAX_POTENTIAL_MILLIVOLTS} mV")
+	return problems
+
+
+def _raiseProblems(name, problems):
+	"""
+	NOTE: PRIVATE FUNCTION, DO NOT CALL IT!
+
+	Raises an Exception listing the problems found in the parameters, if any.
+	"""
+	if problems:
+		raise Exception("Invalid " + name + " parameters: " + "; ".join(problems) + ".")
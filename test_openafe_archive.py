@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from openafe_archive import RunArchive, experimentKey
+
+COMMAND = "CVW,1000,-500,500,250,2,1"
+
+
+def makeRun(points, seed=0):
+	random = np.random.default_rng(seed)
+	voltages = np.linspace(-500, 500, points)
+	return voltages, random.normal(0, 10, points), np.arange(points) / 100
+
+
+def testExperimentKey():
+	assert experimentKey(COMMAND, 200, "COM1") == experimentKey(COMMAND, 200.0, "COM1")
+	assert experimentKey(COMMAND, 200, "COM1") != experimentKey(COMMAND, 100, "COM1")
+	assert experimentKey(COMMAND, 200, "COM1") != experimentKey(COMMAND, 200, "COM2")
+	assert experimentKey(COMMAND, None, "COM1") != experimentKey(COMMAND, 200, "COM1")
+
+
+def testStoreFindAndLatest(tmp_path):
+	archive = RunArchive(str(tmp_path))
+	voltages, currents, times = makeRun(100)
+	first = archive.store(COMMAND, 200, "COM1", voltages, currents, times, {"name": "reference"})
+	second = archive.store(COMMAND, 200.0, "COM1", voltages, currents + 1, times)
+	other = archive.store(COMMAND, 100, "COM1", voltages, currents, times)
+
+	assert [run["id"] for run in archive.find(COMMAND, 200, "COM1")] == [first, second]
+	assert [run["id"] for run in archive.find(COMMAND, 200.0, "COM1")] == [first, second]
+	assert [run["id"] for run in archive.find(protocol="CVW")] == [first, second, other]
+	assert [run["id"] for run in archive.find(currentRange=100)] == [other]
+	assert [run["id"] for run in archive.find(where=lambda run: run["metadata"].get("name") == "reference")] == [first]
+	assert archive.find(COMMAND, 200, "COM2") == []
+
+	run = archive.find(COMMAND, 200, "COM1")[0]
+	assert run["points"] == 100
+	assert run["minVoltage"] == -500 and run["maxVoltage"] == 500
+
+	latest = archive.latest(COMMAND, 200, "COM1")
+	assert np.allclose(latest["current"], currents + 1, atol=1e-4)  # float32 columns
+	assert archive.latest(COMMAND, 50, "COM1") is None
+
+
+def testStoredRunsAreCopies(tmp_path):
+	archive = RunArchive(str(tmp_path))
+	voltages, currents, times = makeRun(100)
+	runId = archive.store(COMMAND, 200, "COM1", voltages, currents, times)
+
+	currents[:] = 0  # the caller's arrays stay writable and do not change the archive
+	loaded = archive.load(runId)
+
+	assert not np.allclose(loaded["current"], 0)
+	with pytest.raises(ValueError):
+		loaded["current"][0] = 0
+
+
+def testIndexPersistsAcrossReopen(tmp_path):
+	archive = RunArchive(str(tmp_path))
+	voltages, currents, times = makeRun(100)
+	runId = archive.store(COMMAND, 200, "COM1", voltages, currents, times)
+
+	reopened = RunArchive(str(tmp_path))
+
+	assert len(reopened) == 1
+	assert [run["id"] for run in reopened.find(COMMAND, 200, "COM1")] == [runId]
+	assert np.allclose(reopened.load(runId)["voltage"], voltages)
+	assert reopened.misses == 1
+	assert reopened.store(COMMAND, 200, "COM1", voltages, currents, times) == runId + 1
+
+
+def testRemove(tmp_path):
+	archive = RunArchive(str(tmp_path))
+	voltages, currents, times = makeRun(100)
+	first = archive.store(COMMAND, 200, "COM1", voltages, currents, times)
+	second = archive.store(COMMAND, 200, "COM1", voltages, currents, times)
+
+	archive.remove(second)
+
+	assert [run["id"] for run in archive.find(COMMAND, 200, "COM1")] == [first]
+	assert len(RunArchive(str(tmp_path))) == 1
+	with pytest.raises(Exception):
+		archive.load(second)
+	with pytest.raises(Exception):
+		archive.remove(second)
+
+	archive.remove(first)
+	assert archive.latest(COMMAND, 200, "COM1") is None
+	assert archive.index["experiments"] == {}
+
+
+def testHotSetEvictsTheLeastRecentlyUsedRuns(tmp_path):
+	runBytes = 100 * (8 + 4 + 4)
+	archive = RunArchive(str(tmp_path), hotSetBytes=2 * runBytes)
+	voltages, currents, times = makeRun(100)
+	first, second, third = [archive.store(COMMAND, 200, "COM1", voltages, currents, times) for _ in range(3)]
+
+	assert list(archive.hotSet) == [second, third]
+	assert archive.hotSetUsage == 2 * runBytes
+
+	archive.load(second)  # hit, second becomes the most recently used
+	archive.load(first)  # miss, evicts third
+	assert (archive.hits, archive.misses) == (1, 1)
+	assert list(archive.hotSet) == [second, first]
+
+	largeVoltages, largeCurrents, largeTimes = makeRun(1000)
+	large = archive.store(COMMAND, 200, "COM1", largeVoltages, largeCurrents, largeTimes)
+	assert large not in archive.hotSet  # larger than the whole hot set
+	assert archive.hotSetUsage <= archive.hotSetBytes
@@ -0,0 +1,103 @@
+from openafe import OpenAFE
+from openafe_autorange import AutoRanger, RangeMemory, RangeMonitor, chooseRange, probeWaveform
+from openafe_simulator import SimulatedOpenAFE
+from openafe_waveform import cyclicVoltammetryWaveform, differentialPulseVoltammetryWaveform
+
+
+def makeDevice():
+	# peaks of about 42 uA (faradaic and capacitive currents), clipped by the simulator to the current range
+	return OpenAFE("simulated", transport=SimulatedOpenAFE(realTime=False, peakCurrent=40))
+
+
+def rangesSent(device):
+	return [float(command[8:]) for command in device.ser.commandsReceived if command.startswith("CMD,CUR,")]
+
+
+def testChooseRange():
+	assert chooseRange(3) == 5
+	assert chooseRange(-42) == 100
+	assert chooseRange(5000) == 1000
+
+
+def testSaturatedProbeStepsUpTheLadder():
+	device = makeDevice()
+	ranger = AutoRanger(device)
+	waveform = cyclicVoltammetryWaveform(0, -500, 500, 250, 5, 4)
+
+	currentRange = ranger.selectRange(waveform, 10)
+
+	assert currentRange == 100
+	assert rangesSent(device) == [10, 20, 50]  # one step up per saturated probe, then the peak picks the range
+	assert ranger.probes == 3
+	assert probeWaveform(waveform).command in device.ser.commandsReceived
+	assert waveform.command not in device.ser.commandsReceived  # only the probes ran
+
+
+def testCoarseRunSuggestsASmallerRange():
+	device = makeDevice()
+	ranger = AutoRanger(device, probe=False)
+	waveform = cyclicVoltammetryWaveform(0, -500, 500, 250, 5, 1)
+
+	device.setCurrentRange(ranger.selectRange(waveform))
+	device.makeCyclicVoltammetry(0, -500, 500, 250, 5, 1)
+	device.receiveVoltammetryPoints()
+
+	assert device.currentRange == 1000
+	assert ranger.check(waveform) == ("coarse", 100)
+	assert ranger.selectRange(waveform) == 100
+
+
+def testRangeIsRememberedPerCommand(tmp_path):
+	path = str(tmp_path / "ranges.json")
+	device = makeDevice()
+	ranger = AutoRanger(device, RangeMemory(path))
+	cyclic = cyclicVoltammetryWaveform(0, -500, 500, 250, 5, 4)
+	pulse = differentialPulseVoltammetryWaveform(0, -500, 500, 50, 5, 10, 20, 5, 5)
+
+	assert ranger.selectRange(cyclic, 10) == 100
+	probes = ranger.probes
+	assert ranger.selectRange(cyclic, 10) == 100
+	assert ranger.probes == probes  # remembered, not probed again
+
+	ranger.selectRange(pulse, 1000)
+	assert ranger.probes > probes  # another command is probed
+
+	remembered = RangeMemory(path)
+	assert remembered.get(cyclic.command) == 100
+	assert remembered.get(pulse.command) == ranger.memory.get(pulse.command)
+
+
+def testSingleCycleVoltammetryIsNotProbed():
+	device = makeDevice()
+	ranger = AutoRanger(device)
+	waveform = cyclicVoltammetryWaveform(0, -500, 500, 250, 5, 1)
+
+	assert ranger.selectRange(waveform, 200) == 200
+	assert ranger.probes == 0
+	assert device.ser.commandsReceived == []
+
+
+def testProbesAreShorterThanTheirRun():
+	cyclic = cyclicVoltammetryWaveform(1000, -500, 500, 250, 5, 4)
+	pulse = differentialPulseVoltammetryWaveform(1000, -500, 500, 50, 5, 10, 20, 5, 5)
+
+	for waveform in (cyclic, pulse):
+		probe = probeWaveform(waveform)
+		assert (probe.startingPotential, probe.endingPotential) == (waveform.startingPotential, waveform.endingPotential)
+		assert probe.duration_seconds < waveform.duration_seconds / 2
+
+
+def testRangeMonitor():
+	saturations = []
+	monitor = RangeMonitor(maxSaturatedPoints=3, onSaturationCallback=saturations.append)
+	monitor.reset(50)
+	monitor.addBatch([10, -49, 49.5, 50, 50, 20])
+
+	assert monitor.status == "saturated"
+	assert saturations == [monitor]
+	assert monitor.suggestedRange == 100  # the peak was clipped, at least the range above
+
+	monitor.reset(50)
+	assert monitor.status == "unknown" and monitor.suggestedRange is None
+	monitor.addCurrent(30)
+	assert (monitor.status, monitor.suggestedRange) == ("ok", 50)
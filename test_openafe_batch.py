@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from openafe import OpenAFE
+from openafe_batch import BatchRunner, loadSequence
+from openafe_simulator import SimulatedOpenAFE
+
+
+def makeSequence(tmp_path, repeats):
+	path = tmp_path / "sequence.json"
+	path.write_text(json.dumps({
+		"defaults": {"currentRange": 200},
+		"runs": [{"name": "cv", "protocol": "CV", "repeats": repeats,
+			"parameters": {"settlingTime": 0, "startingPotential": -500, "endingPotential": 500,
+				"scanRate": 250, "stepSize": 5, "numberOfCycles": 1}}],
+	}))
+	comPort, runs = loadSequence(str(path))
+	return runs
+
+
+def testRunAfterAFailedRunSucceeds(tmp_path):
+	calls = []
+
+	def onPoint(voltage, current):
+		calls.append(voltage)
+		if len(calls) == 100:
+			raise Exception("consumer failed once")
+
+	device = OpenAFE("simulated", onPointCallback=onPoint, transport=SimulatedOpenAFE(realTime=False))
+	device.endTimeout = 0.2
+	runner = BatchRunner(device, str(tmp_path / "results"))
+
+	results = runner.run(makeSequence(tmp_path, 3))
+
+	assert "consumer failed once" in results[0]["error"]
+	for result in results[1:]:
+		assert result["error"] is None
+		assert result["points"] == device.waveform.numberOfPoints
+
+
+def testRunAfterAFailedBatchSucceeds(tmp_path):
+	batches = []
+
+	def onBatch(voltages, currents):
+		batches.append(len(voltages))
+		if len(batches) == 2:
+			raise Exception("consumer failed once")
+
+	device = OpenAFE("simulated", onBatchCallback=onBatch, transport=SimulatedOpenAFE(realTime=False))
+	device.endTimeout = 0.2
+	runner = BatchRunner(device, str(tmp_path / "results"))
+
+	results = runner.run(makeSequence(tmp_path, 3))
+
+	assert "consumer failed once" in results[0]["error"]
+	for result in results[1:]:
+		assert result["error"] is None
+		assert result["points"] == device.waveform.numberOfPoints
+
+
+def testDeclinedCommandStopsTheCommands():
+	voltages = []
+	device = OpenAFE("simulated", onPointCallback=lambda voltage, current: voltages.append(voltage),
+		transport=SimulatedOpenAFE(realTime=False))
+	command = device.cyclicVoltammetryCommand(0, -500, 500, 250, 5, 1)
+
+	with pytest.raises(Exception):
+		device.sendCommandsToMCU(["CMD,CUR,-5", command])
+	assert command not in device.ser.commandsReceived  # no run after a declined command
+	assert device.currentRange is None
+	assert device.waveform is None
+
+	device.sendCommandsToMCU(["CMD,CUR,100", command])
+	device.receiveVoltammetryPoints()
+
+	assert device.currentRange == 100
+	assert device.waveform.command == command
+	assert len(voltages) == device.waveform.numberOfPoints
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from openafe import OpenAFE
+from openafe_cycles import CycleSegmenter, segmentCycles
+from openafe_recorder import PointRecorder, RecordingReader
+from openafe_simulator import SimulatedOpenAFE
+
+
+def receiveCyclicVoltammetry(startingPotential, endingPotential, numberOfCycles, recorder=None):
+	"""
+	Returns the waveform and the voltages of a cyclic voltammetry run on a `SimulatedOpenAFE`.
+	"""
+	voltages = []
+	device = OpenAFE("simulated", onPointCallback=lambda voltage, current: voltages.append(voltage),
+		transport=SimulatedOpenAFE(realTime=False))
+	device.makeCyclicVoltammetry(0, startingPotential, endingPotential, 250, 5, numberOfCycles)
+	device.receiveVoltammetryPoints(recorder=recorder)
+	return device.waveform, np.array(voltages)
+
+
+@pytest.mark.parametrize("startingPotential, endingPotential", [(-500, 500), (500, -500)])
+def testCyclesOfASimulatedRun(startingPotential, endingPotential):
+	waveform, voltages = receiveCyclicVoltammetry(startingPotential, endingPotential, 3)
+
+	cycles, vertices, ascending, descending = segmentCycles(voltages, startingPotential)
+
+	assert list(np.unique(cycles)) == [0, 1, 2]
+	# the device sends the starting potential twice between cycles, the next cycle starts when it moves again
+	starts = np.flatnonzero(np.diff(cycles)) + 1
+	assert list(starts) == [waveform.pointsPerSweep * 2 * cycle + 1 for cycle in (1, 2)]
+	assert np.all(voltages[starts - 1] == startingPotential)
+	# the first sweep goes towards the ending potential
+	firstSweep = slice(1, waveform.pointsPerSweep)
+	assert np.all(ascending[firstSweep] if endingPotential > startingPotential else descending[firstSweep])
+
+
+@pytest.mark.parametrize("startingPotential, endingPotential", [(-500, 500), (500, -500)])
+def testStreamedLabelsAreTheBatchLabels(startingPotential, endingPotential):
+	waveform, voltages = receiveCyclicVoltammetry(startingPotential, endingPotential, 2)
+	cycles, vertices, ascending, descending = segmentCycles(voltages, startingPotential)
+
+	pointByPoint = CycleSegmenter(startingPotential)
+	labels = [pointByPoint.addPoint(voltage) for voltage in voltages]
+	chunked = CycleSegmenter(startingPotential)
+	chunkedCycles = np.concatenate([chunked.addPoints(voltages[start:start + 37])[0]
+		for start in range(0, len(voltages), 37)])
+
+	assert [cycle for cycle, direction in labels] == list(cycles)
+	assert list(chunkedCycles) == list(cycles)
+	assert pointByPoint.vertices == chunked.vertices == list(vertices)
+
+
+@pytest.mark.parametrize("startingPotential, endingPotential", [(-500, 500), (500, -500)])
+def testRecordedCyclesOfATwoCycleRun(tmp_path, startingPotential, endingPotential):
+	path = str(tmp_path / "run.oafe")
+	with PointRecorder(path) as recorder:
+		waveform, voltages = receiveCyclicVoltammetry(startingPotential, endingPotential, 2, recorder)
+
+	with RecordingReader(path) as reader:
+		assert list(np.asarray(reader.cycles)) == list(segmentCycles(voltages, startingPotential)[0])
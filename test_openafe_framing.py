@@ -0,0 +1,77 @@
+from openafe_framing import FrameReader, calculateChecksum, makeFrame
+
+
+class ChunkedPort:
+	"""
+	A serial-like port giving its bytes in the given chunks, one chunk per read.
+	"""
+
+	def __init__(self, chunks):
+		self.chunks = [bytes(chunk) for chunk in chunks]
+
+
+	@property
+	def in_waiting(self):
+		return len(self.chunks[0]) if self.chunks else 0
+
+
+	def read(self, size=1):
+		if not self.chunks:
+			return b""
+		chunk = self.chunks[0][:size]
+		self.chunks[0] = self.chunks[0][size:]
+		if not self.chunks[0]:
+			self.chunks.pop(0)
+		return chunk
+
+
+def testMakeFrame():
+	assert makeFrame("MSG,RDY") == b"$MSG,RDY*" + format(calculateChecksum(b"MSG,RDY"), "02X").encode() + b"\n"
+
+
+def testFramesSplitAcrossReads():
+	stream = makeFrame("MSG,RDY") + makeFrame("SET,-500.00,1.2345") + makeFrame("MSG,END")
+	reader = FrameReader(ChunkedPort([stream[:5], stream[5:17], stream[17:18], stream[18:]]))
+
+	assert [reader.readFrame() for _ in range(3)] == [("MSG,RDY", True), ("SET,-500.00,1.2345", True),
+		("MSG,END", True)]
+
+
+def testCarriageReturnLineEndings():
+	stream = makeFrame("MSG,RDY").replace(b"\n", b"\r\n") + makeFrame("MSG,END").replace(b"\n", b"\r\n")
+	reader = FrameReader(ChunkedPort([stream]))
+
+	assert reader.readFrame() == ("MSG,RDY", True)
+	assert reader.readFrame() == ("MSG,END", True)
+
+
+def testBadChecksum():
+	frame = bytearray(makeFrame("SET,-500.00,1.2345"))
+	frame[6] = ord("9")  # "-500" -> "-900", the checksum no longer matches
+
+	assert FrameReader.checkFrame(frame[:-1]) == ("SET,-900.00,1.2345", False)
+	assert FrameReader.checkFrame(makeFrame("MSG,END")[:-4] + b"*ZZ") == ("MSG,END", False)
+
+
+def testMissingChecksum():
+	assert FrameReader.checkFrame(b"$MSG,END")[1] is False
+	assert FrameReader.checkFrame(b"$MSG,END*")[1] is False
+	assert FrameReader.checkFrame(b"$MSG,END*3")[1] is False
+	assert FrameReader.checkFrame(b"MSG,END*3A")[1] is False  # no "$"
+
+
+def testStrayDollarMidLine():
+	# a frame cut by a lost line ending: the reader resyncs on the last "$" of the line
+	line = b"$SET,-500.00," + makeFrame("SET,-495.00,1.5000")[:-1]
+
+	assert FrameReader.checkFrame(line) == ("SET,-495.00,1.5000", True)
+	assert FrameReader.checkFrame(makeFrame("SET,-495.00,1.5000")[:-1] + b"$SET,-4")[1] is False
+
+
+def testLinesAfterTheLastLineEndingWait():
+	stream = makeFrame("MSG,RDY") + b"$MSG,E"
+	reader = FrameReader(ChunkedPort([stream]))
+
+	assert reader.readFrame() == ("MSG,RDY", True)
+	assert reader.readLine(timeout=0) is None
+	assert reader.buffer == bytearray(b"$MSG,E")
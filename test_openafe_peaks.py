@@ -0,0 +1,73 @@
+import numpy as np
+
+from openafe_peaks import StreamingPeakAnalyzer, analyzeCyclicVoltammetry, analyzePulseVoltammetryBatch, analyzeSweep
+
+
+def makeCyclicVoltammetry(startingPotential, endingPotential, stepSize, numberOfCycles, formalPotential=100):
+	"""
+	Returns the (voltages, currents) of a noiseless CV sweeping like the device: every sweep includes both of
+	its vertices, with an anodic peak on the ascending sweeps and a cathodic peak on the descending ones.
+	"""
+	direction = 1 if endingPotential > startingPotential else -1
+	sweep = startingPotential + direction * stepSize * np.arange(int(abs(endingPotential - startingPotential) // stepSize) + 1)
+	voltages = np.tile(np.concatenate((sweep, sweep[::-1])), numberOfCycles).astype(float)
+
+	ascending = np.diff(voltages, prepend=voltages[0] - direction) > 0
+	anodic = 40 / np.cosh((voltages - formalPotential - 30) / 45) ** 2
+	cathodic = -40 / np.cosh((voltages - formalPotential + 30) / 45) ** 2
+	return voltages, np.where(ascending, anodic + 2, cathodic - 2)
+
+
+def testCyclicVoltammetryHasOneResultPerCycle():
+	voltages, currents = makeCyclicVoltammetry(-500, 500, 5, 2)
+
+	results = analyzeCyclicVoltammetry(voltages, currents, -500)
+
+	assert [result["cycle"] for result in results] == [0, 1]
+	for result in results:
+		assert result["anodicPeak"].potential == 130
+		assert result["cathodicPeak"].potential == 70
+		assert result["peakSeparation"] == 60
+
+
+def testCyclicVoltammetryStartingAboveItsEnd():
+	voltages, currents = makeCyclicVoltammetry(500, -500, 5, 2)
+
+	results = analyzeCyclicVoltammetry(voltages, currents, 500)
+
+	assert [result["cycle"] for result in results] == [0, 1]
+	for result in results:
+		assert result["anodicPeak"].potential == 130
+		assert result["cathodicPeak"].potential == 70
+
+
+def testStreamingGivesTheBatchResults():
+	for startingPotential, endingPotential in ((-500, 500), (500, -500)):
+		voltages, currents = makeCyclicVoltammetry(startingPotential, endingPotential, 5, 3)
+		analyzer = StreamingPeakAnalyzer(startingPotential)
+		analyzer.addPoints(voltages, currents)
+
+		streamed = analyzer.finish()
+		batch = analyzeCyclicVoltammetry(voltages, currents, startingPotential)
+
+		assert len(streamed) == len(batch) == 3
+		for streamedCycle, batchCycle in zip(streamed, batch):
+			for key in ("anodicPeak", "cathodicPeak"):
+				assert streamedCycle[key].index == batchCycle[key].index
+				assert streamedCycle[key].area == batchCycle[key].area
+
+
+def testPulseBatchAreasMatchTheSingleSweep():
+	random = np.random.default_rng(0)
+	voltages = np.tile(np.linspace(-500, 500, 201), (20, 1))
+	signs = np.where(random.random((20, 1)) < 0.5, 1, -1)
+	currents = signs * 30 / np.cosh((voltages - random.uniform(-200, 200, (20, 1))) / 40) ** 2
+	currents += random.normal(0, 0.3, voltages.shape)
+
+	potentials, peakCurrents, indices, areas = analyzePulseVoltammetryBatch(voltages, currents)
+
+	for run in range(20):
+		peak = analyzeSweep(voltages[run], currents[run])
+		assert potentials[run] == peak.potential
+		assert np.isclose(peakCurrents[run], peak.current)
+		assert np.isclose(areas[run], peak.area)
@@ -0,0 +1,64 @@
+import numpy as np
+
+from openafe import OpenAFE
+from openafe_pointstore import PointStore, lttbDownsample
+from openafe_simulator import SimulatedOpenAFE
+
+
+def testDisplayPointsKeepTheBreaksBetweenCycles():
+	voltages, currents = [], []
+
+	def onPoint(voltage, current):
+		voltages.append(voltage)
+		currents.append(current)
+
+	device = OpenAFE("simulated", onPointCallback=onPoint, transport=SimulatedOpenAFE(realTime=False))
+	device.makeCyclicVoltammetry(0, -500, 500, 250, 5, 2)
+	device.receiveVoltammetryPoints()
+	cycleLength = device.waveform.pointsPerSweep * 2
+
+	store = PointStore(chunkSize=64)
+	store.extend(voltages[:cycleLength], currents[:cycleLength])
+	store.append(np.nan, np.nan)
+	store.extend(voltages[cycleLength:], currents[cycleLength:])
+
+	for xRange in (None, (-200, 200)):
+		displayVoltages, displayCurrents = store.getDisplayPoints(100, xRange)
+		assert np.count_nonzero(np.isnan(displayVoltages)) >= 1
+		if xRange is not None:
+			inside = displayVoltages[~np.isnan(displayVoltages)]
+			assert inside.min() >= -200 and inside.max() <= 200
+
+
+def testLttbKeepsTheEndsAndThePeak():
+	x = np.linspace(-500, 500, 10001)
+	y = 40 / np.cosh((x - 100) / 45) ** 2
+
+	keptX, keptY = lttbDownsample(x, y, 200)
+
+	assert len(keptX) == 200
+	assert keptX[0] == -500 and keptX[-1] == 500
+	assert np.all(np.diff(keptX) > 0)
+	assert keptY.max() > 0.99 * y.max()
+
+
+def testStoreGrowsOverItsChunks():
+	store = PointStore(chunkSize=100)
+	store.extend(range(250), range(250))
+
+	voltages, currents = store.arrays()
+
+	assert len(store) == 250 and len(store.chunks) == 2
+	assert np.array_equal(voltages, np.arange(250))
+
+
+def testIncrementalDisplayPointsMatchTheStore():
+	store = PointStore(chunkSize=64)
+	store.extend(range(1000), range(1000))
+	first, _ = store.getDisplayPoints(100)
+	store.extend(range(1000, 1010), range(1000, 1010))
+
+	voltages, currents = store.getDisplayPoints(100)
+
+	assert len(first) == 100
+	assert np.array_equal(voltages[:100], first) and np.array_equal(voltages[100:], np.arange(1000, 1010))
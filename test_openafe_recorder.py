@@ -0,0 +1,61 @@
+import numpy as np
+
+from openafe import OpenAFE
+from openafe_recorder import PointRecorder, RecordingReader
+from openafe_simulator import SimulatedOpenAFE
+
+
+def testRecordingOfASimulatedRun(tmp_path):
+	voltages, currents = [], []
+
+	def onPoint(voltage, current):
+		voltages.append(voltage)
+		currents.append(current)
+
+	device = OpenAFE("simulated", onPointCallback=onPoint, transport=SimulatedOpenAFE(realTime=False))
+	device.makeCyclicVoltammetry(0, -500, 500, 250, 5, 2)
+	path = str(tmp_path / "run.oafe")
+
+	with PointRecorder(path, {"command": device.waveform.command, "currentRange": 200}, chunkSize=100) as recorder:
+		device.receiveVoltammetryPoints(recorder=recorder)
+
+	with RecordingReader(path) as reader:
+		assert reader.parameters == {"command": device.waveform.command, "currentRange": 200}
+		assert len(reader) == device.waveform.numberOfPoints
+		assert np.allclose(reader.voltages, voltages)
+		assert np.allclose(reader.currents, currents, atol=1e-4)  # float32 columns
+		assert np.all(np.diff(reader.times) >= 0)
+
+		replayed = []
+		reader.replay(lambda voltage, current: replayed.append(voltage), batchSize=64)
+		assert np.allclose(replayed, voltages)
+
+
+def testBatchesAreRecordedLikePoints(tmp_path):
+	voltages = np.linspace(-500, 500, 1000)
+	currents = np.sin(voltages / 100)
+	with PointRecorder(str(tmp_path / "points.oafe"), chunkSize=64) as byPoint:
+		for voltage, current in zip(voltages, currents):
+			byPoint.record(voltage, current, 0)
+	with PointRecorder(str(tmp_path / "batches.oafe"), chunkSize=64) as byBatch:
+		for start in range(0, 1000, 300):
+			byBatch.recordBatch(voltages[start:start + 300], currents[start:start + 300], np.zeros(300))
+
+	with RecordingReader(str(tmp_path / "points.oafe")) as pointReader, \
+			RecordingReader(str(tmp_path / "batches.oafe")) as batchReader:
+		for column in ("voltage", "current", "cycle", "direction"):  # the times are from the start of each recorder
+			assert np.array_equal(pointReader.records[column], batchReader.records[column])
+
+
+def testReadingARecordingBeingWritten(tmp_path):
+	path = str(tmp_path / "run.oafe")
+	recorder = PointRecorder(path, chunkSize=10)
+	for index in range(25):
+		recorder.record(index, 0.0)
+
+	with RecordingReader(path) as reader:
+		assert len(reader) == 20  # only the flushed chunks
+
+	recorder.close()
+	with RecordingReader(path) as reader:
+		assert len(reader) == 25
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from openafe import OpenAFE
+from openafe_framing import makeFrame
+from openafe_simulator import SimulatedOpenAFE
+
+END_FRAME = makeFrame("MSG,END")
+
+
+class SimulatedOpenAFEWithoutEnd(SimulatedOpenAFE):
+	"""
+	A `SimulatedOpenAFE` whose `MSG,END` is replaced, e.g.: by a corrupted frame or by nothing.
+	"""
+
+	def __init__(self, endFrame, **options):
+		super().__init__(**options)
+		self.endFrame = endFrame
+
+
+	def _produce(self):
+		super()._produce()
+		end = self._output.find(END_FRAME)
+		if end >= 0:
+			self._output[end:end + len(END_FRAME)] = self.endFrame
+
+
+def makeDevice(transport, **recoveryOptions):
+	voltages = []
+	device = OpenAFE("simulated", onPointCallback=lambda voltage, current: voltages.append(voltage),
+		transport=transport)
+	device.enableRecovery(**recoveryOptions)
+	device.makeCyclicVoltammetry(0, -500, 500, 250, 5, 2)
+	return device, voltages
+
+
+def testCorruptedRunCompletes():
+	gaps = []
+	device, voltages = makeDevice(SimulatedOpenAFE(realTime=False, corruptionRate=0.05, timeout=1),
+		maxCorruptedFrames=None, onGapCallback=gaps.append, endTimeout_seconds=0.5)
+
+	device.receiveVoltammetryPoints()
+
+	assert device.corruptedFrames > 0
+	assert device.gaps == gaps and len(gaps) == device.corruptedFrames
+	assert gaps == sorted(gaps)
+	assert len(voltages) == device.pointsReceived
+	# a corrupted frame is one lost point, or two if its "*" became a line ending
+	assert device.waveform.numberOfPoints - device.corruptedFrames <= len(voltages) < device.waveform.numberOfPoints
+
+	potentials = list(device.waveform.potentials)
+	position = 0
+	for voltage in voltages:  # the received points are the expected ones, in order, with holes at the gaps
+		position = potentials.index(voltage, position) + 1
+
+
+def testTooManyCorruptedFramesAbortTheRun():
+	device, voltages = makeDevice(SimulatedOpenAFE(realTime=False, corruptionRate=0.2, timeout=1),
+		maxCorruptedFrames=3)
+
+	with pytest.raises(Exception, match="More than 3"):
+		device.receiveVoltammetryPoints()
+	assert device.corruptedFrames == 4
+
+
+@pytest.mark.parametrize("endFrame", [b"", b"$MSG,END*00\n", b"$MSG,E"])
+@pytest.mark.parametrize("useReaderThread", [False, True])
+def testLostOrCorruptedEndEndsTheRun(endFrame, useReaderThread):
+	ended = []
+	device, voltages = makeDevice(SimulatedOpenAFEWithoutEnd(endFrame, realTime=False, timeout=1),
+		endTimeout_seconds=0.3)
+	device.onEndCallback = lambda: ended.append(True)
+
+	start = time.perf_counter()
+	device.receiveVoltammetryPoints(useReaderThread)
+	elapsed = time.perf_counter() - start
+
+	assert ended == [True]
+	assert len(voltages) == device.waveform.numberOfPoints
+	assert elapsed < 2
+	if endFrame == b"$MSG,END*00\n":
+		assert device.corruptedFrames == 1  # ended at once, without waiting
+	else:
+		assert elapsed >= 0.3
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from openafe import OpenAFE
+from openafe_peaks import analyzeCyclicVoltammetry
+from openafe_simulator import SimulatedOpenAFE
+
+
+def makeDevice(**simulatorOptions):
+	"""
+	Returns an `OpenAFE` talking to a `SimulatedOpenAFE` that sends its points as fast as they are read.
+	"""
+	voltages, currents = [], []
+
+	def onPoint(voltage, current):
+		voltages.append(voltage)
+		currents.append(current)
+
+	device = OpenAFE("simulated", onPointCallback=onPoint, transport=SimulatedOpenAFE(realTime=False, **simulatorOptions))
+	return device, voltages, currents
+
+
+@pytest.mark.parametrize("startingPotential, endingPotential", [(-500, 500), (500, -500)])
+def testSimulatedPeaksFollowTheSweepDirection(startingPotential, endingPotential):
+	device, voltages, currents = makeDevice(noise=0)
+	device.makeCyclicVoltammetry(0, startingPotential, endingPotential, 250, 5, 2)
+	device.receiveVoltammetryPoints()
+
+	results = analyzeCyclicVoltammetry(np.array(voltages), np.array(currents), startingPotential)
+
+	assert [result["cycle"] for result in results] == [0, 1]
+	for result in results:
+		assert result["anodicPeak"].potential > result["cathodicPeak"].potential
+
+
+@pytest.mark.parametrize("protocol, parameters", [
+	("CV", (0, -500, 500, 500, 5, 3)),
+	("DPV", (0, -500, 500, 50, 5, 10, 20, 5, 5)),
+	("SWV", (0, -500, 500, 100, 50, 5, 20)),
+])
+@pytest.mark.parametrize("batchSize", [None, 64])
+def testEveryPointOfARunIsReceived(protocol, parameters, batchSize):
+	device, voltages, currents = makeDevice()
+	batches = []
+	if batchSize is not None:
+		device.onBatchCallback = lambda batchVoltages, batchCurrents: batches.append(len(batchVoltages))
+	make = {
+		"CV": device.makeCyclicVoltammetry,
+		"DPV": device.makeDifferentialPulseVoltammetry,
+		"SWV": device.makeSquareWaveVoltammetry,
+	}[protocol]
+	make(*parameters)
+
+	device.receiveVoltammetryPoints(batchSize=batchSize)
+
+	assert len(voltages) == device.waveform.numberOfPoints
+	if batchSize is not None:
+		assert sum(batches) == device.waveform.numberOfPoints
+		assert max(batches) <= batchSize
@@ -0,0 +1,51 @@
+import pytest
+
+from openafe import OpenAFE
+from openafe_simulator import SimulatedOpenAFE
+from openafe_waveform import cyclicVoltammetryWaveform, differentialPulseVoltammetryWaveform, \
+	squareWaveVoltammetryWaveform, waveformOfCommand
+
+
+def testWholeNumbersAreSentAsInts():
+	floatFirst = cyclicVoltammetryWaveform(1000.0, -500.0, 500, 250, 2, 1.0)
+	intAfter = cyclicVoltammetryWaveform(1000, -500, 500, 250, 2, 1)
+
+	assert floatFirst.command == intAfter.command == "CVW,1000,-500,500,250,2,1"
+	assert cyclicVoltammetryWaveform(1000, -500, 500, 250, 2.5, 1).command == "CVW,1000,-500,500,250,2.5,1"
+	assert waveformOfCommand("CVW,1000.0,-500,500,250,2,1") is intAfter
+
+
+def testNamedParametersGiveTheSameCommand():
+	named = differentialPulseVoltammetryWaveform(settlingTime=1000.0, startingPotential=-500, endingPotential=500,
+		pulsePotential=100, stepPotential=5, pulseWidth=2, baseWidth=20, samplePeriodPulse=1, samplePeriodBase=2)
+
+	assert named.command == differentialPulseVoltammetryWaveform(1000, -500, 500, 100, 5, 2, 20, 1, 2).command
+
+
+@pytest.mark.parametrize("parameters", [
+	(1000, -500, 500, 250, 2, True),  # a bool is not a number of cycles
+	(1000, -500, 500, 250, 2, 1.5),
+	(1000, -500, 500, float("nan"), 2, 1),
+	(1000, -500, -500, 250, 2, 1),
+	(1000, -500, 500, 250, 0, 1),
+	(1000, -500, 500, 5000, 2, 1),  # above the point rate of the link
+	(1000, -3000, 500, 250, 2, 1),
+])
+def testInvalidParametersAreNotSent(parameters):
+	device = OpenAFE("simulated", transport=SimulatedOpenAFE(realTime=False))
+
+	with pytest.raises(Exception):
+		device.makeCyclicVoltammetry(*parameters)
+	with pytest.raises(Exception):
+		device.sendCommandsToMCU(["CMD,CUR,200", "CVW," + ",".join(str(value) for value in parameters)])
+
+	assert device.ser.commandsReceived == []
+
+
+def testInvalidPulseParameters():
+	with pytest.raises(Exception):
+		differentialPulseVoltammetryWaveform("1000", -500, 500, 100, 5, 2, 20, 1, 2)
+	with pytest.raises(Exception):
+		differentialPulseVoltammetryWaveform(1000, -500, 500, 100, 5, 2, 20, 3, 2)  # sample period > pulse width
+	with pytest.raises(Exception):
+		squareWaveVoltammetryWaveform(1000, -500, 500, 200, 100, 1000, 1)  # pulse frequency above the link